@@ -0,0 +1,167 @@
+# benchmarks/run_benchmarks.py
+#
+# Offline benchmark of the EOD stages on a synthetic universe:
+#
+#   python benchmarks/run_benchmarks.py                        # 500 × 7,500
+#   python benchmarks/run_benchmarks.py --symbols 5000 --keep  # reusable tree
+#   python benchmarks/run_benchmarks.py --only load,snapshots
+#
+# The universe is generated (deterministically, per --symbols / --bars /
+# --seed) into a scratch data directory that every script is pointed at
+# through EOD_DATA_DIR, so the real data/ is never touched. Each stage's
+# time, throughput (daily bars / second) and peak RSS growth are
+# appended to benchmarks/results.jsonl and compared with the last run
+# of the same universe.
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASE_DIR = BENCH_DIR.parent
+RESULTS_FILE = BENCH_DIR / "results.jsonl"
+
+# Slower than the previous run by more than this is reported
+REGRESSION = 0.2
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+            capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+def read_results(path=RESULTS_FILE):
+    if not path.exists():
+        return []
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def previous_result(results, universe):
+    for result in reversed(results):
+        if result["universe"] == universe:
+            return result
+    return None
+
+def report(result, previous):
+    print(f"\n{'stage':<24}{'seconds':>10}{'bars/s':>14}{'peak MB':>10}{'vs last':>10}")
+    for name, m in result["stages"].items():
+        change = ""
+        if previous is not None and name in previous["stages"]:
+            before = previous["stages"][name]["seconds"]
+            if before > 0:
+                ratio = m["seconds"] / before - 1
+                change = f"{ratio:+.0%}" + (" ⚠️" if ratio > REGRESSION else "")
+        peak = "" if m["peak_mb"] is None else f"{m['peak_mb']:.0f}"
+        print(f"{name:<24}{m['seconds']:>10.3f}{m['bars_per_sec']:>14,.0f}{peak:>10}{change:>10}")
+    print(f"\n📈 Max RSS {result['max_rss_mb']:.0f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the EOD stages offline")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--bars", type=int, default=7500, help="sessions per full history")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--csv-symbols", type=int, default=50,
+        help="stocks that get a CSV mirror for the normalize benchmark"
+    )
+    parser.add_argument("--only", type=lambda s: s.split(","), help="comma-separated stages")
+    parser.add_argument(
+        "--workdir", type=Path,
+        help="scratch directory to generate into (kept; reused when the universe matches)"
+    )
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    parser.add_argument("--no-memory", action="store_true", help="skip RSS sampling")
+    parser.add_argument(
+        "--no-save", action="store_true", help=f"do not append to {RESULTS_FILE.name}"
+    )
+    args = parser.parse_args()
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="eod-bench-"))
+    data_dir = workdir / "data"
+    os.environ["EOD_DATA_DIR"] = str(data_dir)
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, str(BASE_DIR / "scripts"))
+
+    # The scripts fix their data paths on import, so they come in only now
+    import stages
+    import synthetic
+
+    unknown = set(args.only or ()) - set(stages.STAGE_NAMES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    universe = synthetic.spec(args.symbols, args.bars, args.seed)
+    existing = synthetic.read_spec()
+    if existing is not None and all(existing.get(k) == v for k, v in universe.items()):
+        symbols = [synthetic.symbol_name(i) for i in range(args.symbols)]
+        args.csv_symbols = existing["csv_symbols"]
+        print(f"♻️ Reusing universe in {data_dir}")
+    else:
+        if data_dir.exists():
+            shutil.rmtree(data_dir)
+        print(f"🧪 Generating {args.symbols} × {args.bars} bars (seed {args.seed}) in {data_dir}")
+        started = time.perf_counter()
+        symbols = synthetic.generate(args.symbols, args.bars, args.seed, args.csv_symbols)
+        print(f"   done in {time.perf_counter() - started:.1f}s")
+
+    out_dir = workdir / "out"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ctx = stages.Context(symbols, min(args.csv_symbols, len(symbols)), out_dir)
+
+    results = {}
+    for name, fn in stages.STAGES:
+        # Later stages work on the bars the load stage read
+        if args.only and name not in args.only and name != "load":
+            continue
+        m = stages.measure(fn, ctx, memory=not args.no_memory)
+        results[name] = {
+            "seconds": round(m.seconds, 4),
+            "rows": m.rows,
+            "bars_per_sec": round(m.rows / m.seconds, 1) if m.seconds > 0 else None,
+            "peak_mb": None if m.peak_mb is None else round(m.peak_mb, 1),
+        }
+        print(f"⏱️ {name}: {m.seconds:.3f}s")
+
+    if "update" in results:
+        # The appended bars make the tree differ from its spec
+        (synthetic.storage.DATA_DIR / synthetic.SPEC_FILE).unlink(missing_ok=True)
+
+    import numpy
+    import pandas
+    result = {
+        "run": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "commit": git_commit(),
+        "universe": universe,
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "cpus": os.cpu_count(),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": results,
+    }
+
+    history = read_results()
+    report(result, previous_result(history, universe))
+    if not args.no_save:
+        with open(RESULTS_FILE, "a") as f:
+            f.write(json.dumps(result) + "\n")
+        print(f"✅ Results appended to {RESULTS_FILE.relative_to(BASE_DIR)}")
+
+    if args.workdir is None and not args.keep:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# benchmarks/stages.py
+#
+# One benchmark per pipeline stage, run in order against the generated
+# universe. Each takes the shared context (symbols, bars loaded by the
+# "load" stage, frames built by earlier stages) and returns the number
+# of daily bars it processed, which turns seconds into throughput.
+#
+# Import after EOD_DATA_DIR is set: storage fixes its paths on import.
+
+import gc
+import io
+import os
+import time
+from collections import namedtuple
+from contextlib import nullcontext, redirect_stdout
+
+import numpy as np
+
+import build_snapshots
+import build_weekly_monthly_candles
+import candles
+import generate_coverage_report
+import instrument
+import normalize_stock_csvs
+import storage
+import validate_ohlcv
+
+Measurement = namedtuple("Measurement", ["seconds", "rows", "peak_mb"])
+
+class Context:
+    def __init__(self, symbols, csv_symbols, out_dir):
+        self.symbols = symbols
+        self.csv_symbols = csv_symbols
+        self.out_dir = out_dir
+        self.bars = {}          # universe → {symbol: {column: array}}
+        self.frames = {}        # timeframe → panel-engine snapshot frame
+
+    def rows(self, universe="stocks"):
+        return int(sum(len(a[storage.DATE_COLUMN]) for a in self.bars[universe].values()))
+
+# ------------------------
+# Stages
+# ------------------------
+def bench_load(ctx):
+    # As the pipeline's DailyBars: memory-mapped, then copied into RAM
+    for universe in ("indices", "stocks"):
+        loaded = build_snapshots.load_daily(universe, storage.list_symbols(universe))
+        ctx.bars[universe] = {
+            symbol: {col: np.array(values) for col, values in arrays.items()}
+            for symbol, arrays in loaded.items()
+        }
+    return ctx.rows()
+
+def bench_normalize(ctx):
+    sample = ctx.symbols[:ctx.csv_symbols]
+    normalize_stock_csvs.normalize_stocks(sample, force=True)
+    return int(sum(len(ctx.bars["stocks"][s][storage.DATE_COLUMN]) for s in sample))
+
+def bench_resample(ctx):
+    for timeframe in candles.RULES:
+        for arrays in ctx.bars["stocks"].values():
+            candles.resample_arrays(arrays, timeframe)
+    return ctx.rows()
+
+def bench_validate(ctx):
+    validate_ohlcv.validate(ctx.bars["stocks"])
+    return ctx.rows()
+
+def _frames(ctx, engine, rebuild_state=False):
+    return {
+        timeframe: build_snapshots.build_universe_frame(
+            "stocks", timeframe,
+            build_snapshots.resample_bars(ctx.bars["stocks"], timeframe, engine),
+            engine, rebuild_state,
+        )[0]
+        for timeframe in build_snapshots.TIMEFRAMES
+    }
+
+def bench_indicators_panel(ctx):
+    ctx.frames = _frames(ctx, "panel")
+    return ctx.rows()
+
+def bench_indicators_state_cold(ctx):
+    _frames(ctx, "state", rebuild_state=True)
+    return ctx.rows()
+
+def bench_indicators_state_warm(ctx):
+    # Every state is fresh: the nightly cost of hashing and reloading
+    _frames(ctx, "state")
+    return ctx.rows()
+
+def bench_confidence(ctx):
+    build_snapshots.confidence_scores(
+        ctx.frames["daily"], ctx.frames["weekly"], ctx.frames["monthly"]
+    )
+    return len(ctx.frames["daily"])
+
+def bench_snapshots(ctx):
+    # End to end: validation, adjustment, resampling, state, confidence
+    build_snapshots.build_all(daily=ctx.bars, force=True)
+    return ctx.rows()
+
+def bench_candles(ctx):
+    build_weekly_monthly_candles.build_candles("stocks", full=True, daily=ctx.bars["stocks"])
+    return ctx.rows()
+
+def bench_coverage(ctx):
+    generate_coverage_report.coverage_report(out=str(ctx.out_dir / "coverage.csv"))
+    return len(ctx.symbols)
+
+def bench_update(ctx):
+    # Offline: the yfinance stand-in serves every missing session
+    os.environ["YF_STUB"] = "1"
+    os.environ.setdefault("YF_STUB_LATENCY", "0")
+    import update_daily_stocks
+
+    before = ctx.rows()
+    update_daily_stocks.update_stocks(ctx.symbols, workers=1, rate=0, retries=0)
+    after = sum(storage.read_meta("stocks", s)["rows"] for s in ctx.symbols)
+    return int(after - before)
+
+# The update stage appends bars, so it runs last
+STAGES = [
+    ("load", bench_load),
+    ("normalize", bench_normalize),
+    ("resample", bench_resample),
+    ("validate", bench_validate),
+    ("indicators_panel", bench_indicators_panel),
+    ("indicators_state_cold", bench_indicators_state_cold),
+    ("indicators_state_warm", bench_indicators_state_warm),
+    ("confidence", bench_confidence),
+    ("snapshots", bench_snapshots),
+    ("candles", bench_candles),
+    ("coverage", bench_coverage),
+    ("update", bench_update),
+]
+STAGE_NAMES = [name for name, _ in STAGES]
+
+# ------------------------
+# Measuring
+# ------------------------
+# tracemalloc slows the pandas-heavy stages by an order of magnitude, so
+# peak memory is the resident set sampled from a side thread instead
+def measure(fn, ctx, memory=True):
+    """Run one stage quietly; peak_mb is its RSS growth over the start."""
+    gc.collect()
+    base = instrument.rss_mb() if memory else None
+    sampler = instrument.PeakRSS() if base is not None else nullcontext()
+    start = time.perf_counter()
+    with sampler, redirect_stdout(io.StringIO()):
+        rows = fn(ctx)
+    seconds = time.perf_counter() - start
+
+    peak = None if base is None else sampler.peak - base
+    return Measurement(seconds, rows, peak)
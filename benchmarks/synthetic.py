@@ -0,0 +1,108 @@
+# benchmarks/synthetic.py
+#
+# Deterministic synthetic universes for the benchmarks: random-walk
+# OHLCV histories with yfinance's shape (split-adjusted closes, an
+# adj_close, sparse dividends and splits, the odd zero-volume stretch)
+# written through storage like real data. The same (symbols, bars, seed)
+# always produces byte-identical files.
+#
+# Import after EOD_DATA_DIR is set: storage fixes its paths on import.
+
+import json
+
+import numpy as np
+import pandas as pd
+
+import storage
+from build_snapshots import INDEX_LIST
+
+END_DATE = pd.Timestamp("2025-12-31")
+SPEC_FILE = "universe.json"
+
+# Share of symbols listed later than the first bar, and of those with a
+# split whose raw prices were left unadjusted (as in ABB 2007)
+LATE_LISTING = 0.2
+UNADJUSTED_SPLIT = 0.02
+
+def symbol_name(i):
+    return f"SYN{i:05d}"
+
+def ohlcv_frame(dates, rng, volume=True):
+    """One random-walk history on ``dates`` in the store schema."""
+    n = len(dates)
+    returns = rng.normal(0.0003, 0.02, n)
+    close = rng.uniform(20, 2000) * np.exp(np.cumsum(returns))
+    open_ = np.empty(n)
+    open_[0] = close[0]
+    open_[1:] = close[:-1] * np.exp(rng.normal(0, 0.005, n - 1))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.01, n)))
+
+    dividends = np.zeros(n)
+    paid = rng.random(n) < 1 / 250
+    dividends[paid] = close[paid] * rng.uniform(0.002, 0.02, paid.sum())
+    # Each ex-date scales every earlier bar by 1 - dividend / previous close
+    factor = np.cumprod(np.r_[1.0, 1 - dividends[1:] / close[:-1]][::-1])[::-1]
+    adj_close = close * np.r_[factor[1:], 1.0]
+
+    splits = np.zeros(n)
+    if n > 1 and rng.random() < 0.3:
+        day = rng.integers(1, n)
+        splits[day] = rng.choice([2.0, 5.0, 10.0])
+        if rng.random() < UNADJUSTED_SPLIT / 0.3:
+            # Raw prices before the split bar left at their old level
+            for values in (open_, high, low, close):
+                values[:day] *= splits[day]
+
+    vol = np.rint(rng.lognormal(12, 1, n)).astype(np.int64)
+    if not volume:
+        # Index feeds report volume on the odd bar only
+        vol[rng.random(n) >= 0.02] = 0
+    elif rng.random() < 0.1:
+        start = rng.integers(0, n)
+        vol[start:start + rng.integers(1, 20)] = 0
+
+    return pd.DataFrame({
+        "date": dates,
+        "open": open_, "high": high, "low": low, "close": close,
+        "adj_close": adj_close, "volume": vol,
+        "dividends": dividends, "stock_splits": splits,
+    })
+
+def spec(symbols, bars, seed):
+    return {"symbols": symbols, "bars": bars, "seed": seed}
+
+def read_spec():
+    path = storage.DATA_DIR / SPEC_FILE
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def generate(symbols=500, bars=7500, seed=0, csv_symbols=50):
+    """
+    Write ``symbols`` stock histories of up to ``bars`` sessions ending on
+    END_DATE, plus the snapshot indices, into storage.DATA_DIR. Only the
+    first ``csv_symbols`` stocks get a CSV mirror (for the normalize
+    benchmark); the rest live in the store only. Returns the symbols.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=END_DATE, periods=bars)
+
+    for name in INDEX_LIST:
+        df = ohlcv_frame(dates, rng, volume=False)
+        storage.save_ohlcv(df[["date", "open", "high", "low", "close", "volume"]], "indices", name)
+
+    names = []
+    for i in range(symbols):
+        name = symbol_name(i)
+        n = bars if rng.random() >= LATE_LISTING else int(rng.integers(bars // 10, bars))
+        storage.save_ohlcv(ohlcv_frame(dates[-n:], rng), "stocks", name, csv=i < csv_symbols)
+        names.append(name)
+
+    storage.flush_manifest()
+    storage._write_atomic(
+        storage.DATA_DIR / SPEC_FILE,
+        json.dumps({**spec(symbols, bars, seed), "csv_symbols": csv_symbols}), mode="w",
+    )
+    return names
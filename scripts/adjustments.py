@@ -0,0 +1,224 @@
+# scripts/adjustments.py
+#
+# Corporate-action adjustment of stored bars. Each symbol's split and
+# dividend events are turned into per-event price factors once and
+# cached as adjustments.json next to its store columns (committed with
+# the store by every workflow that writes it); adjusted OHLCV
+# is then served at load time by multiplying the raw columns with the
+# cumulative factors, so the raw history is never rewritten.
+#
+#   raw    bars as stored
+#   split  split jumps removed (indicators no longer see fake crashes)
+#   full   split and dividend adjusted (total-return price levels)
+#
+# yfinance's Close is normally split-adjusted already: a recorded split
+# only gets a factor when the raw closes actually jump by its ratio on
+# the split bar (e.g. ABB's 2007 5:1 split). Dividends always do.
+# Appended bars are scanned incrementally; a revised history (the hash
+# of the scanned bars changed) rebuilds the factors from the first bar.
+
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+import storage
+import validate_ohlcv
+
+MODES = ("raw", "split", "full")
+DEFAULT_MODE = "split"
+
+CACHE_FILE = "adjustments.json"
+CACHE_VERSION = 1
+
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+HASH_COLUMNS = ["close", "dividends", "stock_splits"]
+
+# ------------------------
+# Cache
+# ------------------------
+def cache_path(universe, symbol, timeframe="daily"):
+    return storage.store_path(universe, symbol, timeframe) / CACHE_FILE
+
+def read_cache(universe, symbol, timeframe="daily"):
+    path = cache_path(universe, symbol, timeframe)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cache.get("version") != CACHE_VERSION:
+        return None
+    return cache
+
+def write_cache(cache, universe, symbol, timeframe="daily"):
+    path = cache_path(universe, symbol, timeframe)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    storage._write_atomic(path, json.dumps(cache, indent=2), mode="w")
+
+def empty_cache():
+    return {"version": CACHE_VERSION, "rows": 0, "history_hash": history_hash({}, 0), "events": []}
+
+def history_hash(columns, rows):
+    """Hash of the first ``rows`` bars of the columns the factors depend on."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(rows).encode())
+    for col in HASH_COLUMNS:
+        if col in columns:
+            h.update(col.encode())
+            h.update(np.ascontiguousarray(columns[col][:rows], dtype="<f8").tobytes())
+    return h.hexdigest()
+
+# ------------------------
+# Events
+# ------------------------
+def _column(arrays, col, start, stop):
+    if col not in arrays:
+        return np.zeros(stop - start)
+    return np.nan_to_num(np.asarray(arrays[col][start:stop], dtype="f8"))
+
+def scan_events(arrays, start=0):
+    """
+    Split / dividend events on bars ``start`` … end, as
+    [{"date", "split", "dividend"}] where each factor multiplies the
+    prices of every earlier bar.
+    """
+    n = len(arrays[storage.DATE_COLUMN])
+    lo = max(start, 1)          # the first bar has nothing before it to adjust
+    if lo >= n:
+        return []
+
+    close = np.asarray(arrays["close"][lo - 1:n], dtype="f8")
+    prev, cur = close[:-1], close[1:]
+    splits = _column(arrays, "stock_splits", lo, n)
+    dividends = _column(arrays, "dividends", lo, n)
+    dates = arrays[storage.DATE_COLUMN][lo:n]
+
+    _, confirmed = validate_ohlcv.split_moves(prev, cur, splits)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Undo the observed jump: scale earlier bars by the recorded ratio
+        # in whichever direction the price moved
+        size = np.fmax(splits, 1 / splits)
+        split = np.where(confirmed, np.where(prev > cur, 1 / size, size), 1.0)
+        # Ex-dividend drop relative to the previous close (in the
+        # split-adjusted terms of the bars before it)
+        dividend = np.where(
+            (dividends > 0) & (prev * split > dividends),
+            1 - dividends / (prev * split), 1.0,
+        )
+
+    events = []
+    for i in np.flatnonzero((split != 1) | (dividend != 1)):
+        events.append({
+            "date": storage._date_str(dates[i]),
+            "split": float(split[i]),
+            "dividend": float(dividend[i]),
+        })
+    return events
+
+def update_factors(universe, symbol, arrays=None, timeframe="daily", save=True):
+    """
+    Bring one symbol's cached events up to date with its bars and return
+    the cache. Only bars after the cached ones are scanned unless the
+    cached history changed.
+    """
+    if arrays is None:
+        arrays = storage.open_columns(universe, symbol, timeframe, HASH_COLUMNS)
+        if arrays is None:
+            df = storage.load_ohlcv(universe, symbol, timeframe, columns=HASH_COLUMNS)
+            arrays = {col: df[col].to_numpy() for col in df.columns}
+
+    n = len(arrays[storage.DATE_COLUMN])
+    cache = read_cache(universe, symbol, timeframe)
+    current = history_hash(arrays, n)
+
+    if cache is not None and cache["rows"] == n and cache["history_hash"] == current:
+        return cache
+    if (
+        cache is None
+        or cache["rows"] > n
+        or cache["history_hash"] != history_hash(arrays, cache["rows"])
+    ):
+        cache = empty_cache()
+
+    cache["events"] += scan_events(arrays, cache["rows"])
+    cache["rows"] = n
+    cache["history_hash"] = current
+    if save:
+        write_cache(cache, universe, symbol, timeframe)
+    return cache
+
+# ------------------------
+# Serving adjusted bars
+# ------------------------
+def cumulative_factors(events, dates, mode=DEFAULT_MODE):
+    """
+    (price factor, volume factor) per bar: the product of every later
+    event's factors, so the last bar is always unadjusted.
+    """
+    dates = np.asarray(dates).astype(storage.DATE_DTYPE)
+    ones = np.ones(len(dates))
+    if mode == "raw" or not events:
+        return ones, ones
+
+    event_dates = np.array([e["date"] for e in events], dtype=storage.DATE_DTYPE)
+    split = np.array([e["split"] for e in events])
+    dividend = np.array([e["dividend"] for e in events]) if mode == "full" else np.ones(len(events))
+
+    # suffix[k] = product of the factors of events k … end
+    price = np.append(np.cumprod((split * dividend)[::-1])[::-1], 1.0)
+    volume = np.append(np.cumprod(split[::-1])[::-1], 1.0)
+
+    idx = np.searchsorted(event_dates, dates, side="right")
+    return price[idx], 1 / volume[idx]
+
+def adjust_arrays(arrays, events, mode=DEFAULT_MODE):
+    """Adjusted copy of {column: array} (the input itself when nothing changes)."""
+    if mode not in MODES:
+        raise ValueError(f"unknown adjustment mode {mode}")
+    price, volume = cumulative_factors(events, arrays[storage.DATE_COLUMN], mode)
+    if (price == 1).all() and (volume == 1).all():
+        return arrays
+
+    out = dict(arrays)
+    for col in PRICE_COLUMNS:
+        if col in out:
+            out[col] = np.asarray(out[col], dtype="f8") * price
+    if "volume" in out:
+        raw = np.asarray(out["volume"])
+        scaled = raw.astype("f8") * volume
+        out["volume"] = np.rint(scaled).astype(raw.dtype) if raw.dtype.kind in "iu" else scaled
+    return out
+
+def adjust_frame(df, events, mode=DEFAULT_MODE):
+    arrays = adjust_arrays({col: df[col].to_numpy() for col in df.columns}, events, mode)
+    return pd.DataFrame(arrays)
+
+def adjust_bars(universe, bars, mode=DEFAULT_MODE):
+    """
+    Adjust {symbol: {column: array} or DataFrame} bars in memory, reading
+    (and refreshing) each symbol's cached factors.
+    """
+    if mode == "raw":
+        return bars
+    out = {}
+    for symbol, data in bars.items():
+        frame = isinstance(data, pd.DataFrame)
+        arrays = {col: data[col].to_numpy() for col in data.columns} if frame else data
+        events = update_factors(universe, symbol, arrays)["events"]
+        if frame:
+            out[symbol] = adjust_frame(data, events, mode) if events else data
+        else:
+            out[symbol] = adjust_arrays(arrays, events, mode)
+    return out
+
+def load_adjusted(universe, symbol, mode=DEFAULT_MODE, columns=None, tail=None, start=None):
+    """storage.load_ohlcv() with prices (and volume) adjusted per ``mode``."""
+    df = storage.load_ohlcv(universe, symbol, columns=columns, tail=tail, start=start)
+    if mode == "raw":
+        return df
+    events = update_factors(universe, symbol)["events"]
+    return adjust_frame(df, events, mode)
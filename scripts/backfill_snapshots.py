@@ -0,0 +1,403 @@
+# scripts/backfill_snapshots.py
+#
+# Historical snapshot backfill: the full daily snapshot row (indicators,
+# pivots, trend, flags, confidence_score) for every symbol on every date
+# of a range, as the nightly job would have produced it that evening.
+#
+#   python scripts/backfill_snapshots.py --universe stocks --start 2015-01-01
+#
+# History is streamed in calendar blocks. Each block is one (symbols ×
+# bars) panel of the block's bars plus a RING_BARS lookback for the
+# rolling windows; EMA and VWAP recurrences are carried from block to
+# block, so memory depends on the block size, not on the history length.
+#
+# Weekly / monthly trends use only bars known on each date: the weekly
+# and monthly candle job resamples the daily bars every day, so on date D
+# the latest weekly / monthly bar is the partial period through D.
+#
+# Output is one file per date under backfill/<universe>/<YYYY>/, written
+# atomically; dates that already have a partition are skipped, so an
+# interrupted run resumes where it stopped (use --force to recompute).
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import build_snapshots
+import candles
+import indicator_state
+import panel
+import storage
+
+# ------------------------
+# Defaults
+# ------------------------
+OUT_DIR = storage.BASE_DIR / "backfill"
+BLOCK_DAYS = 365
+LOOKBACK = indicator_state.RING_BARS
+
+TREND_LABELS = np.array(["Sideways", "Bullish", "Bearish"], dtype=object)
+
+# ------------------------
+# Output partitions
+# ------------------------
+FORMATS = ("csv", "parquet")
+
+def partition_path(out_dir, universe, date, fmt="csv"):
+    date = pd.Timestamp(date)
+    return out_dir / universe / f"{date.year:04d}" / f"{date:%Y-%m-%d}.{fmt}"
+
+def write_partition(df, path):
+    """Atomic write; Parquet needs pyarrow, which is optional."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    if path.suffix == ".parquet":
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    tmp.replace(path)
+
+# ------------------------
+# Weekly / monthly trend as known on each daily bar
+# ------------------------
+def _trend_codes(close, sma20, sma50):
+    with np.errstate(invalid="ignore"):
+        bullish = (close > sma20) & (sma20 > sma50)
+        bearish = (close < sma20) & (sma20 < sma50)
+    return np.select([bullish, bearish], [1, 2], 0).astype(np.int8)
+
+def _sma_as_of(prefix, m, partial, has_partial, n):
+    """
+    SMA(n) of the resampled closes as of each daily bar: the ``m`` closed
+    periods before the bar's period (prefix sums ``prefix``), plus the
+    partial current period when it has a bar.
+    """
+    with np.errstate(invalid="ignore"):
+        with_partial = np.where(
+            m >= n - 1,
+            (prefix[m] - prefix[np.maximum(m - (n - 1), 0)] + partial) / n,
+            np.nan,
+        )
+        closed_only = np.where(
+            m >= n, (prefix[m] - prefix[np.maximum(m - n, 0)]) / n, np.nan
+        )
+    return np.where(has_partial, with_partial, closed_only)
+
+def resampled_trend(dates, open_, high, low, close, timeframe):
+    """
+    detect_trend() of the weekly / monthly series as it looked on each
+    daily bar (-1 where no resampled bar existed yet), without reading
+    any later bar. Matches resample(...).agg(first/max/min/last).dropna().
+    """
+    n = len(dates)
+    if n == 0:
+        return np.empty(0, dtype=np.int8)
+
+    period = candles.period_ids(dates, timeframe)
+    starts = np.flatnonzero(np.r_[True, period[1:] != period[:-1]])
+    group_start = np.repeat(starts, np.diff(np.r_[starts, n]))
+
+    ok = ~(np.isnan(open_) | np.isnan(high) | np.isnan(low) | np.isnan(close))
+    last_ok = np.maximum.accumulate(np.where(ok, np.arange(n), -1))
+    has_partial = last_ok >= group_start
+    partial = np.where(has_partial, close[np.maximum(last_ok, 0)], np.nan)
+
+    # Closed periods: the state at each period's last bar, kept if it had a bar
+    ends = np.r_[starts[1:], n] - 1
+    kept = has_partial[ends]
+    closed = partial[ends][kept]
+    closed_start = starts[kept]
+    prefix = np.r_[0.0, np.cumsum(closed)]
+
+    # Closed periods strictly before each bar's own period
+    m = np.searchsorted(closed_start, group_start, side="left")
+
+    sma20 = _sma_as_of(prefix, m, partial, has_partial, 20)
+    sma50 = _sma_as_of(prefix, m, partial, has_partial, 50)
+    previous = np.r_[np.nan, closed][m]         # latest closed period, NaN if none
+    last_close = np.where(has_partial, partial, previous)
+
+    codes = _trend_codes(last_close, sma20, sma50)
+    return np.where(has_partial | (m > 0), codes, -1).astype(np.int8)
+
+# ------------------------
+# Streaming
+# ------------------------
+class Universe:
+    """Memory-mapped columns and running recurrences for every symbol."""
+
+    def __init__(self, universe, symbols):
+        self.universe = universe
+        self.symbols, self.arrays = [], []
+
+        for symbol in symbols:
+            if not storage.exists(universe, symbol):
+                continue
+            try:
+                arrays = indicator_state._open(universe, symbol, "daily")
+            except ValueError:
+                continue
+            arrays[storage.DATE_COLUMN] = np.asarray(
+                arrays[storage.DATE_COLUMN]
+            ).astype(storage.DATE_DTYPE)
+            self.symbols.append(symbol)
+            self.arrays.append(arrays)
+
+        self.raw_columns = []
+        for arrays in self.arrays:
+            for col in arrays:
+                if col != storage.DATE_COLUMN and col not in self.raw_columns:
+                    self.raw_columns.append(col)
+
+        S = len(self.symbols)
+        self.ema = {span: (np.full(S, np.nan), np.ones(S)) for span in panel.EMA_SPANS}
+        self.vwap_num = np.zeros(S)
+        self.vwap_den = np.zeros(S)
+        self.consumed = np.zeros(S, dtype=np.int64)
+
+        self.trends = {}
+        for tf in ("weekly", "monthly"):
+            self.trends[tf] = [
+                resampled_trend(
+                    a[storage.DATE_COLUMN],
+                    indicator_state._float(a, "open"), indicator_state._float(a, "high"),
+                    indicator_state._float(a, "low"), indicator_state._float(a, "close"),
+                    tf,
+                )
+                for a in self.arrays
+            ]
+
+    def dates(self):
+        """Every trading date any symbol has, sorted."""
+        if not self.arrays:
+            return np.empty(0, dtype=storage.DATE_DTYPE)
+        return np.unique(np.concatenate([a[storage.DATE_COLUMN] for a in self.arrays]))
+
+    def block(self, end, lookback):
+        """
+        Bars up to ``end`` not consumed yet, right-aligned with ``lookback``
+        earlier bars. Returns (first, stop, width) per symbol arrays.
+        """
+        stop = np.array([
+            np.searchsorted(a[storage.DATE_COLUMN], end, side="right") for a in self.arrays
+        ], dtype=np.int64)
+        first = np.maximum(self.consumed - lookback, 0)
+        width = int((stop - first).max(initial=0))
+        return first, stop, width
+
+    def matrix(self, col, first, stop, width):
+        out = np.full((len(self.symbols), width), np.nan)
+        for i, a in enumerate(self.arrays):
+            k = stop[i] - first[i]
+            if k > 0 and col in a:
+                out[i, width - k:] = np.asarray(a[col][first[i]:stop[i]], dtype="f8")
+        return out
+
+    def advance(self, end, emit=True):
+        """
+        Consume every bar up to ``end``. Returns the indicator matrices of
+        the block (or None when nothing was emitted) for the new bars.
+        """
+        first, stop, width = self.block(end, LOOKBACK if emit else 0)
+        new = stop - self.consumed
+        if width == 0 or new.max(initial=0) <= 0:
+            return None
+
+        cols = {c: self.matrix(c, first, stop, width) for c in ("high", "low", "close", "volume")}
+        close = cols["close"]
+        position = np.arange(width)
+        is_new = position[None, :] >= (width - new)[:, None]
+
+        out = {}
+        for span in panel.EMA_SPANS:
+            y, w = self.ema[span]
+            alpha = 2 / (span + 1)
+            series = np.full_like(close, np.nan) if emit else None
+            for t in range(width):
+                y, w = panel.ema_step(y, w, close[:, t], alpha, active=is_new[:, t])
+                if emit:
+                    series[:, t] = y
+            self.ema[span] = (y, w)
+            out[f"ema{span}"] = series
+
+        tp_vol = (cols["high"] + cols["low"] + close) / 3 * cols["volume"]
+        num = self.vwap_num[:, None] + np.cumsum(np.where(is_new, np.nan_to_num(tp_vol), 0), axis=1)
+        den = self.vwap_den[:, None] + np.cumsum(np.where(is_new, np.nan_to_num(cols["volume"]), 0), axis=1)
+        self.vwap_num, self.vwap_den = num[:, -1], den[:, -1]
+
+        state = (first, stop, width, is_new, close)
+        self.consumed = np.maximum(stop, self.consumed)
+        if not emit:
+            return None
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out["vwap"] = np.where(np.isnan(tp_vol) | np.isnan(cols["volume"]), np.nan, num / den)
+            out["vwap_dist_pct"] = (close - out["vwap"]) / out["vwap"] * 100
+
+        for n in panel.SMA_WINDOWS:
+            out[f"sma{n}"] = panel.sma(close, n)
+        out["bb_upper"], out["bb_middle"], out["bb_lower"] = panel.bollinger(close)
+        out["rsi14"] = panel.rsi(close)
+
+        return state, out
+
+    def rows(self, state, indicators, start, end):
+        """Long-form (symbol, date) snapshot inputs for new bars in [start, end]."""
+        first, stop, width, is_new, close = state
+        dates = self.matrix_dates(first, stop, width)
+        # Padding rows with no close are not bars a snapshot can describe
+        keep = is_new & (dates >= start) & (dates <= end) & ~np.isnan(close)
+        sym_idx, pos = np.nonzero(keep)
+        if len(sym_idx) == 0:
+            return None
+
+        bar = stop[sym_idx] - (width - pos)      # index into each symbol's history
+        # np.nonzero is row-major, so each symbol's rows are one slice
+        bounds = np.searchsorted(sym_idx, np.arange(len(self.symbols) + 1))
+        spans = [
+            (i, slice(bounds[i], bounds[i + 1]))
+            for i in range(len(self.symbols)) if bounds[i + 1] > bounds[i]
+        ]
+
+        last = {storage.DATE_COLUMN: pd.to_datetime(dates[sym_idx, pos].astype("datetime64[ns]"))}
+        for col in self.raw_columns:
+            values = np.full(len(bar), np.nan)
+            for i, sel in spans:
+                if col in self.arrays[i]:
+                    values[sel] = self.arrays[i][col][bar[sel]]
+            last[col] = values
+
+        index = pd.Index(np.asarray(self.symbols, dtype=object)[sym_idx], name="symbol")
+        last = pd.DataFrame(last, index=index)
+        if "volume" in last and last["volume"].notna().all():
+            last["volume"] = last["volume"].astype(np.int64)
+        ind = pd.DataFrame({
+            name: indicators[name][sym_idx, pos] for name in panel_order()
+        }, index=index)
+
+        weekly = np.empty(len(bar), dtype=np.int8)
+        monthly = np.empty(len(bar), dtype=np.int8)
+        for i, sel in spans:
+            weekly[sel] = self.trends["weekly"][i][bar[sel]]
+            monthly[sel] = self.trends["monthly"][i][bar[sel]]
+
+        return last, ind, bar + 1, weekly, monthly
+
+    def matrix_dates(self, first, stop, width):
+        out = np.full((len(self.symbols), width), np.datetime64("NaT"), dtype=storage.DATE_DTYPE)
+        for i, a in enumerate(self.arrays):
+            k = stop[i] - first[i]
+            if k > 0:
+                out[i, width - k:] = a[storage.DATE_COLUMN][first[i]:stop[i]]
+        return out
+
+def panel_order():
+    """Indicator columns in the order build_snapshot() adds them."""
+    return (
+        [f"sma{n}" for n in panel.SMA_WINDOWS]
+        + [f"ema{span}" for span in panel.EMA_SPANS]
+        + ["vwap", "vwap_dist_pct", "bb_upper", "bb_middle", "bb_lower", "rsi14"]
+    )
+
+def trend_labels(codes):
+    labels = TREND_LABELS[np.maximum(codes, 0)].astype(object)
+    labels[codes < 0] = None
+    return labels
+
+def snapshot_rows(universe, state, indicators, start, end):
+    rows = universe.rows(state, indicators, start, end)
+    if rows is None:
+        return None
+    last, ind, lengths, weekly, monthly = rows
+
+    df = build_snapshots.build_snapshot_frame(last, ind, lengths)
+    df["timeframe"] = "daily"
+
+    weekly, monthly = trend_labels(weekly), trend_labels(monthly)
+    df["confidence_score"] = build_snapshots.score_confidence(
+        df, weekly, monthly, on_nan="null"
+    )
+    df["weekly_trend"] = weekly
+    df["monthly_trend"] = monthly
+    return df
+
+# ------------------------
+# Driver
+# ------------------------
+def backfill(universe_name, start, end, out_dir=OUT_DIR, symbols=None,
+             block_days=BLOCK_DAYS, force=False, fmt="csv"):
+    if symbols is None:
+        symbols = (
+            build_snapshots.INDEX_LIST if universe_name == "indices"
+            else storage.list_symbols(universe_name)
+        )
+    universe = Universe(universe_name, symbols)
+    all_dates = universe.dates()
+    if len(all_dates) == 0:
+        print(f"⚠️ No data for {universe_name}")
+        return 0
+
+    start = np.datetime64(start or all_dates[0], "D")
+    end = np.datetime64(end or all_dates[-1], "D")
+    print(f"📚 Backfilling {len(universe.symbols)} {universe_name} from {start} to {end}")
+
+    step = np.timedelta64(block_days, "D")
+
+    # Recurrences need every bar before the range, but not their rows
+    warm = all_dates[0]
+    while warm < start:
+        universe.advance(min(warm + step, start) - np.timedelta64(1, "D"), emit=False)
+        warm += step
+
+    written = skipped = 0
+    block_start = start
+    while block_start <= end:
+        block_end = min(block_start + step - np.timedelta64(1, "D"), end)
+        in_block = all_dates[(all_dates >= block_start) & (all_dates <= block_end)]
+        todo = [d for d in in_block if force or not partition_path(out_dir, universe_name, d, fmt).exists()]
+
+        if not todo:
+            # Every date of the block is on disk; just carry the recurrences
+            universe.advance(block_end, emit=False)
+            skipped += len(in_block)
+        else:
+            state, indicators = universe.advance(block_end)
+            df = snapshot_rows(universe, state, indicators, block_start, block_end)
+            if df is not None:
+                todo = set(pd.to_datetime(np.array(todo, dtype="datetime64[ns]")))
+                for date, rows in df.groupby("date", sort=True):
+                    if date not in todo:
+                        skipped += 1
+                        continue
+                    write_partition(rows, partition_path(out_dir, universe_name, date, fmt))
+                    written += 1
+            print(f"🗓️ {block_start} → {block_end}: {len(in_block)} dates")
+
+        block_start = block_end + np.timedelta64(1, "D")
+
+    print(f"✅ {universe_name}: {written} dates written, {skipped} already done")
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill daily snapshots for every date")
+    parser.add_argument("--universe", choices=sorted(storage.UNIVERSES), action="append",
+                        help="universe to backfill (repeatable, default: all)")
+    parser.add_argument("--start", help="first date (default: first bar)")
+    parser.add_argument("--end", help="last date (default: last bar)")
+    parser.add_argument("--symbols", nargs="+", help="limit to these symbols")
+    parser.add_argument("--out-dir", type=Path, default=OUT_DIR)
+    parser.add_argument("--format", choices=FORMATS, default="csv",
+                        help="partition file format (parquet needs pyarrow)")
+    parser.add_argument("--block-days", type=int, default=BLOCK_DAYS,
+                        help="calendar days per streamed block (bounds memory)")
+    parser.add_argument("--force", action="store_true",
+                        help="recompute dates that already have a partition")
+    args = parser.parse_args()
+
+    for name in args.universe or ["indices", "stocks"]:
+        backfill(
+            name, args.start, args.end, args.out_dir, args.symbols,
+            args.block_days, args.force, args.format,
+        )
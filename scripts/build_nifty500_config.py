@@ -1,27 +1,77 @@
+import argparse
+import sys
 import pandas as pd
 import json
+from datetime import date
 from pathlib import Path
 
+import index_membership
+import storage
+
 # Official NSE NIFTY 500 CSV
 NSE_CSV_URL = "https://archives.nseindia.com/content/indices/ind_nifty500list.csv"
 
 CONFIG_PATH = Path("config/stocks_nifty500.json")
-CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-print("📥 Downloading NIFTY 500 list from NSE...")
-df = pd.read_csv(NSE_CSV_URL)
+def load_index_list(source=NSE_CSV_URL):
+    """{symbol: {"yahoo", "sector"}} from the NSE constituents CSV."""
+    df = pd.read_csv(source)
+
+    stocks = {}
+    for _, row in df.iterrows():
+        symbol = row["Symbol"].strip()
+        stocks[symbol] = {
+            "yahoo": f"{symbol}.NS",
+            "sector": row.get("Industry", "Unknown")
+        }
+    return stocks
+
+def _names(symbols, limit=20):
+    more = f" … (+{len(symbols) - limit})" if len(symbols) > limit else ""
+    return " ".join(symbols[:limit]) + more
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the NIFTY 500 config and its membership history")
+    parser.add_argument("--csv", default=NSE_CSV_URL, help="constituents CSV (default: NSE's)")
+    parser.add_argument("--date", default=str(date.today()), help="date the list is recorded as of")
+    args = parser.parse_args()
+
+    CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-stocks = {}
+    print("📥 Downloading NIFTY 500 list from NSE...")
+    stocks = load_index_list(args.csv)
 
-for _, row in df.iterrows():
-    symbol = row["Symbol"].strip()
-    stocks[symbol] = {
-        "yahoo": f"{symbol}.NS",
-        "sector": row.get("Industry", "Unknown")
-    }
+    # Diff against the recorded members; a first refresh starts the history
+    # from the list it replaces
+    stored = storage.list_symbols("stocks")
+    history = index_membership.load_history(editable=True)
+    if history is None:
+        previous = {}
+        if CONFIG_PATH.exists():
+            with open(CONFIG_PATH, "r") as f:
+                previous = json.load(f)
+        history = index_membership.seed(
+            previous, stored, index_membership.former_members(previous, stored, args.date),
+            args.date, index_membership.first_dates(stored),
+        )
+    try:
+        diff = index_membership.refresh(history, stocks, args.date, stored)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
 
-with open(CONFIG_PATH, "w") as f:
-    json.dump(stocks, f, indent=2)
+    with open(CONFIG_PATH, "w") as f:
+        json.dump(stocks, f, indent=2)
+    index_membership.save_history(history)
 
-print(f"✅ Generated {len(stocks)} NIFTY 500 symbols")
-print(f"📁 Saved to {CONFIG_PATH}")
+    print(f"✅ Generated {len(stocks)} NIFTY 500 symbols")
+    print(f"📁 Saved to {CONFIG_PATH}")
+    if diff["added"]:
+        print(f"➕ {len(diff['added'])} entered: {_names(diff['added'])}")
+    if diff["removed"]:
+        print(f"➖ {len(diff['removed'])} left (marked inactive): {_names(diff['removed'])}")
+    if diff["sector_changed"]:
+        print(f"🔀 {len(diff['sector_changed'])} changed sector: {_names(diff['sector_changed'])}")
+    if history["backfill"]:
+        print(f"⏳ {len(history['backfill'])} symbols queued for historical backfill")
+    print(f"🗂️ Membership history → {index_membership.HISTORY_PATH}")
@@ -1,15 +1,32 @@
 # scripts/build_snapshots.py
 
+import argparse
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
 from pathlib import Path
 
+import adjustments
+import candles
+import index_membership
+import indicator_state
+import instrument
+import panel
+import relative_strength
+import sector_breadth
+import storage
+import validate_ohlcv
+
 # ------------------------
 # Base paths
 # ------------------------
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-RAW_DATA_DIR = BASE_DIR / "data"
+RAW_DATA_DIR = storage.DATA_DIR
 BOT_SNAPSHOT_DIR = BASE_DIR / "precalc"
 
 INDEX_LIST = ["NIFTY50", "BANKNIFTY", "FINNIFTY", "MIDCAP100", "SENSEX"]
@@ -75,6 +92,15 @@ def mean_reversion_flag(row):
 def volatility_flag(row):
     return abs(row["bb_position"]) > 1.0
 
+def detect_trend_frame(df):
+    """detect_trend() for a whole frame of snapshot rows at once."""
+    bullish = (df["close"] > df["sma20"]) & (df["sma20"] > df["sma50"])
+    bearish = (df["close"] < df["sma20"]) & (df["sma20"] < df["sma50"])
+    return pd.Series(
+        np.select([bullish, bearish], ["Bullish", "Bearish"], "Sideways"),
+        index=df.index,
+    )
+
 # ------------------------
 # Confidence score
 # ------------------------
@@ -144,7 +170,7 @@ def confidence_score(daily_row, weekly_row, monthly_row):
 
     if quality == "PARTIAL":
         score -= 10
-    elif quality == "LIMITED":
+    elif quality in ("LIMITED", "SUSPECT"):
         score -= 25
 
     # -------------------------
@@ -166,6 +192,29 @@ def data_quality_flag(df):
         return "PARTIAL"
     return "LIMITED"
 
+def data_quality_flag_rows(rows):
+    """data_quality_flag() from an array of history lengths."""
+    rows = np.asarray(rows)
+    return np.select([rows >= 200, rows >= 60], ["FULL", "PARTIAL"], "LIMITED")
+
+def apply_quality(df, issues):
+    """
+    Downgrade the length-based data_quality_flag with validate_ohlcv
+    results (indexed by symbol): errors in the recent bars make a row
+    SUSPECT, warnings there cap it at PARTIAL.
+    """
+    if issues is None or df.empty:
+        return df
+    found = issues.reindex(df["symbol"])
+    errors = found["recent_errors"].fillna(0).to_numpy() > 0
+    warnings = found["recent_warnings"].fillna(0).to_numpy() > 0
+
+    flag = df["data_quality_flag"].to_numpy()
+    df["data_quality_flag"] = np.select(
+        [errors, warnings & (flag == "FULL")], ["SUSPECT", "PARTIAL"], flag
+    )
+    return df
+
 # ------------------------
 # Build snapshot row
 # ------------------------
@@ -224,134 +273,621 @@ def build_snapshot(df, symbol):
     return row
 
 # ------------------------
-# SNAPSHOT BUILDERS
+# Build snapshot rows for a whole panel (vectorized)
 # ------------------------
+def build_snapshot_frame(last, indicators, lengths):
+    """
+    Same rows as build_snapshot() for many symbols at once, from the raw
+    last rows and last-bar indicators (both indexed by symbol) and each
+    symbol's history length.
+    """
+    df = pd.concat([last, indicators], axis=1)
 
-def build_indices_snapshot(timeframe):
-    rows = []
+    pivots = pivot_levels(df["high"], df["low"], df["close"])
+    for col, values in pivots.items():
+        df[col] = values
 
-    for symbol in INDEX_LIST:
-        if timeframe == "daily":
-            file_path = RAW_DATA_DIR / "indices" / f"{symbol}.csv"
-        else:
-            file_path = RAW_DATA_DIR / "indices" / timeframe / f"{symbol}.csv"
+    df["symbol"] = df.index
+    df["trend"] = detect_trend_frame(df)
+    df["trend_alignment"] = df["trend"]
 
-        if not file_path.exists():
-            continue
+    df["sma5_dist_pct"] = (df["close"] - df["sma5"]) / df["sma5"] * 100
+    df["ema20_dist_pct"] = (df["close"] - df["ema20"]) / df["ema20"] * 100
 
-        df = pd.read_csv(file_path)
-        snapshot = build_snapshot(df, symbol)
-        snapshot["timeframe"] = timeframe
-        rows.append(snapshot)
+    band = df["bb_upper"] - df["bb_middle"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["bb_position"] = np.where(band != 0, (df["close"] - df["bb_middle"]) / band, 0)
 
-    return pd.DataFrame(rows)
+    df["mean_reversion_flag"] = mean_reversion_flag(df)
+    df["volatility_flag"] = volatility_flag(df)
+    df["data_quality_flag"] = data_quality_flag_rows(lengths)
 
+    return df.reset_index(drop=True)
 
-def build_stocks_snapshot(timeframe):
-    rows = []
+# ------------------------
+# SNAPSHOT BUILDERS
+# ------------------------
+ENGINES = ("state", "panel", "series")
+TIMEFRAMES = storage.TIMEFRAMES
+CHUNK_SIZE = 50   # symbols per worker job
 
-    for file in STOCK_DIR.glob("*.csv"):
-        symbol = file.stem
-        df = pd.read_csv(file)
-        snapshot = build_snapshot(df, symbol)
-        snapshot["timeframe"] = timeframe
-        rows.append(snapshot)
+SnapshotJob = namedtuple(
+    "SnapshotJob", ["universe", "symbols", "timeframes", "engine", "rebuild_state", "adjust"]
+)
 
-    return pd.DataFrame(rows)
+def load_daily(universe, symbols, engine="state"):
+    """
+    One read of each symbol's daily bars: {symbol: {column: array}}, or
+    {symbol: DataFrame} for the series engine. Symbols without a file or
+    a date column are left out.
+    """
+    bars = {}
+    for symbol in symbols:
+        if not storage.exists(universe, symbol):
+            continue
+        try:
+            if engine == "series":
+                bars[symbol] = storage.load_ohlcv(universe, symbol, columns=storage.OHLCV_COLUMNS)
+                continue
+            arrays = storage.open_columns(universe, symbol, "daily", storage.OHLCV_COLUMNS)
+            if arrays is None:
+                df = storage.load_ohlcv(universe, symbol, columns=storage.OHLCV_COLUMNS)
+                arrays = {col: df[col].to_numpy() for col in df.columns}
+        except ValueError:
+            continue
+        bars[symbol] = arrays
+    return bars
 
-# ------------------------
-# MAIN EXECUTION
-# ------------------------
+def resample_bars(bars, timeframe, engine="state"):
+    """
+    Weekly / monthly candles from the daily bars load_daily() returned.
+    The series engine goes through pandas resample(), the others through
+    the NumPy reductions, so --verify checks one against the other.
+    """
+    if timeframe == "daily":
+        return bars
+    if engine == "series":
+        return {
+            symbol: candles.resample(df, timeframe).drop(columns="complete")
+            for symbol, df in bars.items()
+        }
+    return {symbol: candles.resample_arrays(arrays, timeframe) for symbol, arrays in bars.items()}
+
+def build_universe_frame(universe, timeframe, bars, engine="state", rebuild_state=False,
+                         issues=None):
+    """
+    Snapshot rows for the in-memory ``bars`` of one timeframe with the
+    given engine, quality flags downgraded by the daily bars' validation
+    ``issues``. Returns (frame, state stats); stats is empty unless
+    engine == "state".
+    """
+    if engine == "state":
+        # The last weekly / monthly candle is still open: it feeds the
+        # snapshot but is not folded into the persisted state
+        kept, states, last_values, lengths, stats = indicator_state.update_states(
+            universe, timeframe, rebuild=rebuild_state, arrays=bars,
+            provisional=0 if timeframe == "daily" else 1,
+        )
+        df = build_snapshot_frame(
+            indicator_state.last_rows(kept, last_values),
+            indicator_state.indicator_frame(kept, states, last_values),
+            lengths,
+        )
+        return apply_quality(df, issues), stats
+
+    if engine == "panel":
+        p = panel.panel_from_arrays(bars)
+        df = build_snapshot_frame(panel.last_rows(p), panel.indicator_frame(p), p.lengths)
+        return apply_quality(df, issues), {}
+
+    rows = [build_snapshot(df, symbol) for symbol, df in bars.items()]
+    return apply_quality(pd.DataFrame(rows), issues), {}
+
+def build_chunk(universe, symbols, timeframes=TIMEFRAMES, engine="state",
+                rebuild_state=False, daily=None, adjust=adjustments.DEFAULT_MODE):
+    """
+    Every timeframe's (frame, stats) for ``symbols`` from one daily read,
+    or from ``daily`` ({symbol: {column: array}}) when already in memory.
+    The raw daily bars are validated once for the quality flags of every
+    timeframe, then adjusted for corporate actions per ``adjust``.
+    """
+    if daily is None or engine == "series":
+        daily = load_daily(universe, symbols, engine)
+    else:
+        daily = {symbol: daily[symbol] for symbol in symbols if symbol in daily}
+    instrument.add_rows(sum(len(bars[storage.DATE_COLUMN]) for bars in daily.values()))
+    issues = validate_ohlcv.validate(daily, volume=universe not in validate_ohlcv.NO_VOLUME)
+    daily = adjustments.adjust_bars(universe, daily, adjust)
+    return {
+        timeframe: build_universe_frame(
+            universe, timeframe, resample_bars(daily, timeframe, engine), engine, rebuild_state,
+            issues,
+        )
+        for timeframe in timeframes
+    }
 
-def main():
-    BOT_SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+def run_snapshot_job(job, daily=None):
+    """
+    Worker entry point. Builds one chunk of symbols for all its timeframes;
+    if the chunk fails, each symbol is retried on its own so one bad file
+    only drops itself.
+    Returns ({timeframe: (frame, stats)}, [(symbol, error)]).
+    """
+    # The chunk is vectorized: it is timed as a whole, labelled by its range
+    label = f"{job.universe}/{job.symbols[0]}" if job.symbols else job.universe
+    if len(job.symbols) > 1:
+        label += f"..{job.symbols[-1]}"
+    try:
+        with instrument.symbol(label):
+            return build_chunk(
+                job.universe, job.symbols, job.timeframes, job.engine, job.rebuild_state, daily,
+                job.adjust,
+            ), []
+    except Exception:
+        pass
+
+    parts, failures = {tf: ([], {}) for tf in job.timeframes}, []
+    for symbol in job.symbols:
+        try:
+            with instrument.symbol(f"{job.universe}/{symbol}"):
+                built = build_chunk(
+                    job.universe, [symbol], job.timeframes, job.engine, job.rebuild_state, daily,
+                    job.adjust,
+                )
+        except Exception as e:
+            failures.append((symbol, f"{type(e).__name__}: {e}"))
+            continue
+        for timeframe, (df, sym_stats) in built.items():
+            frames, stats = parts[timeframe]
+            frames.append(df)
+            for name, count in sym_stats.items():
+                stats[name] = stats.get(name, 0) + count
+
+    results = {}
+    for timeframe, (frames, stats) in parts.items():
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        results[timeframe] = (df, stats)
+    return results, failures
+
+def make_jobs(targets, engine="state", rebuild_state=False, chunk_size=CHUNK_SIZE,
+              adjust=adjustments.DEFAULT_MODE):
+    """targets: (universe, symbols, timeframes) tuples → chunked SnapshotJobs."""
+    jobs = []
+    for universe, symbols, timeframes in targets:
+        symbols = list(symbols)
+        for i in range(0, len(symbols), max(1, chunk_size)):
+            jobs.append(SnapshotJob(
+                universe, symbols[i:i + chunk_size], tuple(timeframes), engine, rebuild_state,
+                adjust,
+            ))
+    return jobs
+
+def build_frames(targets, engine="state", workers=1, rebuild_state=False,
+                 chunk_size=CHUNK_SIZE, daily=None, adjust=adjustments.DEFAULT_MODE):
+    """
+    Build snapshot frames for every (universe, symbols, timeframes) target,
+    optionally on a process pool. Each symbol's daily bars are read once
+    per job and resampled in memory for the other timeframes; ``daily``
+    ({universe: {symbol: {column: array}}}) hands in bars another stage
+    already holds, and keeps the build in this process. Chunks are
+    reassembled in submission order, so output is identical whatever
+    order workers finish in. ``adjust`` is the adjustments mode the
+    indicators see (split-adjusted by default).
+    Returns ({(universe, timeframe): frame}, [(universe, symbol, error)]).
+    """
+    jobs = make_jobs(targets, engine, rebuild_state, chunk_size, adjust)
+
+    if daily is not None:
+        results = [run_snapshot_job(job, daily.get(job.universe)) for job in jobs]
+    elif workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(run_snapshot_job, jobs))
+    else:
+        results = [run_snapshot_job(job) for job in jobs]
+
+    parts, stats, failures = {}, {}, []
+    for job, (built, job_failures) in zip(jobs, results):
+        for timeframe, (df, job_stats) in built.items():
+            key = (job.universe, timeframe)
+            parts.setdefault(key, []).append(df)
+            totals = stats.setdefault(key, {})
+            for name, count in job_stats.items():
+                totals[name] = totals.get(name, 0) + count
+        failures.extend((job.universe, symbol, error) for symbol, error in job_failures)
+
+    frames = {}
+    for universe, _, timeframes in targets:
+        for timeframe in timeframes:
+            key = (universe, timeframe)
+            chunks = [df for df in parts.get(key, []) if not df.empty]
+            frames[key] = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+            if stats.get(key):
+                counts = stats[key]
+                print(
+                    f"🧮 {universe}/{timeframe} state: {counts.get('fresh', 0)} fresh, "
+                    f"{counts.get('advanced', 0)} advanced, {counts.get('rebuilt', 0)} rebuilt"
+                )
+
+    return frames, failures
+
+def report_failures(failures):
+    for universe, symbol, error in failures:
+        print(f"❌ {universe}/{symbol}: {error}")
+
+def build_universe_snapshot(universe, symbols, timeframe, engine="state",
+                            rebuild_state=False, workers=1):
+    frames, failures = build_frames(
+        [(universe, symbols, [timeframe])], engine, workers, rebuild_state
+    )
+    report_failures(failures)
+    df = frames[(universe, timeframe)]
+    df["timeframe"] = timeframe
+    return df
+
+def build_indices_snapshot(timeframe, engine="state", rebuild_state=False, workers=1):
+    return build_universe_snapshot(
+        "indices", INDEX_LIST, timeframe, engine, rebuild_state, workers
+    )
 
-# ------------------------
-# Indices (build first)
-# ------------------------
-indices_daily = build_indices_snapshot("daily")
-indices_weekly = build_indices_snapshot("weekly")
-indices_monthly = build_indices_snapshot("monthly")
+
+def build_stocks_snapshot(timeframe, engine="state", rebuild_state=False, workers=1):
+    return build_universe_snapshot(
+        "stocks", storage.list_symbols("stocks"), timeframe, engine, rebuild_state, workers
+    )
 
 # ------------------------
-# APPLY MULTI-TIMEFRAME CONFIDENCE
+# MULTI-TIMEFRAME CONFIDENCE
 # ------------------------
-weekly_map = indices_weekly.set_index("symbol")
-monthly_map = indices_monthly.set_index("symbol")
+def _column(df, name, default):
+    if name in df.columns:
+        return df[name]
+    return pd.Series(default, index=df.index)
 
-confidence_scores = []
+def confidence_scores(daily, weekly, monthly):
+    """
+    confidence_score() for every daily row at once. Weekly and monthly
+    trends are joined on symbol once; symbols missing from either get 0.
+    """
+    trends = pd.DataFrame({
+        "weekly": weekly.drop_duplicates("symbol").set_index("symbol")["trend"],
+    }).join(
+        monthly.drop_duplicates("symbol").set_index("symbol")["trend"].rename("monthly"),
+        how="inner",
+    )
+    joined = daily[["symbol"]].join(trends, on="symbol")
+    return score_confidence(daily, joined["weekly"].to_numpy(), joined["monthly"].to_numpy())
 
-for _, daily_row in indices_daily.iterrows():
-    symbol = daily_row["symbol"]
+def score_confidence(daily, weekly_trend, monthly_trend, on_nan="raise"):
+    """
+    Array form of confidence_score(): ``weekly_trend`` / ``monthly_trend``
+    are aligned with the rows of ``daily`` (None/NaN where the symbol has
+    no such row, which scores 0). Penalties are applied in the same order
+    as the scalar function so the float arithmetic (and rounding) is
+    identical. Rows with NaN indicators raise like the scalar function,
+    or score <NA> with ``on_nan="null"``.
+    """
+    w = np.asarray(weekly_trend, dtype=object)
+    m = np.asarray(monthly_trend, dtype=object)
+    matched = pd.notna(w) & pd.notna(m)
+    d = daily["trend"].to_numpy()
+
+    score = np.full(len(daily), 60.0)
+    score += np.where(np.isin(d, ["Bullish", "Bearish"]), 20, -25)
+
+    for col, factor, cap in (
+        ("sma5_dist_pct", 5, 20),
+        ("ema20_dist_pct", 4, 15),
+        ("vwap_dist_pct", 3, 15),
+    ):
+        values = _column(daily, col, 0).to_numpy(dtype="f8")
+        score -= np.minimum(np.abs(values) * factor, cap)
 
-    if symbol in weekly_map.index and symbol in monthly_map.index:
-        weekly_row = weekly_map.loc[symbol]
-        monthly_row = monthly_map.loc[symbol]
-        score = confidence_score(daily_row, weekly_row, monthly_row)
-    else:
-        score = 0  # safety fallback
+    score -= np.where(_column(daily, "mean_reversion_flag", False).astype(bool), 15, 0)
+    score -= np.where(_column(daily, "volatility_flag", False).astype(bool), 10, 0)
 
-    confidence_scores.append(score)
+    aligned = (d == w) & (w == m) & (d != "Sideways")
+    major = (d != m) & (m != "Sideways")
+    partial = (d != w) & (w != "Sideways")
+    score += np.select([aligned, major, partial], [10, -30, -15], 0)
 
-indices_daily["confidence_score"] = confidence_scores
+    quality = _column(daily, "data_quality_flag", "FULL").to_numpy()
+    score -= np.select(
+        [quality == "PARTIAL", (quality == "LIMITED") | (quality == "SUSPECT")], [10, 25], 0
+    )
 
-# ------------------------
-# SAVE INDICES CSVs
-# ------------------------
-indices_daily.to_csv(
-    BOT_SNAPSHOT_DIR / "indices_daily.csv", index=False
-)
-indices_weekly.to_csv(
-    BOT_SNAPSHOT_DIR / "indices_weekly.csv", index=False
-)
-indices_monthly.to_csv(
-    BOT_SNAPSHOT_DIR / "indices_monthly.csv", index=False
-)
+    bad = matched & np.isnan(score)
+    if bad.any() and on_nan == "raise":
+        # int(round(nan)) in confidence_score() fails the same way
+        raise ValueError(
+            "cannot score NaN indicators for: "
+            + ", ".join(map(str, daily["symbol"].to_numpy()[bad]))
+        )
+
+    score = np.clip(np.round(np.where(matched, score, 0)), 0, 100)
+    if bad.any():
+        return pd.array(np.where(bad, np.nan, score), dtype="Int64")
+    return score.astype(np.int64)
+
+def apply_confidence(daily, weekly, monthly):
+    daily["confidence_score"] = confidence_scores(daily, weekly, monthly)
+    return daily
+
+def confidence_scores_rows(daily, weekly, monthly):
+    """Row-by-row reference implementation (the original iterrows() pass)."""
+    weekly_map = weekly.set_index("symbol")
+    monthly_map = monthly.set_index("symbol")
+
+    confidence_scores = []
+
+    for _, daily_row in daily.iterrows():
+        symbol = daily_row["symbol"]
+
+        if symbol in weekly_map.index and symbol in monthly_map.index:
+            weekly_row = weekly_map.loc[symbol]
+            monthly_row = monthly_map.loc[symbol]
+            score = confidence_score(daily_row, weekly_row, monthly_row)
+        else:
+            score = 0  # safety fallback
 
+        confidence_scores.append(score)
 
-# ------------------------
-# Stocks (build first)
-# ------------------------
-stocks_daily = build_stocks_snapshot("daily")
-stocks_weekly = build_stocks_snapshot("weekly")
-stocks_monthly = build_stocks_snapshot("monthly")
+    return confidence_scores
 
 # ------------------------
-# APPLY MULTI-TIMEFRAME CONFIDENCE (STOCKS)
+# ENGINE REGRESSION CHECK
 # ------------------------
-weekly_map = stocks_weekly.set_index("symbol")
-monthly_map = stocks_monthly.set_index("symbol")
+VERIFY_RTOL = 1e-6
 
-confidence_scores = []
+def compare_snapshots(expected, actual, rtol=VERIFY_RTOL):
+    """
+    Column-by-column comparison of two snapshot frames (keyed by symbol).
+    Returns a list of human-readable mismatches, empty when they agree.
+    """
+    problems = []
+    expected = expected.set_index("symbol").sort_index()
+    actual = actual.set_index("symbol").sort_index()
 
-for _, daily_row in stocks_daily.iterrows():
-    symbol = daily_row["symbol"]
+    if list(expected.index) != list(actual.index):
+        return ["symbol sets differ"]
 
-    if symbol in weekly_map.index and symbol in monthly_map.index:
-        weekly_row = weekly_map.loc[symbol]
-        monthly_row = monthly_map.loc[symbol]
-        score = confidence_score(daily_row, weekly_row, monthly_row)
-    else:
-        score = 0  # safety fallback
+    for col in expected.columns:
+        if col not in actual.columns:
+            problems.append(f"missing column {col}")
+            continue
 
-    confidence_scores.append(score)
+        a, b = expected[col], actual[col]
+        if pd.api.types.is_numeric_dtype(a) and not pd.api.types.is_bool_dtype(a):
+            a = a.astype(float).to_numpy()
+            b = b.astype(float).to_numpy()
+            bad = ~np.isclose(a, b, rtol=rtol, atol=1e-9, equal_nan=True)
+        else:
+            bad = (a.astype(str) != b.astype(str)).to_numpy()
+
+        if bad.any():
+            problems.append(f"{col}: {int(bad.sum())} rows differ (e.g. {expected.index[bad][0]})")
+
+    return problems
+
+def verify_engines():
+    """Build every snapshot with each vectorized engine and compare to series."""
+    failures = 0
+
+    for name, builder in (("indices", build_indices_snapshot), ("stocks", build_stocks_snapshot)):
+        for timeframe in TIMEFRAMES:
+            expected = builder(timeframe, engine="series")
+            for engine in ENGINES:
+                if engine == "series":
+                    continue
+                actual = builder(timeframe, engine=engine)
+                problems = compare_snapshots(expected, actual)
+
+                if problems:
+                    failures += 1
+                    print(f"❌ {name}/{timeframe} [{engine}]: " + "; ".join(problems))
+                else:
+                    print(f"✅ {name}/{timeframe}: {engine} engine matches ({len(actual)} rows)")
+
+    return failures == 0
+
+TRENDS = np.array(["Bullish", "Bearish", "Sideways"])
+QUALITY = np.array(["FULL", "PARTIAL", "LIMITED", "SUSPECT"])
+
+def random_snapshots(n, rng):
+    """Random daily/weekly/monthly frames covering every scoring branch."""
+    symbols = np.array([f"S{i}" for i in range(n)])
+    scale = rng.choice([0.1, 1.0, 10.0], size=(3, n))
+
+    daily = pd.DataFrame({
+        "symbol": symbols,
+        "trend": rng.choice(TRENDS, n),
+        "sma5_dist_pct": rng.normal(0, 1, n) * scale[0],
+        "ema20_dist_pct": rng.normal(0, 1, n) * scale[1],
+        "vwap_dist_pct": rng.normal(0, 1, n) * scale[2],
+        "mean_reversion_flag": rng.random(n) < 0.3,
+        "volatility_flag": rng.random(n) < 0.3,
+        "data_quality_flag": rng.choice(QUALITY, n),
+    })
+    # Exact half-point scores exercise round-half-to-even
+    daily.loc[rng.random(n) < 0.1, "sma5_dist_pct"] = 0.1
+    weekly = pd.DataFrame({"symbol": symbols, "trend": rng.choice(TRENDS, n)})
+    monthly = pd.DataFrame({"symbol": symbols, "trend": rng.choice(TRENDS, n)})
+
+    # Some symbols have no weekly / monthly row
+    weekly = weekly[rng.random(n) > 0.05]
+    monthly = monthly[rng.random(n) > 0.05]
+    return daily, weekly, monthly
+
+def verify_confidence(rounds=50, size=500, seed=0):
+    """confidence_scores() must equal the row-by-row scores exactly."""
+    rng = np.random.default_rng(seed)
+
+    for i in range(rounds):
+        daily, weekly, monthly = random_snapshots(size, rng)
+        expected = confidence_scores_rows(daily, weekly, monthly)
+        actual = confidence_scores(daily, weekly, monthly)
+
+        if list(actual) != list(expected):
+            bad = int(np.sum(np.array(expected) != actual))
+            print(f"❌ confidence: round {i} has {bad} mismatched scores")
+            return False
+
+    print(f"✅ confidence: vectorized scores match ({rounds * size} random rows)")
+    return True
+
+# ------------------------
+# FULL SNAPSHOT SET
+# ------------------------
+def read_snapshot(name, out_dir=None):
+    """A previously written snapshot file (exact floats), or None."""
+    path = (out_dir or BOT_SNAPSHOT_DIR) / f"{name}.csv"
+    if not path.exists():
+        return None
+    try:
+        return pd.read_csv(path, float_precision="round_trip", parse_dates=["date"])
+    except (ValueError, pd.errors.ParserError):
+        return None
+
+def _merge_rows(cached, fresh, symbols):
+    """Cached rows of untouched symbols + freshly built rows, in ``symbols`` order."""
+    cached = cached.drop(columns=["confidence_score", "timeframe"], errors="ignore")
+    parts = [df for df in (cached, fresh) if not df.empty]
+    if not parts:
+        return fresh
+    df = pd.concat(parts, ignore_index=True)
+    order = pd.Index(symbols).get_indexer(df["symbol"])
+    return df.iloc[np.argsort(order, kind="stable")].reset_index(drop=True)
+
+def build_all(engine="state", workers=1, rebuild_state=False, chunk_size=CHUNK_SIZE,
+              daily=None, force=False, adjust=adjustments.DEFAULT_MODE):
+    """
+    Every universe × timeframe snapshot, with confidence scores on the
+    daily rows. Only symbols whose daily bars changed since the last
+    build (per the manifest), or that the previous output files lack,
+    are rebuilt; the others keep their rows from those files.
+    Returns ({"<universe>_<timeframe>": frame}, failures,
+    {universe: symbols rebuilt}).
+    """
+    # Stocks that left the index keep their files but drop out of the snapshots
+    universes = {
+        "indices": INDEX_LIST,
+        "stocks": index_membership.active_symbols(storage.list_symbols("stocks")),
+    }
 
-stocks_daily["confidence_score"] = confidence_scores
+    cached, targets = {}, []
+    for universe, symbols in universes.items():
+        previous = {tf: None if force else read_snapshot(f"{universe}_{tf}") for tf in TIMEFRAMES}
+        if any(df is None for df in previous.values()):
+            cached[universe] = None
+            dirty = list(symbols)
+        else:
+            cached[universe] = previous
+            changed = set(storage.dirty_symbols("snapshots", universe, symbols))
+            present = set.intersection(*(set(df["symbol"]) for df in previous.values()))
+            dirty = [s for s in symbols if s in changed or s not in present]
+            print(f"♻️ {universe}: {len(dirty)} of {len(symbols)} symbols changed")
+        # Daily bars are read once; weekly / monthly are resampled from them.
+        targets.append((universe, dirty, TIMEFRAMES))
+
+    frames, failures = build_frames(
+        targets, engine, workers, rebuild_state, chunk_size, daily, adjust
+    )
+    report_failures(failures)
+
+    snapshots, built = {}, {}
+    failed = {(universe, symbol) for universe, symbol, _ in failures}
+    for universe, dirty, timeframes in targets:
+        built[universe] = [s for s in dirty if (universe, s) not in failed]
+        for timeframe in timeframes:
+            df = frames[(universe, timeframe)]
+            if cached[universe] is not None:
+                previous = cached[universe][timeframe]
+                # Rows of symbols no longer listed (delisted, left the index) go
+                keep = previous["symbol"].isin(universes[universe]) & ~previous["symbol"].isin(dirty)
+                clean = previous[keep]
+                df = _merge_rows(clean, df, universes[universe])
+            df = df.copy()
+            df["timeframe"] = timeframe
+            snapshots[f"{universe}_{timeframe}"] = df
+
+        snapshots[f"{universe}_daily"] = apply_confidence(
+            snapshots[f"{universe}_daily"],
+            snapshots[f"{universe}_weekly"],
+            snapshots[f"{universe}_monthly"],
+        )
+
+    # Beta / correlation / RS move for every symbol as the window shifts
+    relative_strength.add_columns(snapshots, relative_strength.compute(universes))
+    snapshots[sector_breadth.SNAPSHOT_NAME] = sector_breadth.build(snapshots["stocks_daily"])
+    return snapshots, failures, built
+
+def mark_built(built):
+    """Record the rebuilt symbols in the manifest once their rows are written."""
+    for universe, symbols in built.items():
+        storage.mark_clean("snapshots", universe, symbols)
+    storage.flush_manifest()
+
+def write_snapshots(snapshots, out_dir=None):
+    out_dir = out_dir or BOT_SNAPSHOT_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, df in snapshots.items():
+        df.to_csv(out_dir / f"{name}.csv", index=False)
 
 # ------------------------
-# SAVE STOCK CSVs
+# MAIN EXECUTION
 # ------------------------
-stocks_daily.to_csv(
-    BOT_SNAPSHOT_DIR / "stocks_daily.csv", index=False
-)
-stocks_weekly.to_csv(
-    BOT_SNAPSHOT_DIR / "stocks_weekly.csv", index=False
-)
-stocks_monthly.to_csv(
-    BOT_SNAPSHOT_DIR / "stocks_monthly.csv", index=False
-)
 
-print("✅ Snapshot CSVs updated successfully")
+def main():
+    parser = instrument.add_arguments(argparse.ArgumentParser(description="Build EOD snapshot CSVs"))
+    parser.add_argument("--engine", choices=ENGINES, default="state")
+    parser.add_argument(
+        "--rebuild-state", action="store_true",
+        help="ignore persisted indicator state and recompute it from the first bar"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="processes to build snapshots with (0 = one per CPU core)"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=CHUNK_SIZE,
+        help="symbols per worker job"
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="rebuild every symbol instead of reusing unchanged rows from the last output"
+    )
+    parser.add_argument(
+        "--adjust", choices=adjustments.MODES, default=adjustments.DEFAULT_MODE,
+        help="corporate-action adjustment of the bars indicators are computed on "
+             "(use with --force when changing it)"
+    )
+    parser.add_argument(
+        "--verify", action="store_true",
+        help="check the vectorized engines, confidence scorer, relative-strength "
+             "statistics and sector breadth against reference code and exit"
+    )
+    args = parser.parse_args()
+
+    if args.verify:
+        ok = verify_engines()
+        ok = verify_confidence() and ok
+        ok = relative_strength.verify_relative() and ok
+        ok = sector_breadth.verify_breadth() and ok
+        sys.exit(0 if ok else 1)
+
+    workers = args.workers or os.cpu_count() or 1
+    with instrument.run("build_snapshots", args.profile, BOT_SNAPSHOT_DIR), \
+            instrument.stage("snapshots"):
+        snapshots, failures, built = build_all(
+            args.engine, workers, args.rebuild_state, args.chunk_size, force=args.force,
+            adjust=args.adjust,
+        )
+        write_snapshots(snapshots)
+        mark_built(built)
+
+    if failures:
+        print(f"⚠️ {len(failures)} symbols failed and were left out")
+    print("✅ Snapshot CSVs updated successfully")
 
 
 if __name__ == "__main__":
@@ -1,60 +1,162 @@
-import os
-import pandas as pd
+# Optional persistence step: snapshots resample daily bars in memory
+# (see candles.py); this keeps data/**/weekly|monthly up to date for
+# downstream readers of the candle files.
 
-BASE_PATHS = [
-    "data/indices",
-    "data/stocks/NIFTY500"
+import argparse
+from datetime import date
+
+import numpy as np
+
+import instrument
+import storage
+from candles import AGG, RULES, resample
+
+UNIVERSES = [
+    "indices",
+    "stocks"
 ]
 
-def build_candles(base_path):
-    weekly_dir = os.path.join(base_path, "weekly")
-    monthly_dir = os.path.join(base_path, "monthly")
+def _same_rows(old, new):
+    if len(old) != len(new) or list(old.columns) != list(new.columns):
+        return False
+    for col in new.columns:
+        a, b = old[col].to_numpy(), new[col].to_numpy()
+        if col == "date" or a.dtype.kind == "b":
+            if not (a == b).all():
+                return False
+        elif not np.allclose(a.astype("f8"), b.astype("f8"), rtol=1e-12, equal_nan=True):
+            return False
+    return True
 
-    os.makedirs(weekly_dir, exist_ok=True)
-    os.makedirs(monthly_dir, exist_ok=True)
+def open_period_start(universe, symbol, timeframe):
+    """
+    Date after the last closed candle (daily bars from here on decide the
+    open candles), or None when the candles must be rebuilt in full.
+    """
+    meta = storage.read_meta(universe, symbol, timeframe)
+    if meta is None or meta["rows"] == 0 or "complete" not in meta["columns"]:
+        return None
 
-    for file in os.listdir(base_path):
-        if not file.endswith(".csv"):
-            continue
+    arrays = storage.open_columns(universe, symbol, timeframe, columns=["complete"])
+    closed = np.flatnonzero(np.asarray(arrays["complete"]))
+    if len(closed) == 0:
+        return None
+    return arrays["date"][closed[-1]] + np.timedelta64(1, "D")
 
-        file_path = os.path.join(base_path, file)
-        print(f"📊 Processing {file_path}")
+def needs_update(universe, symbol, as_of=None):
+    """
+    True when a candle file is missing, or its last candle is still
+    marked open although its period has ended (no new daily bar needed).
+    """
+    as_of = np.datetime64(as_of or date.today(), "D")
+    for timeframe in RULES:
+        meta = storage.read_meta(universe, symbol, timeframe)
+        if meta is None or "complete" not in meta["columns"]:
+            return True
+        if meta["rows"] and np.datetime64(meta["last_date"], "D") < as_of:
+            arrays = storage.open_columns(universe, symbol, timeframe, columns=["complete"])
+            if not arrays["complete"][-1]:
+                return True
+    return False
 
-        df = pd.read_csv(file_path)
+def daily_bars(universe, symbol, since=None, daily=None):
+    """
+    Daily bars from ``since`` on, sliced out of ``daily`` ({column: array}
+    already in memory) when given, otherwise read from the store.
+    """
+    if daily is None:
+        return storage.load_ohlcv(universe, symbol, columns=list(AGG), start=since)
 
-        if "date" not in df.columns:
-            print(f"⚠️ Skipped (no date column): {file}")
-            continue
+    arrays = {c: daily[c] for c in [storage.DATE_COLUMN] + list(AGG) if c in daily}
+    dates = arrays[storage.DATE_COLUMN]
+    tail = None
+    if since is not None:
+        tail = len(dates) - int(np.searchsorted(dates, np.datetime64(since, "D")))
+    return storage._frame_from_arrays(arrays, tail)
+
+def update_candles(universe, symbol, timeframe, full=False, as_of=None, daily=None):
+    """
+    Bring one symbol's candles up to date. Incrementally, only the daily
+    bars after the last closed candle are loaded and resampled, and just
+    the open candles at the end of the file are replaced.
+    Returns "full", "patch" or "noop".
+    """
+    since = None if full else open_period_start(universe, symbol, timeframe)
+    if since is not None and daily is None and not storage.exists(universe, symbol):
+        since = None
+
+    df = daily_bars(universe, symbol, since, daily)
+    instrument.add_rows(len(df))
 
-        df["date"] = pd.to_datetime(df["date"])
-        df.set_index("date", inplace=True)
+    if since is None:
+        storage.save_ohlcv(resample(df, timeframe, as_of), universe, symbol, timeframe)
+        return "full"
 
-        # Weekly candles (Mon–Fri logic handled by pandas automatically)
-        weekly = df.resample("W-FRI").agg({
-            "open": "first",
-            "high": "max",
-            "low": "min",
-            "close": "last",
-            "volume": "sum"
-        }).dropna()
+    if df.empty:
+        return "noop"
 
-        weekly.to_csv(os.path.join(weekly_dir, file))
+    candles = resample(df, timeframe, as_of)
+    stored = storage.load_ohlcv(
+        universe, symbol, timeframe, columns=list(AGG) + ["complete"], start=since
+    )
+    if _same_rows(stored, candles):
+        return "noop"
+
+    storage.replace_tail(candles, universe, symbol, timeframe)
+    return "patch"
+
+def build_candles(universe, full=False, as_of=None, daily=None, force=False):
+    """
+    Update the candles of every symbol whose daily bars changed since the
+    last build (per the manifest), or of all of them with ``full`` /
+    ``force``. ``daily`` ({symbol: {column: array}}) supplies bars already
+    in memory and limits the pass to those symbols.
+    """
+    counts = {"full": 0, "patch": 0, "noop": 0}
+    symbols = storage.list_symbols(universe) if daily is None else list(daily)
+
+    dirty = set(storage.dirty_symbols("candles", universe, symbols, force=full or force))
+    dirty.update(symbol for symbol in symbols if needs_update(universe, symbol, as_of))
+
+    built = []
+    for symbol in symbols:
+        if symbol not in dirty:
+            continue
+        bars = None if daily is None else daily.get(symbol)
+        try:
+            with instrument.symbol(f"{universe}/{symbol}"):
+                for timeframe in RULES:
+                    counts[update_candles(universe, symbol, timeframe, full, as_of, bars)] += 1
+        except ValueError:
+            print(f"⚠️ Skipped (no date column): {symbol}")
+            continue
+        built.append(symbol)
 
-        # Monthly candles
-        monthly = df.resample("M").agg({
-            "open": "first",
-            "high": "max",
-            "low": "min",
-            "close": "last",
-            "volume": "sum"
-        }).dropna()
+    storage.mark_clean("candles", universe, built)
+    storage.flush_manifest()
 
-        monthly.to_csv(os.path.join(monthly_dir, file))
+    print(
+        f"✅ {universe}: {counts['patch']} patched, {counts['full']} rebuilt, "
+        f"{counts['noop']} unchanged, {len(symbols) - len(dirty)} clean symbols skipped"
+    )
+    return counts
 
-        print(f"✅ Done: {file}")
+if __name__ == "__main__":
+    parser = instrument.add_arguments(
+        argparse.ArgumentParser(description="Build weekly / monthly candles")
+    )
+    parser.add_argument(
+        "--full", action="store_true",
+        help="re-resample full history instead of patching the open periods"
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="update every symbol, not just those whose daily bars changed"
+    )
+    args = parser.parse_args()
 
-for path in BASE_PATHS:
-    if os.path.exists(path):
-        build_candles(path)
+    with instrument.run("build_weekly_monthly_candles", args.profile), instrument.stage("candles"):
+        for universe in UNIVERSES:
+            build_candles(universe, args.full, force=args.force)
 
-print("🎯 Weekly & Monthly candle build complete.")
+    print("🎯 Weekly & Monthly candle build complete.")
@@ -0,0 +1,113 @@
+# scripts/candles.py
+#
+# Weekly / monthly candles from daily bars. resample() is the pandas
+# reference used by build_weekly_monthly_candles.py; resample_arrays()
+# gives the same candles straight from (memory-mapped) column arrays
+# with a few NumPy reductions, so snapshots can derive every timeframe
+# from the one daily read.
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+# Weekly candles close on Friday (Mon–Fri logic handled by pandas
+# automatically); monthly on the calendar month end ("ME", pandas >= 2.2)
+RULES = {
+    "weekly": "W-FRI",
+    "monthly": "ME",
+}
+
+AGG = {
+    "open": "first",
+    "high": "max",
+    "low": "min",
+    "close": "last",
+    "volume": "sum"
+}
+
+# ------------------------
+# pandas reference
+# ------------------------
+def resample(df, timeframe, as_of=None):
+    """
+    Resample daily bars (``date`` column) into weekly / monthly candles
+    labelled with the period end. ``complete`` is True once the period
+    can no longer change: a later bar exists or ``as_of`` is past its end.
+    """
+    candles = df.set_index("date").resample(RULES[timeframe]).agg(AGG).dropna()
+    candles.index.name = "date"
+    candles = candles.reset_index()
+
+    as_of = pd.Timestamp(as_of or date.today())
+    candles["complete"] = candles["date"] < as_of
+    # Only the period holding the last bar can still be open
+    candles.loc[candles.index[:-1], "complete"] = True
+    return candles
+
+# ------------------------
+# Array resampling
+# ------------------------
+def period_ids(dates, timeframe):
+    """W-FRI week or calendar month number of each datetime64[D] date."""
+    if timeframe == "weekly":
+        # 1970-01-03 was a Saturday, the first day of a W-FRI week
+        return (dates.astype("int64") - 2) // 7
+    return dates.astype("datetime64[M]").astype("int64")
+
+def period_labels(ids, timeframe):
+    """Period-end date of each period id, as resample() labels candles."""
+    if timeframe == "weekly":
+        return (ids * 7 + 8).astype(storage.DATE_DTYPE)
+    month_start = (ids + 1).astype("datetime64[M]").astype(storage.DATE_DTYPE)
+    return month_start - np.timedelta64(1, "D")
+
+def resample_arrays(arrays, timeframe):
+    """
+    resample(...).agg(AGG).dropna() for one symbol's {column: array}
+    (date as datetime64), returning the candles as {column: array}.
+    first / last skip NaN and an all-NaN volume sums to 0, like pandas.
+    """
+    dates = np.asarray(arrays[storage.DATE_COLUMN]).astype(storage.DATE_DTYPE)
+    n = len(dates)
+    if n == 0:
+        return {storage.DATE_COLUMN: dates, **{c: np.empty(0) for c in AGG}}
+
+    ids = period_ids(dates, timeframe)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    position = np.arange(n)
+
+    def column(name):
+        if name in arrays:
+            return np.asarray(arrays[name], dtype="f8")
+        return np.full(n, np.nan)
+
+    def pick(values, positions, found):
+        return np.where(found, values[np.clip(positions, 0, n - 1)], np.nan)
+
+    open_, high, low, close = (column(c) for c in ("open", "high", "low", "close"))
+
+    first = np.minimum.reduceat(np.where(np.isnan(open_), n, position), starts)
+    last = np.maximum.reduceat(np.where(np.isnan(close), -1, position), starts)
+
+    out = {
+        "open": pick(open_, first, first < n),
+        "high": np.fmax.reduceat(high, starts),
+        "low": np.fmin.reduceat(low, starts),
+        "close": pick(close, last, last >= 0),
+    }
+
+    volume = np.asarray(arrays["volume"]) if "volume" in arrays else np.zeros(n)
+    if volume.dtype.kind == "f":
+        volume = np.nan_to_num(volume)
+    out["volume"] = np.add.reduceat(volume, starts)
+
+    keep = ~(np.isnan(out["open"]) | np.isnan(out["high"])
+             | np.isnan(out["low"]) | np.isnan(out["close"]))
+
+    candles = {storage.DATE_COLUMN: period_labels(ids[starts], timeframe)[keep]}
+    for col in AGG:
+        candles[col] = out[col][keep]
+    return candles
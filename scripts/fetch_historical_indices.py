@@ -1,16 +1,18 @@
+import argparse
 import json
-import pandas as pd
-import yfinance as yf
 from pathlib import Path
 
+import fetcher
+import instrument
+import storage
+
 # -----------------------------
 # PATHS
 # -----------------------------
 BASE_DIR = Path(__file__).resolve().parent.parent
 CONFIG_FILE = BASE_DIR / "config" / "indices.json"
-DATA_DIR = BASE_DIR / "data" / "indices"
 
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+INDEX_COLUMNS = ["date", "open", "high", "low", "close", "volume"]
 
 # -----------------------------
 # LOAD INDICES
@@ -19,42 +21,47 @@ with open(CONFIG_FILE, "r") as f:
     indices = json.load(f)
 
 # -----------------------------
-# FETCH FUNCTION
+# FETCH FUNCTIONS
 # -----------------------------
-def fetch_index(name, yahoo_symbol):
+def download_index(name):
+    yahoo_symbol = indices[name]["yahoo"]
     print(f"📥 Fetching {name} ({yahoo_symbol})")
+    return fetcher.download(yahoo_symbol, period="max")
 
-    csv_file = DATA_DIR / f"{name}.csv"
+def save_index(result):
+    name = result.key
 
-    df = yf.download(
-        yahoo_symbol,
-        period="max",
-        interval="1d",
-        auto_adjust=False,
-        progress=False,
-        threads=False,
-    )
+    if result.status == "error":
+        print(f"❌ Error {name}: {result.error}")
+        return
 
-    if df.empty:
+    if result.status == "empty":
         print(f"⚠️ No data for {name}")
         return
 
-    df.reset_index(inplace=True)
-    df = df[["Date", "Open", "High", "Low", "Close", "Volume"]]
-    df.columns = ["date", "open", "high", "low", "close", "volume"]
-
-    df["date"] = pd.to_datetime(df["date"]).dt.date
+    df = result.value[INDEX_COLUMNS]
+    with instrument.symbol(name):
+        meta = storage.save_ohlcv(df, "indices", name)
+        instrument.add_rows(meta["rows"])
 
-    df.sort_values("date", inplace=True)
-    df.to_csv(csv_file, index=False)
-
-    print(f"✅ Saved {name} → {len(df)} rows")
+    print(f"✅ Saved {name} → {meta['rows']} rows")
 
 # -----------------------------
 # RUN
 # -----------------------------
 if __name__ == "__main__":
-    for name, meta in indices.items():
-        fetch_index(name, meta["yahoo"])
+    parser = instrument.add_arguments(fetcher.add_arguments(argparse.ArgumentParser()))
+    args = parser.parse_args()
+
+    with instrument.run("fetch_historical_indices", args.profile), instrument.stage("fetch"):
+        results = fetcher.fetch_all(
+            list(indices),
+            download_index,
+            workers=args.workers,
+            rate=args.rate,
+            retries=args.retries,
+            on_result=save_index,
+        )
+        fetcher.summarize(results)
 
     print("\n🎯 Historical indices fetch complete.")
@@ -1,51 +1,76 @@
+import argparse
 import json
-import os
-import time
-import yfinance as yf
-import pandas as pd
+import sys
 
-CONFIG_PATH = "config/stocks_nifty500.json"
-OUT_DIR = "data/stocks/NIFTY500"
+import fetcher
+import index_membership
+import instrument
+import storage
 
-os.makedirs(OUT_DIR, exist_ok=True)
+CONFIG_PATH = "config/stocks_nifty500.json"
 
 with open(CONFIG_PATH, "r") as f:
     symbols = list(json.load(f).keys())
 
-print(f"📦 Total symbols: {len(symbols)}")
-
-BATCH_SIZE = 25
-SLEEP_BETWEEN = 2
-
-def fetch_symbol(sym):
-    try:
-        yahoo_sym = f"{sym}.NS"
-
-        ticker = yf.Ticker(yahoo_sym)
-        df = ticker.history(period="max", auto_adjust=False)
+def download_symbol(sym):
+    return fetcher.history(f"{sym}.NS", period="max", auto_adjust=False)
 
-        if df.empty:
-            print(f"⚠️ No data: {yahoo_sym}")
-            return
+# Symbols saved by this run (the --queue backfill dequeues them)
+saved = []
 
-        df.reset_index(inplace=True)
-        df.rename(columns=str.lower, inplace=True)
+def save_symbol(result):
+    sym = result.key
+    yahoo_sym = f"{sym}.NS"
 
-        out = os.path.join(OUT_DIR, f"{sym}.csv")
-        df.to_csv(out, index=False)
+    if result.status == "error":
+        print(f"❌ Error {sym}: {result.error}")
+        return
 
-        print(f"✅ Saved {yahoo_sym} ({len(df)} rows)")
+    if result.status == "empty":
+        print(f"⚠️ No data: {yahoo_sym}")
+        return
 
+    try:
+        with instrument.symbol(sym):
+            meta = storage.save_ohlcv(result.value, "stocks", sym)
+            instrument.add_rows(meta["rows"])
+        saved.append(sym)
+        print(f"✅ Saved {yahoo_sym} ({meta['rows']} rows)")
     except Exception as e:
         print(f"❌ Error {sym}: {e}")
 
-for i in range(0, len(symbols), BATCH_SIZE):
-    batch = symbols[i:i + BATCH_SIZE]
-    print(f"\n🚀 Batch {i+1} → {i+len(batch)}")
-
-    for sym in batch:
-        fetch_symbol(sym)
-
-    time.sleep(SLEEP_BETWEEN)
-
-print("🎯 NIFTY 500 historical fetch complete.")
+if __name__ == "__main__":
+    parser = instrument.add_arguments(fetcher.add_arguments(argparse.ArgumentParser()))
+    parser.add_argument(
+        "--queue", action="store_true",
+        help="only fetch the new index entrants queued in the membership history"
+    )
+    args = parser.parse_args()
+
+    if args.queue:
+        symbols = index_membership.queued()
+        if not symbols:
+            print("⏭️ Backfill queue empty")
+            sys.exit(0)
+
+    print(f"📦 Total symbols: {len(symbols)}")
+
+    with instrument.run("fetch_historical_stocks", args.profile), instrument.stage("fetch"):
+        results = fetcher.fetch_all(
+            symbols,
+            download_symbol,
+            workers=args.workers,
+            rate=args.rate,
+            retries=args.retries,
+            on_result=save_symbol,
+        )
+        fetcher.summarize(results)
+
+    if saved:
+        history = index_membership.load_history(editable=True)
+        if history is not None:
+            index_membership.dequeue(history, saved)
+            index_membership.save_history(history)
+            print(f"⏳ {len(history['backfill'])} symbols left in the backfill queue")
+
+    print("🎯 NIFTY 500 historical fetch complete.")
@@ -0,0 +1,220 @@
+# scripts/fetcher.py
+
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+import instrument
+import storage
+
+# ------------------------
+# Defaults
+# ------------------------
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 4.0        # requests per second across all workers
+DEFAULT_BURST = 8         # token bucket capacity
+DEFAULT_RETRIES = 3       # attempts after the first one
+BACKOFF_BASE = 1.0        # seconds, doubled per retry
+BACKOFF_CAP = 30.0
+
+FetchResult = namedtuple(
+    "FetchResult", ["key", "status", "value", "attempts", "seconds", "error"]
+)
+
+# ------------------------
+# Backend (yfinance or offline stub)
+# ------------------------
+def get_yf():
+    """
+    yfinance, or the offline stand-in when YF_STUB=1 so that every
+    fetch/update script can be exercised without network access.
+    """
+    if os.environ.get("YF_STUB", "0") not in ("", "0"):
+        import yf_stub
+        return yf_stub
+
+    import yfinance
+    return yfinance
+
+def flatten_columns(df):
+    """
+    yfinance >= 0.2.48 returns (Price, Ticker) MultiIndex columns even for
+    a single ticker; keep the price level so frames match the store schema.
+    """
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+    return df
+
+def _to_frame(df):
+    df = flatten_columns(df).reset_index()
+    return storage.normalize_columns(df)
+
+def download(yahoo_symbol, **kwargs):
+    """Single-ticker yf.download with the repo's defaults, store-ready columns."""
+    params = dict(interval="1d", auto_adjust=False, progress=False, threads=False)
+    params.update(kwargs)
+    df = get_yf().download(yahoo_symbol, **params)
+    if df is None or df.empty:
+        return pd.DataFrame()
+    return _to_frame(df)
+
+def split_tickers(df, tickers):
+    """
+    Split a multi-ticker yf.download frame into {ticker: store-ready frame}.
+    Rows yfinance padded with NaN for dates a ticker did not trade are
+    dropped; tickers that came back with no rows are left out.
+    """
+    frames = {}
+    if df is None or df.empty:
+        return frames
+
+    if not isinstance(df.columns, pd.MultiIndex):
+        # Older yfinance collapses a one-ticker request to flat columns
+        if len(tickers) == 1:
+            frames[tickers[0]] = _to_frame(df.dropna(how="all"))
+        return frames
+
+    level = 0 if set(df.columns.get_level_values(0)) & set(tickers) else 1
+    for ticker in df.columns.get_level_values(level).unique():
+        sub = df.xs(ticker, axis=1, level=level).dropna(how="all")
+        if not sub.empty:
+            frames[ticker] = _to_frame(sub)
+    return frames
+
+def download_many(yahoo_symbols, **kwargs):
+    """One yf.download call for many tickers → {ticker: frame}."""
+    yahoo_symbols = list(yahoo_symbols)
+    params = dict(
+        interval="1d", auto_adjust=False, progress=False,
+        threads=False, group_by="ticker",
+    )
+    params.update(kwargs)
+    df = get_yf().download(yahoo_symbols, **params)
+    return split_tickers(df, yahoo_symbols)
+
+def history(yahoo_symbol, **kwargs):
+    """yf.Ticker(...).history with the repo's defaults, store-ready columns."""
+    params = dict(period="max", auto_adjust=False)
+    params.update(kwargs)
+    df = get_yf().Ticker(yahoo_symbol).history(**params)
+    if df is None or df.empty:
+        return pd.DataFrame()
+    return _to_frame(df)
+
+# ------------------------
+# Rate limiting
+# ------------------------
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens/sec, bursts up to ``capacity``."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Full-jitter exponential backoff for the given retry number (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+# ------------------------
+# Engine
+# ------------------------
+def _run_one(key, job, fn, bucket, retries, backoff):
+    start = time.perf_counter()
+    error = None
+
+    for attempt in range(1, retries + 2):
+        bucket.acquire()
+        try:
+            value = fn(job)
+            status = "empty" if value is None or len(value) == 0 else "ok"
+            seconds = time.perf_counter() - start
+            instrument.request(seconds, attempt, status)
+            return FetchResult(key, status, value, attempt, seconds, None)
+        except Exception as e:
+            error = e
+            if attempt <= retries:
+                time.sleep(backoff_delay(attempt, base=backoff))
+
+    seconds = time.perf_counter() - start
+    instrument.request(seconds, retries + 1, "error")
+    return FetchResult(key, "error", None, retries + 1, seconds, error)
+
+def fetch_all(jobs, fn, key=None, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE,
+              burst=DEFAULT_BURST, retries=DEFAULT_RETRIES, backoff=BACKOFF_BASE,
+              on_result=None):
+    """
+    Run ``fn(job)`` for every job on a bounded thread pool.
+
+    All attempts share one token bucket, failures are retried with
+    jittered exponential backoff, and ``on_result(result)`` is called on
+    the calling thread as each job finishes (so writes stay serial).
+    Returns the FetchResults in job order.
+    """
+    jobs = list(jobs)
+    key = key or (lambda job: job)
+    bucket = TokenBucket(rate, burst)
+    results = [None] * len(jobs)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            pool.submit(_run_one, key(job), job, fn, bucket, retries, backoff): i
+            for i, job in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if on_result is not None:
+                on_result(result)
+
+    return results
+
+def summarize(results):
+    counts = {"ok": 0, "empty": 0, "error": 0}
+    for r in results:
+        counts[r.status] += 1
+    retried = sum(1 for r in results if r.attempts > 1)
+    slowest = max(results, key=lambda r: r.seconds, default=None)
+
+    print(
+        f"📡 Fetched {len(results)} → ok {counts['ok']}, "
+        f"empty {counts['empty']}, failed {counts['error']}, retried {retried}"
+    )
+    if slowest is not None:
+        print(f"🐢 Slowest: {slowest.key} ({slowest.seconds:.2f}s)")
+    for r in results:
+        if r.status == "error":
+            print(f"❌ {r.key}: {r.error}")
+    return counts
+
+def add_arguments(parser):
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help="max requests per second (0 = unlimited)")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES)
+    return parser
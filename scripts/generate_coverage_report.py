@@ -1,34 +1,83 @@
 import os
 import pandas as pd
 
-BASE_DIR = "data/stocks/NIFTY500"
-rows = []
+import instrument
+import storage
+import trading_calendar
 
-for file in sorted(os.listdir(BASE_DIR)):
-    if not file.endswith(".csv"):
-        continue
+OUT_FILE = "reports/nifty500_data_coverage.csv"
 
-    path = os.path.join(BASE_DIR, file)
-    df = pd.read_csv(path)
+def symbol_coverage(universe, symbol, calendar=None):
+    """
+    Coverage of one symbol as {start_date, end_date, total_days,
+    missing_sessions, stale_sessions}, or None when it has no rows.
 
-    if df.empty or "date" not in df.columns:
-        continue
+    Stored symbols come from their manifest entry plus the date column
+    (a memory map, only read for the gap count); unmigrated symbols from
+    the CSV header, first and last line and a newline count, without
+    parsing the history (their gap count is left empty). Gaps and
+    staleness are counted against ``calendar`` when given.
+    """
+    entry = storage.manifest_entry(universe, symbol)
+    dates = None
+    if entry is not None:
+        first, last, rows = entry["first_date"], entry["last_date"], entry["rows"]
+        if rows and calendar is not None:
+            dates = storage.open_columns(universe, symbol, columns=[])[storage.DATE_COLUMN]
+    else:
+        first, last, rows = storage.csv_summary(storage.csv_path(universe, symbol))
+    instrument.add_rows(rows)
 
-    df["date"] = pd.to_datetime(df["date"])
+    if not rows:
+        return None
 
-    rows.append({
-        "symbol": file.replace(".csv", ""),
-        "start_date": df["date"].min().date(),
-        "end_date": df["date"].max().date(),
-        "total_days": len(df)
-    })
+    coverage = {
+        "start_date": pd.Timestamp(first).date(),
+        "end_date": pd.Timestamp(last).date(),
+        "total_days": rows,
+    }
+    if calendar is not None:
+        coverage["missing_sessions"] = (
+            None if dates is None else trading_calendar.missing_sessions(dates, calendar)
+        )
+        coverage["stale_sessions"] = trading_calendar.stale_sessions(last, calendar)
+    return coverage
 
-report = pd.DataFrame(rows)
-report = report.sort_values("symbol")
+def coverage_report(out=OUT_FILE):
+    calendar = trading_calendar.sessions()
+    rows = []
 
-out = "reports/nifty500_data_coverage.csv"
-os.makedirs("reports", exist_ok=True)
-report.to_csv(out, index=False)
+    for symbol in storage.list_symbols("stocks"):
+        try:
+            with instrument.symbol(symbol):
+                coverage = symbol_coverage("stocks", symbol, calendar)
+        except ValueError:
+            continue
 
-print(f"✅ Coverage report saved to {out}")
-print(f"📊 Total stocks covered: {len(report)}")
+        if coverage is None:
+            continue
+
+        rows.append({"symbol": symbol, **coverage})
+
+    report = pd.DataFrame(rows)
+    report = report.sort_values("symbol")
+    for col in ("missing_sessions", "stale_sessions"):
+        report[col] = report[col].astype("Int64")
+
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    report.to_csv(out, index=False)
+    storage.flush_manifest()
+
+    print(f"✅ Coverage report saved to {out}")
+    print(f"📊 Total stocks covered: {len(report)}")
+    if len(calendar):
+        print(
+            f"🗓️ Latest session {trading_calendar.latest_session(calendar)}: "
+            f"{int((report['stale_sessions'] > 0).sum())} stale, "
+            f"{int((report['missing_sessions'] > 0).sum())} with gaps"
+        )
+    return report
+
+if __name__ == "__main__":
+    with instrument.run("generate_coverage_report"), instrument.stage("coverage"):
+        coverage_report()
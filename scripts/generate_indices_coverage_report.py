@@ -1,44 +1,45 @@
 import os
 import pandas as pd
 
-DATA_DIR = "data/indices"
+import instrument
+import storage
+import trading_calendar
+from generate_coverage_report import symbol_coverage
+
 REPORT_DIR = "reports"
 OUT_FILE = os.path.join(REPORT_DIR, "indices_data_coverage.csv")
 
-os.makedirs(REPORT_DIR, exist_ok=True)
-
-rows = []
-
-for file in sorted(os.listdir(DATA_DIR)):
-    if not file.endswith(".csv"):
-        continue
+def coverage_report(out=OUT_FILE):
+    os.makedirs(os.path.dirname(out), exist_ok=True)
 
-    path = os.path.join(DATA_DIR, file)
-    symbol = file.replace(".csv", "")
+    calendar = trading_calendar.sessions()
+    rows = []
 
-    try:
-        df = pd.read_csv(path)
+    for symbol in storage.list_symbols("indices"):
+        try:
+            with instrument.symbol(symbol):
+                coverage = symbol_coverage("indices", symbol, calendar)
 
-        if df.empty or "date" not in df.columns:
-            print(f"⚠️ Skipped {symbol}: empty or invalid")
-            continue
+            if coverage is None:
+                print(f"⚠️ Skipped {symbol}: empty or invalid")
+                continue
 
-        df["date"] = pd.to_datetime(df["date"])
-        df = df.drop_duplicates(subset=["date"]).sort_values("date")
+            rows.append({"index": symbol, **coverage})
 
-        rows.append({
-            "index": symbol,
-            "start_date": df["date"].min().date(),
-            "end_date": df["date"].max().date(),
-            "total_days": len(df)
-        })
+            print(f"✅ {symbol}: {coverage['total_days']} rows")
 
-        print(f"✅ {symbol}: {len(df)} rows")
+        except Exception as e:
+            print(f"❌ Error processing {symbol}: {e}")
 
-    except Exception as e:
-        print(f"❌ Error processing {symbol}: {e}")
+    report_df = pd.DataFrame(rows).sort_values("index")
+    for col in ("missing_sessions", "stale_sessions"):
+        report_df[col] = report_df[col].astype("Int64")
+    report_df.to_csv(out, index=False)
+    storage.flush_manifest()
 
-report_df = pd.DataFrame(rows).sort_values("index")
-report_df.to_csv(OUT_FILE, index=False)
+    print(f"\n📊 Index coverage report saved → {out}")
+    return report_df
 
-print(f"\n📊 Index coverage report saved → {OUT_FILE}")
+if __name__ == "__main__":
+    with instrument.run("generate_indices_coverage_report"), instrument.stage("coverage"):
+        coverage_report()
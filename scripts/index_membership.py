@@ -0,0 +1,395 @@
+# scripts/index_membership.py
+#
+# Point-in-time NIFTY 500 membership, kept next to the config in
+# config/nifty500_membership.json:
+#
+#   {"version": 1,
+#    "refreshes": ["2026-10-17", ...],        dates the list was refreshed on
+#    "backfill": ["SYM", ...],                members waiting for their history
+#    "symbols": {"SYM": {"sector": "...", "active": true,
+#                        "periods": [[start, end], ...]}}}
+#
+# A period is a half-open [start, end) range of ISO dates: a symbol is a
+# member from the refresh that first listed it to the refresh that no
+# longer did (end null while it still is). Membership is as observed on
+# the refresh dates, so an index change lands on the next refresh. A
+# null start means "a member since before the history began". When the
+# history is seeded, only the former members' exits are known (the day
+# after their last stored bar), so each one is paired with an entrant
+# that takes its place: first the members without any stored bars (the
+# newest listings), then those whose stored history starts latest. The
+# seed is therefore a guess and can still be survivorship-biased, but it
+# never holds more than one index's worth of members on a date.
+#
+# build_nifty500_config.py diffs every refresh against the active
+# members: entrants without stored bars are queued for a historical
+# fetch (fetch_historical_stocks.py --queue), and symbols that left are
+# marked inactive. Their files stay, for backtests, but the snapshots
+# leave them out.
+#
+#   python scripts/index_membership.py                     # status and queue
+#   python scripts/index_membership.py --as-of 2026-01-15  # constituents on a date
+#   python scripts/index_membership.py --seed              # history from today's config
+#   python scripts/index_membership.py --verify            # offline checks
+
+import argparse
+import copy
+import json
+import os
+import sys
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+
+import storage
+
+CONFIG_PATH = storage.BASE_DIR / "config" / "stocks_nifty500.json"
+HISTORY_PATH = storage.BASE_DIR / "config" / "nifty500_membership.json"
+HISTORY_VERSION = 1
+
+def file_symbol(symbol):
+    """Store / CSV name of a config symbol."""
+    return symbol.replace(".", "_")
+
+def _iso(value):
+    return str(np.datetime64(value, "D"))
+
+# ------------------------
+# Files
+# ------------------------
+def empty_history():
+    return {"version": HISTORY_VERSION, "refreshes": [], "backfill": [], "symbols": {}}
+
+@lru_cache(maxsize=4)
+def _read(path, stamp):
+    with open(path, "r") as f:
+        history = json.load(f)
+    if history.get("version") != HISTORY_VERSION:
+        raise ValueError(f"unsupported membership history version {history.get('version')}")
+    return history
+
+def load_history(path=None, editable=False):
+    """
+    The membership history, or None when none has been recorded yet.
+    It is parsed once per file version and shared: pass ``editable``
+    for a private copy to refresh.
+    """
+    path = path or HISTORY_PATH
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    history = _read(str(path), (stat.st_mtime_ns, stat.st_size))
+    return copy.deepcopy(history) if editable else history
+
+def save_history(history, path=None):
+    path = path or HISTORY_PATH
+    history["symbols"] = dict(sorted(history["symbols"].items()))
+    history["backfill"] = sorted(set(history["backfill"]))
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(history, f, indent=2)
+    tmp.replace(path)
+
+# ------------------------
+# Refresh
+# ------------------------
+def active_members(history):
+    return {sym for sym, entry in history["symbols"].items() if entry["active"]}
+
+def former_members(config, stored, until):
+    """
+    {file symbol: end date} for stored symbols ``config`` lacks. When
+    they left is unknown: their bars stopped being updated then, so the
+    day after the last bar stands in for it (``until`` without bars).
+    """
+    listed = {file_symbol(sym) for sym in config}
+    ended = {}
+    for sym in stored:
+        if sym not in listed:
+            last = storage.last_date("stocks", sym)
+            ended[sym] = _iso(until) if last is None else _iso(np.datetime64(last, "D") + 1)
+    return ended
+
+def first_dates(symbols):
+    """{file symbol: first stored bar (ISO)} from the manifest."""
+    out = {}
+    for sym in symbols:
+        entry = storage.manifest_entry("stocks", sym)
+        if entry is not None and entry["first_date"]:
+            out[sym] = entry["first_date"]
+    return out
+
+def seed(config, stored=(), ended=None, on_date=None, first=None):
+    """
+    A history starting from ``config`` (the list as of ``on_date``) and
+    the former members in ``ended`` ({symbol: end date}, see
+    former_members). Each former member's end is the start of an
+    entrant's period: members without stored bars first (they are
+    queued), then the stored ones whose first bar (``first``, see
+    first_dates) is the latest; the other members are members since
+    before the history began.
+    """
+    history = empty_history()
+    if on_date is not None:
+        history["refreshes"].append(_iso(on_date))
+    stored = set(stored)
+    first = first or {}
+    queued = sorted(sym for sym in config if file_symbol(sym) not in stored)
+    listed = sorted(
+        (sym for sym in config if file_symbol(sym) in stored),
+        key=lambda sym: first.get(file_symbol(sym), ""), reverse=True,
+    )
+    # Latest exit ↔ newest entrant
+    exits = sorted((ended or {}).items(), key=lambda item: (item[1], item[0]), reverse=True)
+    starts = {entrant: end for entrant, (_, end) in zip(queued + listed, exits)}
+
+    for sym, entry in config.items():
+        history["symbols"][sym] = {
+            "sector": entry.get("sector"), "active": True, "periods": [[starts.get(sym), None]],
+        }
+    for sym, end in (ended or {}).items():
+        history["symbols"][sym] = {"sector": None, "active": False, "periods": [[None, end]]}
+    history["backfill"] = queued
+    return history
+
+def refresh(history, config, on_date, stored=()):
+    """
+    Record ``config`` as the index list of ``on_date`` (in place).
+    Refreshing the same date again replaces that day's list. Returns
+    {"added", "removed", "sector_changed", "queued"} symbol lists.
+    """
+    on_date = _iso(on_date)
+    refreshes = history["refreshes"]
+    if refreshes and on_date < refreshes[-1]:
+        raise ValueError(f"refresh {on_date} is older than the last one ({refreshes[-1]})")
+
+    symbols = history["symbols"]
+    previous = active_members(history)
+    current = set(config)
+    added, removed = sorted(current - previous), sorted(previous - current)
+
+    for sym in removed:
+        entry = symbols[sym]
+        if entry["periods"][-1][0] == on_date:
+            # Listed by an earlier run of the same day only
+            entry["periods"].pop()
+        else:
+            entry["periods"][-1][1] = on_date
+        entry["active"] = False
+
+    stored = set(stored)
+    queued = []
+    for sym in added:
+        entry = symbols.setdefault(sym, {"sector": None, "active": False, "periods": []})
+        if entry["periods"] and entry["periods"][-1][1] == on_date:
+            entry["periods"][-1][1] = None
+        else:
+            entry["periods"].append([on_date, None])
+        entry["active"] = True
+        if file_symbol(sym) not in stored:
+            queued.append(sym)
+
+    changed = []
+    for sym in sorted(current):
+        sector = config[sym].get("sector")
+        if sym not in added and symbols[sym]["sector"] != sector:
+            changed.append(sym)
+        symbols[sym]["sector"] = sector
+
+    for sym in list(symbols):
+        if not symbols[sym]["periods"]:
+            del symbols[sym]
+    history["backfill"] = [s for s in history["backfill"] if s in current] + queued
+    if not refreshes or refreshes[-1] != on_date:
+        refreshes.append(on_date)
+    return {"added": added, "removed": removed, "sector_changed": changed, "queued": queued}
+
+def dequeue(history, symbols):
+    """Drop fetched symbols from the backfill queue (in place)."""
+    done = set(symbols)
+    history["backfill"] = [s for s in history["backfill"] if s not in done]
+
+# ------------------------
+# Point-in-time lookups
+# ------------------------
+def _covers(period, day):
+    start, end = period
+    return (start is None or start <= day) and (end is None or day < end)
+
+def constituents_as_of(day, history=None):
+    """
+    Sorted config symbols that were members on ``day`` (as of the last
+    refresh on or before it). Only the history file is read.
+    """
+    history = history or load_history()
+    if history is None:
+        raise LookupError(f"no membership history ({HISTORY_PATH.name}) recorded yet")
+    day = _iso(day)
+    return sorted(
+        sym for sym, entry in history["symbols"].items()
+        if any(_covers(period, day) for period in entry["periods"])
+    )
+
+def member_mask(symbols, dates, history=None):
+    """
+    (len(symbols), len(dates)) bool: was each (config or file) symbol a
+    member on each date. Symbols the history never saw are never members.
+    """
+    history = history or load_history()
+    if history is None:
+        raise LookupError(f"no membership history ({HISTORY_PATH.name}) recorded yet")
+    by_file = {file_symbol(sym): entry for sym, entry in history["symbols"].items()}
+    dates = np.asarray(dates).astype(storage.DATE_DTYPE)
+    mask = np.zeros((len(symbols), len(dates)), dtype=bool)
+    for i, sym in enumerate(symbols):
+        entry = history["symbols"].get(sym) or by_file.get(sym)
+        for start, end in entry["periods"] if entry else ():
+            lo = 0 if start is None else np.searchsorted(dates, np.datetime64(start, "D"))
+            hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(end, "D"))
+            mask[i, lo:hi] = True
+    return mask
+
+def active_symbols(symbols, history=None):
+    """
+    The file symbols among ``symbols`` the history does not mark
+    inactive (all of them when there is no history yet).
+    """
+    history = history or load_history()
+    if history is None:
+        return list(symbols)
+    inactive = {
+        file_symbol(sym) for sym, entry in history["symbols"].items() if not entry["active"]
+    }
+    return [sym for sym in symbols if sym not in inactive]
+
+def queued(history=None):
+    history = history or load_history()
+    return [] if history is None else list(history["backfill"])
+
+# ------------------------
+# Verification
+# ------------------------
+def verify_membership(refreshes=40, universe=60, size=30, seed_value=0):
+    """
+    Random weekly lists: every day must resolve to the list of the last
+    refresh on or before it, re-running a day must replace it, and the
+    mask must agree with the per-day lookups.
+    """
+    rng = np.random.default_rng(seed_value)
+    names = [f"S{i}" for i in range(universe)]
+    start = np.datetime64("2025-01-06")
+
+    def listing():
+        picked = rng.choice(names, size, replace=False)
+        return {sym: {"sector": str(rng.choice(["A", "B"]))} for sym in picked}
+
+    lists = [listing()]
+    stored = set(lists[0])
+    history = seed(lists[0], stored=stored)
+    days = [None]
+    for k in range(1, refreshes):
+        day = start + 7 * k
+        if rng.random() < 0.2:
+            # A re-run of the same day with a different list
+            refresh(history, listing(), day, stored)
+        config = listing()
+        diff = refresh(history, config, day, stored)
+        if set(diff["queued"]) != {s for s in diff["added"] if s not in stored}:
+            print("❌ membership: queue does not hold the entrants without bars")
+            return False
+        stored |= set(diff["queued"])
+        dequeue(history, diff["queued"])
+        lists.append(config)
+        days.append(day)
+
+    calendar = np.arange(start - 10, start + 7 * refreshes + 10)
+    mask = member_mask(names, calendar, history)
+    for t, day in enumerate(calendar):
+        k = max(i for i, d in enumerate(days) if d is None or d <= day)
+        expected = sorted(lists[k])
+        if constituents_as_of(day, history) != expected:
+            print(f"❌ membership: constituents on {day} differ from that day's list")
+            return False
+        if [names[i] for i in np.flatnonzero(mask[:, t])] != sorted(expected, key=names.index):
+            print(f"❌ membership: mask on {day} differs from the lookup")
+            return False
+
+    if active_members(history) != set(lists[-1]) or history["backfill"]:
+        print("❌ membership: active set or queue wrong after the last refresh")
+        return False
+
+    # A seed never holds more than the config's worth of members on a date,
+    # with fewer, as many or more former members than entrants without bars
+    for former in (3, 8, 12):
+        config = {sym: {"sector": "A"} for sym in names[:size]}
+        stored = set(names[8:])
+        ended = {
+            sym: _iso(start + int(rng.integers(-400, 0)))
+            for sym in names[size:size + former]
+        }
+        first = {sym: _iso(start - int(rng.integers(0, 4000))) for sym in stored}
+        history = seed(config, stored, ended, start, first)
+        counts = {
+            len(constituents_as_of(day, history))
+            for day in np.arange(start - 500, start + 1)
+        }
+        if max(counts) > size or history["backfill"] != names[:8]:
+            print(f"❌ membership: seed with {former} former members holds up to {max(counts)} of {size}")
+            return False
+    print(f"✅ membership: {len(calendar)} days resolve to their refresh ({refreshes} refreshes)")
+    return True
+
+# ------------------------
+# CLI
+# ------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Point-in-time NIFTY 500 membership")
+    parser.add_argument("--as-of", help="print the constituents on this date")
+    parser.add_argument(
+        "--seed", action="store_true",
+        help="start a history from the current config (stored symbols it lacks become inactive)"
+    )
+    parser.add_argument("--date", default=str(date.today()), help="seed date (default today)")
+    parser.add_argument("--verify", action="store_true", help="offline checks and exit")
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(0 if verify_membership() else 1)
+
+    if args.seed:
+        if HISTORY_PATH.exists():
+            print(f"❌ {HISTORY_PATH} already exists")
+            sys.exit(1)
+        with open(CONFIG_PATH, "r") as f:
+            config = json.load(f)
+        stored = storage.list_symbols("stocks")
+        history = seed(
+            config, stored, former_members(config, stored, args.date), args.date,
+            first_dates(stored),
+        )
+        save_history(history)
+        print(f"🌱 Seeded {HISTORY_PATH.name}: {len(config)} members, "
+              f"{len(history['symbols']) - len(config)} inactive, {len(history['backfill'])} queued")
+        return
+
+    history = load_history()
+    if history is None:
+        print(f"❌ No {HISTORY_PATH.name} yet: run build_nifty500_config.py or --seed")
+        sys.exit(1)
+
+    if args.as_of:
+        members = constituents_as_of(args.as_of, history)
+        print(f"📅 {len(members)} constituents on {args.as_of}")
+        print(" ".join(members))
+        return
+
+    active = active_members(history)
+    print(f"📋 {len(active)} active, {len(history['symbols']) - len(active)} inactive, "
+          f"{len(history['refreshes'])} refreshes (last {history['refreshes'][-1] if history['refreshes'] else '-'})")
+    if history["backfill"]:
+        print(f"⏳ Backfill queue ({len(history['backfill'])}): {' '.join(history['backfill'])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+# scripts/indicator_state.py
+#
+# Persisted indicator recurrences, one JSON file per symbol and timeframe
+# under data/state/ (mirroring the store layout). Each file holds the
+# running EMA values, a ring buffer of the last RING_BARS closes (enough
+# for every SMA / Bollinger / RSI window) and the cumulative VWAP sums,
+# plus the number of bars consumed and a hash of those bars. A nightly
+# snapshot then only feeds the newly appended bars through the
+# recurrences. If the hashed history no longer matches (a revision
+# rewrote older bars), the state is rebuilt from the first bar.
+
+import copy
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+import panel
+import storage
+
+# ------------------------
+# Layout
+# ------------------------
+STATE_DIR = storage.DATA_DIR / "state"
+STATE_VERSION = 1
+
+# Longest trailing window any snapshot indicator reads
+RING_BARS = max(max(panel.SMA_WINDOWS), panel.BB_WINDOW, panel.RSI_WINDOW + 1)
+
+HASH_COLUMNS = ["high", "low", "close", "volume"]
+
+def state_path(universe, symbol, timeframe="daily"):
+    rel = storage.store_dir(universe, timeframe).relative_to(storage.STORE_DIR)
+    return STATE_DIR / rel / f"{symbol}.json"
+
+def read_state(universe, symbol, timeframe="daily"):
+    path = state_path(universe, symbol, timeframe)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("version") != STATE_VERSION:
+        return None
+    return state
+
+def write_state(state, universe, symbol, timeframe="daily"):
+    path = state_path(universe, symbol, timeframe)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    storage._write_atomic(path, json.dumps(state), mode="w")
+
+def empty_state():
+    return {
+        "version": STATE_VERSION,
+        "rows": 0,
+        "last_date": None,
+        "history_hash": history_hash({}, 0),
+        "ema": {str(span): [np.nan, 1.0] for span in panel.EMA_SPANS},
+        "ring": [],
+        "vwap": [0.0, 0.0],
+    }
+
+# ------------------------
+# History fingerprint
+# ------------------------
+def history_hash(columns, rows):
+    """Hash of the first ``rows`` bars of the columns the state depends on."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(rows).encode())
+    for col in HASH_COLUMNS:
+        if col in columns:
+            h.update(col.encode())
+            h.update(np.ascontiguousarray(columns[col][:rows], dtype="<f8").tobytes())
+    return h.hexdigest()
+
+# ------------------------
+# Loading
+# ------------------------
+def _open(universe, symbol, timeframe):
+    arrays = storage.open_columns(universe, symbol, timeframe, storage.OHLCV_COLUMNS)
+    if arrays is None:
+        df = storage.load_ohlcv(universe, symbol, timeframe, columns=storage.OHLCV_COLUMNS)
+        arrays = {col: df[col].to_numpy() for col in df.columns}
+    return arrays
+
+def _float(arrays, col, start=0):
+    if col not in arrays:
+        return np.full(len(arrays[storage.DATE_COLUMN]) - start, np.nan)
+    return np.asarray(arrays[col][start:], dtype="f8")
+
+def _left_aligned(rows, width):
+    out = np.full((len(rows), width), np.nan)
+    for i, row in enumerate(rows):
+        out[i, :len(row)] = row
+    return out
+
+def _right_aligned(rows, width):
+    out = np.full((len(rows), width), np.nan)
+    for i, row in enumerate(rows):
+        if len(row):
+            out[i, width - len(row):] = row
+    return out
+
+# ------------------------
+# Advancing
+# ------------------------
+def _advance(states, new_bars):
+    """
+    Feed each symbol's new bars through its recurrences.
+    ``new_bars`` is a list of {high, low, close, volume} arrays aligned with
+    ``states``; all symbols advance together, bar by bar.
+    """
+    lengths = np.array([len(bars["close"]) for bars in new_bars])
+    width = int(lengths.max(initial=0))
+    if width == 0:
+        return
+
+    close = _left_aligned([bars["close"] for bars in new_bars], width)
+    for span in panel.EMA_SPANS:
+        key = str(span)
+        alpha = 2 / (span + 1)
+        y = np.array([s["ema"][key][0] for s in states], dtype="f8")
+        w = np.array([s["ema"][key][1] for s in states], dtype="f8")
+        for t in range(width):
+            y, w = panel.ema_step(y, w, close[:, t], alpha, active=t < lengths)
+        for i, state in enumerate(states):
+            state["ema"][key] = [float(y[i]), float(w[i])]
+
+    for state, bars in zip(states, new_bars):
+        ring = np.concatenate([np.asarray(state["ring"], dtype="f8"), bars["close"]])
+        state["ring"] = ring[-RING_BARS:].tolist()
+
+        tp_vol = (bars["high"] + bars["low"] + bars["close"]) / 3 * bars["volume"]
+        num, den = state["vwap"]
+        state["vwap"] = [float(num + np.nansum(tp_vol)), float(den + np.nansum(bars["volume"]))]
+
+def update_states(universe, timeframe="daily", symbols=None, rebuild=False,
+                  save=True, arrays=None, provisional=0):
+    """
+    Bring every symbol's state up to date with its bars.
+    Returns (symbols, states, last_values, lengths, stats) where
+    ``last_values`` is the raw last row of each symbol and ``stats`` counts
+    fresh / advanced / rebuilt states.
+
+    Bars come from the store unless ``arrays`` ({symbol: {column: array}},
+    e.g. candles resampled in memory) is given. The last ``provisional``
+    bars of each symbol (an open week or month) are applied to the
+    returned states but never persisted, so their daily changes do not
+    invalidate the saved history.
+    """
+    if arrays is None:
+        if symbols is None:
+            symbols = storage.list_symbols(universe, timeframe)
+        arrays = {}
+        for symbol in symbols:
+            if not storage.exists(universe, symbol, timeframe):
+                continue
+            try:
+                arrays[symbol] = _open(universe, symbol, timeframe)
+            except ValueError:
+                continue
+
+    kept, states, new_bars, open_bars, last_values, lengths, changed = [], [], [], [], [], [], []
+    stats = {"fresh": 0, "advanced": 0, "rebuilt": 0}
+
+    for symbol, columns in arrays.items():
+        n = len(columns[storage.DATE_COLUMN])
+        closed = max(n - provisional, 0)
+        state = None if rebuild else read_state(universe, symbol, timeframe)
+        current = history_hash(columns, closed)
+
+        if state is not None and state["rows"] == closed and state["history_hash"] == current:
+            stats["fresh"] += 1
+        elif (
+            state is None
+            or state["rows"] > closed
+            or state["history_hash"] != history_hash(columns, state["rows"])
+        ):
+            if state is not None:
+                print(f"♻️ {universe}/{timeframe}/{symbol}: history changed, rebuilding state")
+            state = empty_state()
+            stats["rebuilt"] += 1
+        else:
+            stats["advanced"] += 1
+        changed.append(state["rows"] != closed or state["history_hash"] != current)
+
+        start = state["rows"]
+        new_bars.append({col: _float(columns, col, start)[:closed - start] for col in HASH_COLUMNS})
+        open_bars.append({col: _float(columns, col, closed) for col in HASH_COLUMNS})
+
+        kept.append(symbol)
+        states.append(state)
+        lengths.append(n)
+        last_values.append(
+            {col: arr[n - 1] for col, arr in columns.items()} if n else {}
+        )
+
+        state["rows"] = closed
+        state["last_date"] = (
+            storage._date_str(columns[storage.DATE_COLUMN][closed - 1]) if closed else None
+        )
+        state["history_hash"] = current
+
+    _advance(states, new_bars)
+
+    if save:
+        for symbol, state, dirty in zip(kept, states, changed):
+            if dirty:
+                write_state(state, universe, symbol, timeframe)
+
+    if provisional:
+        states = copy.deepcopy(states)
+        _advance(states, open_bars)
+
+    return kept, states, last_values, np.array(lengths, dtype=np.int64), stats
+
+# ------------------------
+# Snapshot inputs
+# ------------------------
+def indicator_frame(symbols, states, last_values):
+    """
+    Last-bar indicator values from the states, named like
+    panel.indicator_frame(). Indexed by symbol.
+    """
+    index = pd.Index(symbols, name="symbol")
+    ring = _right_aligned([s["ring"] for s in states], RING_BARS)
+    out = {}
+
+    for n in panel.SMA_WINDOWS:
+        out[f"sma{n}"] = panel.sma(ring, n)[:, -1]
+
+    for span in panel.EMA_SPANS:
+        out[f"ema{span}"] = np.array([s["ema"][str(span)][0] for s in states], dtype="f8")
+
+    # Cumulative sums skip NaN bars, but a NaN last bar gives a NaN VWAP
+    def last(col):
+        return np.array([float(v.get(col, np.nan)) for v in last_values], dtype="f8")
+
+    num = np.array([s["vwap"][0] for s in states], dtype="f8")
+    den = np.array([s["vwap"][1] for s in states], dtype="f8")
+    tp_vol = (last("high") + last("low") + last("close")) / 3 * last("volume")
+    num = np.where(np.isnan(tp_vol), np.nan, num)
+    den = np.where(np.isnan(last("volume")), np.nan, den)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["vwap"] = num / den
+        out["vwap_dist_pct"] = (ring[:, -1] - out["vwap"]) / out["vwap"] * 100
+
+    upper, mid, lower = panel.bollinger(ring)
+    out["bb_upper"], out["bb_middle"], out["bb_lower"] = upper[:, -1], mid[:, -1], lower[:, -1]
+    out["rsi14"] = panel.rsi(ring)[:, -1]
+
+    return pd.DataFrame(out, index=index)
+
+def last_rows(symbols, last_values):
+    """Raw last-bar values per symbol, as panel.last_rows()."""
+    columns = []
+    for values in last_values:
+        for col in values:
+            if col not in columns:
+                columns.append(col)
+
+    data = {}
+    for col in columns:
+        values = np.array([v.get(col, np.nan) for v in last_values], dtype=object)
+        if col == storage.DATE_COLUMN:
+            data[col] = pd.to_datetime(values.astype("datetime64[ns]"))
+        else:
+            data[col] = pd.to_numeric(values)
+    return pd.DataFrame(data, index=pd.Index(symbols, name="symbol"))
@@ -0,0 +1,362 @@
+# scripts/instrument.py
+#
+# Lightweight run instrumentation shared by the EOD scripts. A run is a
+# sequence of stages; each stage records wall and CPU time, rows
+# processed, bytes read and written (/proc/self/io, plus the column
+# files the store memory-maps), peak RSS and fetch request latencies.
+# Inside a stage, work is timed per symbol (or per chunk where a stage
+# is vectorized), and the slowest symbols are listed with outliers
+# marked. With --profile N, the N slowest symbols of each stage are also
+# run under cProfile and their stats dumped for `python -m pstats`.
+#
+#   with instrument.run("build_snapshots", profile=args.profile):
+#       with instrument.stage("snapshots"):
+#           for symbol in symbols:
+#               with instrument.symbol(symbol):
+#                   instrument.add_rows(build(symbol))
+#
+# The report lands next to the precalc/ outputs as
+# precalc/run_report_<run>.json. Outside a run every call is a no-op, so
+# library functions can be instrumented unconditionally.
+
+import cProfile
+import heapq
+import itertools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+REPORT_DIR = BASE_DIR / "precalc"
+PROFILE_DIR = "profiles"    # under the report directory
+REPORT_VERSION = 1
+
+SLOWEST = 10            # symbols listed per stage
+OUTLIER_FACTOR = 5.0    # × the stage's median symbol time
+SAMPLE_INTERVAL = 0.005 # seconds between RSS samples
+
+PROC_IO = "/proc/self/io"
+PROC_STATM = "/proc/self/statm"
+
+_run = None
+_stage = None
+_lock = threading.Lock()
+_local = threading.local()    # .timing: the symbol() block open on this thread
+
+# ------------------------
+# Process counters
+# ------------------------
+def io_counters():
+    """(bytes read, bytes written) through syscalls so far, or (None, None)."""
+    try:
+        with open(PROC_IO, "r") as f:
+            fields = dict(line.split(":") for line in f)
+    except (OSError, ValueError):
+        return None, None
+    return int(fields["rchar"]), int(fields["wchar"])
+
+def rss_mb():
+    try:
+        with open(PROC_STATM, "r") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+def max_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class PeakRSS:
+    """Highest resident set size (MB) seen while the block runs."""
+
+    def __enter__(self):
+        self.peak = rss_mb()
+        self._done = threading.Event()
+        self._thread = None
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._done.wait(SAMPLE_INTERVAL):
+            self.peak = max(self.peak, rss_mb() or 0)
+
+    def __exit__(self, *exc):
+        self._done.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.peak = max(self.peak, rss_mb() or 0)
+
+# ------------------------
+# Recorders
+# ------------------------
+class Timing:
+    """Handle yielded by symbol(): set ``rows`` to what the symbol processed."""
+    __slots__ = ("rows",)
+
+    def __init__(self):
+        self.rows = 0
+
+class Stage:
+    def __init__(self, name, profile):
+        self.name = name
+        self.profile = profile
+        self.rows = 0
+        self.mapped = 0
+        self.symbols = {}     # key → [seconds, rows]
+        self.requests = []    # (seconds, attempts, status)
+        self.profiles = []    # min-heap of (seconds, seq, key, cProfile.Profile)
+        self._seq = itertools.count()
+
+    def add_symbol(self, key, seconds, rows, profiler):
+        with _lock:
+            entry = self.symbols.setdefault(key, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += rows
+            self.rows += rows
+            if profiler is not None:
+                item = (seconds, next(self._seq), key, profiler)
+                if len(self.profiles) < self.profile:
+                    heapq.heappush(self.profiles, item)
+                elif seconds > self.profiles[0][0]:
+                    heapq.heapreplace(self.profiles, item)
+
+    def symbol_summary(self):
+        if not self.symbols:
+            return None, []
+        ordered = sorted(self.symbols.items(), key=lambda kv: kv[1][0], reverse=True)
+        times = sorted(seconds for seconds, _ in self.symbols.values())
+        median = times[len(times) // 2]
+        summary = {
+            "count": len(times),
+            "total_seconds": round(sum(times), 4),
+            "median_seconds": round(median, 4),
+            "p95_seconds": round(times[min(len(times) - 1, int(len(times) * 0.95))], 4),
+            "max_seconds": round(times[-1], 4),
+            "outliers": sum(1 for t in times if median > 0 and t > median * OUTLIER_FACTOR),
+        }
+        slowest = [
+            {
+                "symbol": key,
+                "seconds": round(seconds, 4),
+                "rows": rows,
+                "outlier": median > 0 and seconds > median * OUTLIER_FACTOR,
+            }
+            for key, (seconds, rows) in ordered[:SLOWEST]
+        ]
+        return summary, slowest
+
+    def request_summary(self):
+        if not self.requests:
+            return None
+        latencies = sorted(seconds for seconds, _, _ in self.requests)
+        return {
+            "count": len(latencies),
+            "retried": sum(1 for _, attempts, _ in self.requests if attempts > 1),
+            "failed": sum(1 for _, _, status in self.requests if status == "error"),
+            "median_seconds": round(latencies[len(latencies) // 2], 4),
+            "max_seconds": round(latencies[-1], 4),
+        }
+
+    def dump_profiles(self, run):
+        out_dir = run.out_dir / PROFILE_DIR
+        out_dir.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for seconds, _, key, profiler in sorted(self.profiles, reverse=True):
+            safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(key))
+            path = out_dir / f"{run.name}_{self.name}_{safe}.prof"
+            profiler.dump_stats(path)
+            paths.append({"symbol": key, "seconds": round(seconds, 4), "path": str(path)})
+        return paths
+
+class Run:
+    def __init__(self, name, profile, out_dir):
+        self.name = name
+        self.profile = profile
+        self.out_dir = Path(out_dir or REPORT_DIR)
+        self.started = datetime.now(timezone.utc)
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.stages = []
+
+# ------------------------
+# API
+# ------------------------
+@contextmanager
+def run(name, profile=0, out_dir=None):
+    """
+    Record a run; on exit (also on failure) write its report to
+    ``out_dir`` (default precalc/) as run_report_<name>.json, and any
+    profiles to its profiles/ subdirectory.
+    """
+    global _run
+    if _run is not None:
+        # Nested scripts (e.g. the pipeline calling a script's main) share the outer run
+        yield _run
+        return
+
+    _run = current = Run(name, profile, out_dir)
+    if profile > 0:
+        # Profiles of an earlier run would be mistaken for this one's
+        for old in (current.out_dir / PROFILE_DIR).glob(f"{name}_*.prof"):
+            old.unlink()
+    status = "ok"
+    try:
+        yield current
+    except BaseException:
+        status = "failed"
+        raise
+    finally:
+        _run = None
+        write_report(current, status)
+
+@contextmanager
+def stage(name):
+    """Time one stage of the current run."""
+    global _stage
+    if _run is None or _stage is not None:
+        yield None
+        return
+
+    _stage = current = Stage(name, _run.profile)
+    read, written = io_counters()
+    wall, cpu = time.perf_counter(), time.process_time()
+    status = "ok"
+    try:
+        with PeakRSS() as rss:
+            yield current
+    except BaseException:
+        status = "failed"
+        raise
+    finally:
+        _stage = None
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        read_after, written_after = io_counters()
+        summary, slowest = current.symbol_summary()
+        record = {
+            "name": name,
+            "status": status,
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "rows": current.rows,
+            "rows_per_sec": round(current.rows / wall, 1) if wall > 0 else None,
+            "bytes_read": None if read is None else read_after - read,
+            "bytes_written": None if written is None else written_after - written,
+            "bytes_mapped": current.mapped,
+            "peak_rss_mb": None if rss.peak is None else round(rss.peak, 1),
+            "symbols": summary,
+            "slowest": slowest,
+            "requests": current.request_summary(),
+        }
+        if current.profiles:
+            record["profiles"] = current.dump_profiles(_run)
+        _run.stages.append(record)
+
+def skip(name, reason):
+    """Note a stage the run decided not to execute."""
+    if _run is not None:
+        _run.stages.append({"name": name, "status": "skipped", "reason": reason})
+
+@contextmanager
+def symbol(key):
+    """
+    Time one symbol (or chunk) of the current stage. Rows added with
+    add_rows() inside the block (or set on the yielded Timing) count
+    for it and the stage. Profiled when the run asked for --profile and
+    no other profiler is active.
+    """
+    current = _stage
+    timing = Timing()
+    if current is None:
+        yield timing
+        return
+
+    profiler = None
+    if current.profile > 0:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            profiler = None
+
+    outer = getattr(_local, "timing", None)
+    _local.timing = timing
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        seconds = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+        _local.timing = outer
+        current.add_symbol(key, seconds, timing.rows, profiler)
+
+def add_rows(rows):
+    """Rows processed: credited to the open symbol() block, else to the stage."""
+    current = _stage
+    if current is None:
+        return
+    timing = getattr(_local, "timing", None)
+    if timing is not None:
+        timing.rows += int(rows)
+    else:
+        with _lock:
+            current.rows += int(rows)
+
+def mapped(nbytes):
+    """Column bytes the store memory-mapped (not visible in /proc/self/io)."""
+    current = _stage
+    if current is not None:
+        with _lock:
+            current.mapped += int(nbytes)
+
+def request(seconds, attempts, status):
+    """One fetch request's latency (including retries) and outcome."""
+    current = _stage
+    if current is not None:
+        with _lock:
+            current.requests.append((seconds, attempts, status))
+
+# ------------------------
+# Report
+# ------------------------
+def report_path(name, out_dir=None):
+    return Path(out_dir or REPORT_DIR) / f"run_report_{name}.json"
+
+def write_report(current, status):
+    if any(stage["status"] == "failed" for stage in current.stages):
+        status = "failed"
+    report = {
+        "version": REPORT_VERSION,
+        "run": current.name,
+        "status": status,
+        "started": current.started.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "argv": sys.argv,
+        "wall_seconds": round(time.perf_counter() - current.wall, 4),
+        "cpu_seconds": round(time.process_time() - current.cpu, 4),
+        "max_rss_mb": round(max_rss_mb(), 1),
+        "stages": current.stages,
+    }
+    path = report_path(current.name, current.out_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, path)
+    print(f"🧾 Run report → {path}")
+    return report
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--profile", type=int, default=0, metavar="N",
+        help="cProfile the N slowest symbols of each stage (dumped under precalc/profiles/)"
+    )
+    return parser
@@ -0,0 +1,132 @@
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+# -----------------------------
+# MIGRATE (one-time CSV → store)
+# -----------------------------
+def migrate(universes, timeframes):
+    total = 0
+
+    for universe in universes:
+        for timeframe in timeframes:
+            root = storage.csv_dir(universe, timeframe)
+            if not root.exists():
+                continue
+
+            for path in sorted(root.glob("*.csv")):
+                symbol = path.stem
+                try:
+                    df = storage.load_ohlcv(universe, symbol, timeframe, source="csv")
+                    meta = storage.save_ohlcv(df, universe, symbol, timeframe, csv=False)
+                    total += 1
+                    print(f"✅ {universe}/{timeframe}/{symbol} → {meta['rows']} rows")
+                except Exception as e:
+                    print(f"❌ Failed {path}: {e}")
+
+    print(f"\n🎯 Migrated {total} files into {storage.STORE_DIR}")
+
+# -----------------------------
+# EXPORT (store → CSV / Parquet / Feather)
+# -----------------------------
+def export(universes, timeframes, fmt, out_dir):
+    for universe in universes:
+        for timeframe in timeframes:
+            if fmt == "csv":
+                symbols = storage.list_symbols(universe, timeframe)
+                for symbol in symbols:
+                    if storage.read_meta(universe, symbol, timeframe) is None:
+                        continue
+                    storage.export_csv(universe, symbol, timeframe)
+                print(f"✅ {universe}/{timeframe}: CSV mirrors refreshed")
+                continue
+
+            path = out_dir / f"{universe}_{timeframe}.{fmt}"
+            storage.export_table(universe, path, timeframe, fmt=fmt)
+            print(f"✅ {universe}/{timeframe} → {path}")
+
+# -----------------------------
+# VERIFY (manifest across checkouts)
+# -----------------------------
+def _new_process(data_dir, stamps=True):
+    """Forget the in-memory manifest as a new process on ``data_dir`` would."""
+    storage.flush_manifest()
+    storage.DATA_DIR, storage.STORE_DIR = data_dir, data_dir / "store"
+    storage._manifest = storage._stamps = None
+    if not stamps:
+        storage.stamps_path().unlink(missing_ok=True)
+
+def verify_manifest(rows=300, seed=0):
+    """
+    A fresh checkout (no local stamps) must leave the manifest untouched,
+    yet still see a CSV mirror edited behind the store's back.
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.01, rows))
+    df = pd.DataFrame({
+        "date": pd.bdate_range("2024-01-01", periods=rows),
+        "open": close, "high": close * 1.01, "low": close * 0.99, "close": close,
+        "volume": rng.integers(1000, 10000, rows),
+    })
+    saved = storage.DATA_DIR, storage.STORE_DIR, storage._manifest, storage._stamps
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = Path(tmp)
+            _new_process(data_dir)
+            for symbol in ("AAA", "BBB"):
+                storage.save_ohlcv(df, "stocks", symbol)
+            _new_process(data_dir)
+            written = storage.manifest_path().read_bytes()
+
+            checks = []
+            for stamps in (True, False):
+                _new_process(data_dir, stamps)
+                checks.append((f"untouched CSV, stamps={stamps}", storage.csv_changed("stocks", "AAA"), False))
+                _new_process(data_dir)
+                checks.append((f"manifest rewritten, stamps={stamps}",
+                               storage.manifest_path().read_bytes() != written, False))
+
+            # Edit BBB's mirror outside the store (drop its last bar)
+            path = storage.csv_path("stocks", "BBB")
+            lines = path.read_text().splitlines(keepends=True)
+            path.write_text("".join(lines[:-1]))
+            for stamps in (False, True, False):
+                _new_process(data_dir, stamps)
+                checks.append((f"edited CSV, stamps={stamps}", storage.csv_changed("stocks", "BBB"), True))
+            storage.flush_manifest()
+    finally:
+        storage.DATA_DIR, storage.STORE_DIR, storage._manifest, storage._stamps = saved
+
+    for name, got, expected in checks:
+        if got != expected:
+            print(f"❌ manifest: {name} gave {got}, expected {expected}")
+            return False
+    print(f"✅ manifest: unchanged across fresh checkouts, edited CSVs stay changed ({len(checks)} checks)")
+    return True
+
+# -----------------------------
+# RUN
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar OHLCV store tools")
+    parser.add_argument("action", choices=["migrate", "export", "verify"])
+    parser.add_argument("--universe", choices=list(storage.UNIVERSES), action="append")
+    parser.add_argument("--timeframe", choices=storage.TIMEFRAMES, action="append")
+    parser.add_argument("--format", choices=["csv", "parquet", "feather"], default="csv")
+    parser.add_argument("--out-dir", default=str(storage.DATA_DIR / "exports"))
+    args = parser.parse_args()
+
+    universes = args.universe or list(storage.UNIVERSES)
+    timeframes = args.timeframe or list(storage.TIMEFRAMES)
+
+    if args.action == "verify":
+        raise SystemExit(0 if verify_manifest() else 1)
+    if args.action == "migrate":
+        migrate(universes, timeframes)
+    else:
+        export(universes, timeframes, args.format, Path(args.out_dir))
@@ -1,43 +1,58 @@
-import os
-import pandas as pd
+import argparse
 
-DATA_DIR = "data/stocks/NIFTY500"
-
-print("🔧 Normalizing NIFTY 500 stock CSVs")
-
-for file in os.listdir(DATA_DIR):
-    if not file.endswith(".csv"):
-        continue
-
-    path = os.path.join(DATA_DIR, file)
+import instrument
+import storage
 
+def normalize_symbol(symbol):
+    """Raw CSV → store schema, written back to the store and CSV mirror."""
     try:
-        df = pd.read_csv(path)
-
-        # --- FIX COLUMN NAMES ---
-        df.columns = (
-            df.columns
-            .str.strip()
-            .str.lower()
-            .str.replace(" ", "_")
-        )
+        with instrument.symbol(symbol):
+            # --- FIX COLUMN NAMES + DATES (raw CSV → store schema) ---
+            df = storage.load_ohlcv("stocks", symbol, source="csv")
+            instrument.add_rows(len(df))
 
-        if "date" not in df.columns:
-            print(f"❌ Skipping {file} (no date column)")
-            continue
+            # --- WRITE STORE + CSV MIRROR ---
+            storage.save_ohlcv(df, "stocks", symbol)
+        print(f"✅ Normalized {symbol}")
+        return True
 
-        # --- FIX DATE ---
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        df["date"] = df["date"].dt.tz_localize(None)
-
-        df.dropna(subset=["date"], inplace=True)
-        df.sort_values("date", inplace=True)
-        df.drop_duplicates(subset=["date"], inplace=True)
-
-        df.to_csv(path, index=False)
-        print(f"✅ Normalized {file}")
+    except ValueError:
+        print(f"❌ Skipping {symbol} (no date column)")
 
     except Exception as e:
-        print(f"❌ Failed {file}: {e}")
-
-print("🎯 Stock CSV normalization completed")
+        print(f"❌ Failed {symbol}: {e}")
+
+    return False
+
+def normalize_stocks(symbols=None, force=False):
+    """
+    Normalize ``symbols`` (default: every stock CSV); returns those written.
+    Unless ``force``, CSVs the store itself wrote last are skipped.
+    """
+    print("🔧 Normalizing NIFTY 500 stock CSVs")
+
+    if symbols is None:
+        symbols = [path.stem for path in sorted(storage.csv_dir("stocks").glob("*.csv"))]
+
+    dirty = symbols if force else [s for s in symbols if storage.csv_changed("stocks", s)]
+    if len(dirty) < len(symbols):
+        print(f"⏭️ {len(symbols) - len(dirty)} CSVs unchanged since the store wrote them")
+
+    normalized = [symbol for symbol in dirty if normalize_symbol(symbol)]
+    storage.flush_manifest()
+
+    print("🎯 Stock CSV normalization completed")
+    return normalized
+
+if __name__ == "__main__":
+    parser = instrument.add_arguments(
+        argparse.ArgumentParser(description="Normalize NIFTY 500 stock CSVs")
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="normalize every CSV, not just those changed outside the store"
+    )
+    args = parser.parse_args()
+
+    with instrument.run("normalize_stock_csvs", args.profile), instrument.stage("normalize"):
+        normalize_stocks(force=args.force)
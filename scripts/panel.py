@@ -0,0 +1,284 @@
+# scripts/panel.py
+#
+# Symbol × time panel engine. Every symbol's trailing bars are
+# right-aligned into one 2-D float array (rows = symbols, columns = bars,
+# NaN-padded on the left for short histories) so each indicator is a
+# handful of NumPy ops across the whole universe instead of a pandas
+# call per symbol. Semantics match the Series indicators in
+# build_snapshots.py (rolling windows need a full window of non-NaN
+# values, EMA follows ewm(adjust=False)).
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+# ------------------------
+# Trailing bars each indicator needs
+# ------------------------
+SMA_WINDOWS = (5, 9, 20, 50, 120, 200)
+EMA_SPANS = (20, 50)
+BB_WINDOW = 20
+RSI_WINDOW = 14
+
+# EMAs never fully forget their seed; after 10 spans the seed's weight is
+# (1 - 2/51) ** 500 ≈ 2e-9 for ema50, far below the snapshot rounding.
+EMA_WARMUP = 10
+
+TAIL_BARS = max(max(SMA_WINDOWS), RSI_WINDOW + 1, max(EMA_SPANS) * EMA_WARMUP)
+
+PANEL_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+class Panel:
+    """Right-aligned (symbols × bars) arrays plus per-symbol metadata."""
+
+    def __init__(self, symbols, dates, values, last, lengths, vwap_num, vwap_den):
+        self.symbols = symbols          # list[str]
+        self.dates = dates              # (S, N) datetime64[D], NaT padded
+        self.values = values            # {column: (S, N) float64}
+        self.last = last                # {column: (S,) last raw value}
+        self.lengths = lengths          # (S,) full history length
+        self.vwap_num = vwap_num        # (S,) Σ typical price × volume
+        self.vwap_den = vwap_den        # (S,) Σ volume
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @property
+    def bars(self):
+        return self.dates.shape[1]
+
+# ------------------------
+# Building panels
+# ------------------------
+def _vwap_sums(high, low, close, volume):
+    """
+    Full-history cumulative VWAP terms, matching
+    (tp * volume).cumsum() / volume.cumsum() evaluated at the last bar.
+    """
+    tp_vol = (high + low + close) / 3 * volume
+    num = np.nansum(tp_vol)
+    den = np.nansum(volume)
+    if len(tp_vol) == 0 or np.isnan(tp_vol[-1]):
+        num = np.nan
+    if len(volume) == 0 or np.isnan(volume[-1]):
+        den = np.nan
+    return num, den
+
+def _assemble(symbols, columns_by_symbol, bars):
+    """columns_by_symbol: list of {column: 1-D array} holding full histories."""
+    S = len(symbols)
+    longest = max((len(cols[storage.DATE_COLUMN]) for cols in columns_by_symbol), default=0)
+    N = longest if bars is None else min(bars, longest)
+
+    dates = np.full((S, N), np.datetime64("NaT"), dtype=storage.DATE_DTYPE)
+    values = {col: np.full((S, N), np.nan) for col in PANEL_COLUMNS}
+    lengths = np.zeros(S, dtype=np.int64)
+    vwap_num = np.full(S, np.nan)
+    vwap_den = np.full(S, np.nan)
+
+    raw_order = [storage.DATE_COLUMN]
+    last = {}
+
+    for i, cols in enumerate(columns_by_symbol):
+        n = len(cols[storage.DATE_COLUMN])
+        lengths[i] = n
+        if n == 0:
+            continue
+
+        k = min(N, n)
+        dates[i, N - k:] = np.asarray(cols[storage.DATE_COLUMN][n - k:]).astype(storage.DATE_DTYPE)
+
+        for col in PANEL_COLUMNS:
+            if col in cols:
+                values[col][i, N - k:] = np.asarray(cols[col][n - k:], dtype="f8")
+
+        for col, arr in cols.items():
+            if col not in last:
+                if col != storage.DATE_COLUMN:
+                    raw_order.append(col)
+                last[col] = np.full(S, np.nan, dtype=object)
+            last[col][i] = arr[n - 1]
+
+        if all(c in cols for c in ("high", "low", "close", "volume")):
+            vwap_num[i], vwap_den[i] = _vwap_sums(
+                np.asarray(cols["high"], dtype="f8"),
+                np.asarray(cols["low"], dtype="f8"),
+                np.asarray(cols["close"], dtype="f8"),
+                np.asarray(cols["volume"], dtype="f8"),
+            )
+
+    last = {col: last[col] for col in raw_order if col in last}
+    return Panel(list(symbols), dates, values, last, lengths, vwap_num, vwap_den)
+
+def panel_from_frames(frames, bars=TAIL_BARS):
+    """Build a panel from {symbol: DataFrame} already in memory."""
+    symbols = list(frames)
+    columns = [
+        {col: frames[s][col].to_numpy() for col in frames[s].columns}
+        for s in symbols
+    ]
+    return _assemble(symbols, columns, bars)
+
+def panel_from_arrays(arrays, bars=TAIL_BARS):
+    """Build a panel from {symbol: {column: array}} already in memory."""
+    return _assemble(list(arrays), list(arrays.values()), bars)
+
+def load_panel(universe, timeframe="daily", symbols=None, bars=TAIL_BARS):
+    """
+    Build a panel straight from the memory-mapped store: only the last
+    ``bars`` rows are copied into the panel, the VWAP sums are a single
+    pass over the mapped columns. Unmigrated symbols fall back to CSV.
+    """
+    if symbols is None:
+        symbols = storage.list_symbols(universe, timeframe)
+
+    kept, columns = [], []
+    for symbol in symbols:
+        if not storage.exists(universe, symbol, timeframe):
+            continue
+        try:
+            arrays = storage.open_columns(universe, symbol, timeframe, storage.OHLCV_COLUMNS)
+            if arrays is None:
+                df = storage.load_ohlcv(universe, symbol, timeframe, columns=storage.OHLCV_COLUMNS)
+                arrays = {col: df[col].to_numpy() for col in df.columns}
+        except ValueError:
+            continue
+        kept.append(symbol)
+        columns.append(arrays)
+
+    return _assemble(kept, columns, bars)
+
+# ------------------------
+# Indicators over (S, N) arrays
+# ------------------------
+def _row_reference(x):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        ref = np.nanmean(x, axis=1, keepdims=True)
+    return np.nan_to_num(ref)
+
+def rolling_sum(x, n):
+    """Trailing n-bar sum; NaN unless all n values are present."""
+    S, N = x.shape
+    out = np.full((S, N), np.nan)
+    if N < n:
+        return out
+
+    valid = ~np.isnan(x)
+    # Centre each row before the cumulative sum to keep round-off small
+    ref = _row_reference(x)
+    filled = np.where(valid, x - ref, 0.0)
+
+    csum = np.concatenate([np.zeros((S, 1)), np.cumsum(filled, axis=1)], axis=1)
+    ccount = np.concatenate([np.zeros((S, 1), dtype=np.int64), np.cumsum(valid, axis=1)], axis=1)
+
+    window = csum[:, n:] - csum[:, :-n]
+    count = ccount[:, n:] - ccount[:, :-n]
+    out[:, n - 1:] = np.where(count == n, window + n * ref, np.nan)
+    return out
+
+def sma(x, n):
+    return rolling_sum(x, n) / n
+
+def rolling_std(x, n):
+    """Sample standard deviation (ddof=1) over a trailing n-bar window."""
+    # Variance is shift invariant; centring keeps Σx² well conditioned
+    x = x - _row_reference(x)
+    mean = sma(x, n)
+    sq = rolling_sum(x * x, n)
+    with np.errstate(invalid="ignore"):
+        var = (sq - n * mean * mean) / (n - 1)
+    return np.sqrt(np.clip(var, 0, None))
+
+def ema_step(y, w, cur, alpha, active=None):
+    """
+    One bar of the ewm(adjust=False) recurrence for a vector of series.
+    ``y`` is the running EMA (NaN until the first observation), ``w`` the
+    weight of the previous value; NaN bars only decay ``w``. Rows where
+    ``active`` is False are left untouched.
+    """
+    obs = ~np.isnan(cur)
+    started = ~np.isnan(y)
+    if active is not None:
+        obs &= active
+        started &= active
+
+    w = np.where(started, w * (1 - alpha), w)
+    with np.errstate(invalid="ignore"):
+        blend = (w * y + alpha * cur) / (w + alpha)
+    y = np.where(started & obs, blend, y)
+    y = np.where(~started & obs, cur, y)
+    w = np.where(obs, 1.0, w)
+    return y, w
+
+def ema(x, span):
+    """Recursive EMA matching Series.ewm(span, adjust=False) incl. NaN gaps."""
+    alpha = 2 / (span + 1)
+    S, N = x.shape
+    out = np.empty((S, N))
+
+    y = np.full(S, np.nan)
+    w = np.ones(S)
+    for t in range(N):
+        y, w = ema_step(y, w, x[:, t], alpha)
+        out[:, t] = y
+    return out
+
+def rsi(x, n=RSI_WINDOW):
+    delta = np.full_like(x, np.nan)
+    delta[:, 1:] = x[:, 1:] - x[:, :-1]
+    gain = np.where(np.isnan(delta), np.nan, np.clip(delta, 0, None))
+    loss = np.where(np.isnan(delta), np.nan, -np.clip(delta, None, 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = sma(gain, n) / sma(loss, n)
+        return 100 - (100 / (1 + rs))
+
+def bollinger(x, n=BB_WINDOW):
+    mid = sma(x, n)
+    std = rolling_std(x, n)
+    return mid + 2 * std, mid, mid - 2 * std
+
+# ------------------------
+# Last-bar indicator table
+# ------------------------
+def indicator_frame(panel):
+    """
+    Last-bar indicator values for every symbol, named like the columns
+    build_snapshot() adds (sma5 … rsi14). Indexed by symbol.
+    """
+    close = panel.values["close"]
+    out = {}
+
+    for n in SMA_WINDOWS:
+        out[f"sma{n}"] = sma(close, n)[:, -1] if panel.bars else np.full(len(panel), np.nan)
+
+    for span in EMA_SPANS:
+        out[f"ema{span}"] = ema(close, span)[:, -1] if panel.bars else np.full(len(panel), np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["vwap"] = panel.vwap_num / panel.vwap_den
+        out["vwap_dist_pct"] = (panel.values["close"][:, -1] - out["vwap"]) / out["vwap"] * 100
+
+    if panel.bars:
+        upper, mid, lower = bollinger(close)
+        out["bb_upper"], out["bb_middle"], out["bb_lower"] = upper[:, -1], mid[:, -1], lower[:, -1]
+        out["rsi14"] = rsi(close)[:, -1]
+    else:
+        for col in ("bb_upper", "bb_middle", "bb_lower", "rsi14"):
+            out[col] = np.full(len(panel), np.nan)
+
+    return pd.DataFrame(out, index=pd.Index(panel.symbols, name="symbol"))
+
+def last_rows(panel):
+    """Raw last-bar values (date, OHLCV, …) per symbol, as in df.iloc[-1]."""
+    data = {}
+    for col, values in panel.last.items():
+        if col == storage.DATE_COLUMN:
+            data[col] = pd.to_datetime(values.astype("datetime64[ns]"))
+        else:
+            data[col] = pd.to_numeric(values)
+    return pd.DataFrame(data, index=pd.Index(panel.symbols, name="symbol"))
@@ -0,0 +1,348 @@
+# scripts/publish_snapshots.py
+#
+# Delta publishing of the snapshot outputs. Instead of shipping the
+# full-precision precalc/*.csv files every night, the snapshots are
+# encoded with a per-column type and precision (prices to the paisa,
+# percentages to 3 decimals, ...) and only the fields that changed since
+# the previous publication are written, as a gzip JSON delta in a chain:
+#
+#   manifest.json          sequence, schema, chain, per-snapshot hashes
+#   base-<seq>.json.gz     full state the chain starts from
+#   delta-<seq>.json.gz    per column, the rows whose value changed
+#
+# (the file layouts are described in snapshot_apply.py)
+#
+# The chain is compacted into a new base when the schema or the set of
+# snapshots changes, after MAX_DELTAS deltas, or once the deltas outweigh
+# COMPACT_RATIO of the base. snapshot_apply.py is the consumer side.
+#
+#   python scripts/publish_snapshots.py                   # precalc/publish
+#   python scripts/publish_snapshots.py --out botrepo/data_precalc/publish
+#   python scripts/publish_snapshots.py --verify          # offline round trip
+
+import argparse
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import snapshot_apply
+import storage
+
+SNAPSHOT_DIR = storage.BASE_DIR / "precalc"
+PUBLISH_DIR = "publish"     # under the snapshot directory
+SNAPSHOT_NAMES = [
+    f"{universe}_{timeframe}"
+    for universe in ("indices", "stocks") for timeframe in ("daily", "weekly", "monthly")
+] + ["sectors_daily"]
+# Row key of each snapshot (default "symbol")
+KEYS = {"sectors_daily": "sector"}
+
+MAX_DELTAS = 30
+COMPACT_RATIO = 4.0
+
+# Decimals kept per float column: prices and price-level indicators to
+# the paisa unless listed here or matched by prefix / suffix
+PRICE_DECIMALS = 2
+DECIMALS = {"rsi14": 2, "bb_position": 4, "dividends": 4, "stock_splits": 4, "rs_percentile": 1}
+PREFIX_DECIMALS = {"beta_": 3, "corr_": 3}
+SUFFIX_DECIMALS = {"_pct": 3}
+# Columns typed regardless of how they were read (an int column with a
+# missing value comes back from CSV as float)
+TYPES = {"volume": "int", "confidence_score": "int"}
+
+# ------------------------
+# Encoding
+# ------------------------
+def column_type(name, series):
+    if name in TYPES:
+        return {"type": TYPES[name]}
+    if pd.api.types.is_bool_dtype(series):
+        return {"type": "bool"}
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return {"type": "date"}
+    if pd.api.types.is_integer_dtype(series):
+        return {"type": "int"}
+    if pd.api.types.is_float_dtype(series):
+        decimals = DECIMALS.get(name, PRICE_DECIMALS)
+        if name not in DECIMALS:
+            for prefix, places in PREFIX_DECIMALS.items():
+                if name.startswith(prefix):
+                    decimals = places
+            for suffix, places in SUFFIX_DECIMALS.items():
+                if name.endswith(suffix):
+                    decimals = places
+        return {"type": "float", "decimals": decimals}
+    return {"type": "str"}
+
+def frame_schema(df):
+    return {col: column_type(col, df[col]) for col in df.columns}
+
+def encode_column(series, spec):
+    """One column as a list of JSON values per ``spec`` (missing → None)."""
+    missing = series.isna().to_numpy()
+    kind = spec["type"]
+    if kind == "float":
+        # + 0.0 folds -0.0 into 0.0 so equal values always hash the same
+        values = (np.round(series.to_numpy(dtype="f8", na_value=np.nan), spec["decimals"]) + 0.0).tolist()
+    elif kind == "int":
+        values = np.rint(series.to_numpy(dtype="f8", na_value=np.nan)).tolist()
+        values = [None if m else int(v) for v, m in zip(values, missing)]
+    elif kind == "bool":
+        values = [bool(v) for v in series.fillna(False).to_numpy()]
+    elif kind == "date":
+        values = pd.to_datetime(series).dt.strftime("%Y-%m-%d").tolist()
+    else:
+        values = series.astype(object).tolist()
+    return [None if m else v for v, m in zip(values, missing)]
+
+def row_key(name):
+    return KEYS.get(name, "symbol")
+
+def encode_frame(df, schema, key="symbol"):
+    """{"columns", "order", "rows"} state of one snapshot frame, rows keyed by ``key``."""
+    columns = list(schema)
+    encoded = [encode_column(df[col], schema[col]) for col in columns]
+    keys = df[key].astype(str).tolist()
+    return {
+        "columns": columns,
+        "order": keys,
+        "rows": {k: list(values) for k, values in zip(keys, zip(*encoded))},
+    }
+
+# ------------------------
+# Deltas
+# ------------------------
+def diff_snapshot(old, new):
+    """Field-level change from ``old`` to ``new`` (same columns), or None."""
+    columns = new["columns"]
+    changes = {col: ([], []) for col in columns}
+    for i, symbol in enumerate(new["order"]):
+        row = new["rows"][symbol]
+        before = old["rows"].get(symbol)
+        for col, value, previous in zip(columns, row, before or [None] * len(row)):
+            if before is None or value != previous:
+                positions, values = changes[col]
+                positions.append(i)
+                values.append(value)
+
+    change = {}
+    changes = {col: [positions, values] for col, (positions, values) in changes.items() if positions}
+    if changes:
+        change["changes"] = changes
+    deleted = [symbol for symbol in old["order"] if symbol not in new["rows"]]
+    if deleted:
+        change["delete"] = deleted
+    if old["order"] != new["order"]:
+        change["order"] = new["order"]
+    return change or None
+
+def _chain_file(kind, sequence):
+    return f"{kind}-{sequence:06d}.json.gz"
+
+def _previous(out_dir):
+    """(manifest, state) of the existing chain, or (None, None) if unusable."""
+    if not (out_dir / snapshot_apply.MANIFEST_FILE).exists():
+        return None, None
+    try:
+        manifest = snapshot_apply.read_manifest(out_dir)
+        state = snapshot_apply.load_state(out_dir, manifest)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Published chain unreadable ({e}): starting a new base")
+        return None, None
+    if snapshot_apply.check_state(state, manifest):
+        print("⚠️ Published chain does not match its manifest: starting a new base")
+        return None, None
+    return manifest, state
+
+def publish(snapshots, out_dir=None, max_deltas=MAX_DELTAS, now=None):
+    """
+    Publish {name: snapshot frame} into ``out_dir`` (default
+    precalc/publish) as the next delta of the chain, or a new base.
+    Returns the manifest (unchanged when nothing changed).
+    """
+    out_dir = Path(out_dir or SNAPSHOT_DIR / PUBLISH_DIR)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    schema = {name: frame_schema(df) for name, df in snapshots.items()}
+    encoded = {
+        name: encode_frame(df, schema[name], row_key(name)) for name, df in snapshots.items()
+    }
+    manifest, state = _previous(out_dir)
+    sequence = 0 if manifest is None else manifest["sequence"] + 1
+
+    delta = None
+    if manifest is not None and manifest["schema"] == schema:
+        changes = {}
+        for name, snapshot in encoded.items():
+            change = diff_snapshot(state["snapshots"][name], snapshot)
+            if change is not None:
+                changes[name] = change
+        if not changes:
+            print("⏭️ Snapshots unchanged since the last publication")
+            return manifest
+        delta = {"sequence": sequence, "snapshots": changes}
+
+    if delta is not None:
+        name = _chain_file("delta", sequence)
+        snapshot_apply.write_json(out_dir / name, delta)
+        sizes = dict(manifest["bytes"])
+        sizes["deltas"] += (out_dir / name).stat().st_size
+        chain = manifest["deltas"] + [name]
+        if len(chain) > max_deltas or sizes["deltas"] > sizes["base"] * COMPACT_RATIO:
+            delta = None
+        else:
+            base, base_sequence = manifest["base"], manifest["base_sequence"]
+
+    if delta is None:
+        base, base_sequence, chain = _chain_file("base", sequence), sequence, []
+        snapshot_apply.write_json(
+            out_dir / base,
+            snapshot_apply.state_to_file({"sequence": sequence, "snapshots": encoded}),
+        )
+        sizes = {"base": (out_dir / base).stat().st_size, "deltas": 0}
+
+    now = now or datetime.now(timezone.utc)
+    manifest = {
+        "version": snapshot_apply.FORMAT_VERSION,
+        "sequence": sequence,
+        "created": now.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "base": base,
+        "base_sequence": base_sequence,
+        "deltas": chain,
+        "bytes": sizes,
+        "schema": schema,
+        "snapshots": {
+            name: {"rows": len(snap["order"]), "hash": snapshot_apply.snapshot_hash(snap)}
+            for name, snap in encoded.items()
+        },
+    }
+    snapshot_apply.write_json(out_dir / snapshot_apply.MANIFEST_FILE, manifest)
+
+    # Files of a compacted chain go only once the manifest no longer names them
+    keep = {snapshot_apply.MANIFEST_FILE, base, *chain}
+    for path in out_dir.glob("*.json.gz"):
+        if path.name not in keep:
+            path.unlink()
+
+    kind = "base" if not chain else "delta"
+    size = sizes["base"] if not chain else (out_dir / chain[-1]).stat().st_size
+    print(f"📤 Published snapshot {kind} #{sequence} ({size / 1024:.1f} KiB) → {out_dir}")
+    return manifest
+
+# ------------------------
+# Offline verification
+# ------------------------
+def _evolve(snapshots, rng):
+    """Next night's snapshots: moved values, the odd listing, delisting and gap."""
+    out = {}
+    for name, df in snapshots.items():
+        df = df.copy()
+        floats = [c for c in df.columns if pd.api.types.is_float_dtype(df[c])]
+        for col in floats:
+            moved = rng.random(len(df)) < 0.7
+            df.loc[moved, col] = df.loc[moved, col] * rng.normal(1, 0.01, moved.sum())
+        if "date" in df:
+            df["date"] = df["date"] + pd.Timedelta(days=1)
+        if len(df) > 2 and rng.random() < 0.3:
+            df = df.drop(index=df.index[rng.integers(len(df))])
+        if rng.random() < 0.3:
+            extra = df.iloc[[0]].copy()
+            extra[row_key(name)] = f"NEW{rng.integers(1_000_000)}"
+            df = pd.concat([df, extra], ignore_index=True)
+        if floats and rng.random() < 0.2:
+            df.loc[df.index[0], floats[0]] = np.nan
+        out[name] = df.reset_index(drop=True)
+    return out
+
+def _expected(snapshots):
+    return {
+        name: encode_frame(df, frame_schema(df), row_key(name)) for name, df in snapshots.items()
+    }
+
+def random_snapshot(n, timeframe, rng):
+    """A snapshot-shaped frame with every column type the encoder handles."""
+    close = rng.uniform(10, 5000, n)
+    df = pd.DataFrame({
+        "date": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 5, n), unit="D"),
+        "close": close,
+        "volume": rng.integers(0, 10**7, n),
+        "sma20": close * rng.normal(1, 0.05, n),
+        "rsi14": rng.uniform(0, 100, n),
+        "bb_position": rng.uniform(-0.5, 1.5, n),
+        "sma5_dist_pct": rng.normal(0, 2, n),
+        "symbol": [f"S{i}" for i in range(n)],
+        "trend": rng.choice(["Bullish", "Bearish", "Sideways"], n),
+        "volatility_flag": rng.random(n) < 0.3,
+        "timeframe": timeframe,
+    })
+    if timeframe == "daily":
+        df["confidence_score"] = rng.integers(0, 101, n)
+    return df
+
+def verify_publish(nights=40, seed=0):
+    """Publish evolving snapshots and check a consumer rebuilds each night exactly."""
+    rng = np.random.default_rng(seed)
+    snapshots = {
+        name: random_snapshot(25, name.split("_")[1], rng).rename(columns={"symbol": row_key(name)})
+        for name in SNAPSHOT_NAMES
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        published, early, late = Path(tmp) / "pub", Path(tmp) / "early", Path(tmp) / "late"
+        for night in range(nights):
+            publish(snapshots, published, max_deltas=7)
+            # "early" applies every night; "late" only now and then
+            consumers = [early] + ([late] if night % 9 == 8 else [])
+            for consumer in consumers:
+                snapshot_apply.apply(published, consumer)
+                state = snapshot_apply.state_from_file(
+                    snapshot_apply.read_json(consumer / snapshot_apply.STATE_FILE)
+                )
+                if state["snapshots"] != _expected(snapshots):
+                    print(f"❌ publish: night {night} rebuilt differently in {consumer.name}")
+                    return False
+                for name, df in snapshots.items():
+                    csv = pd.read_csv(consumer / f"{name}.csv")
+                    key = row_key(name)
+                    if list(csv[key].astype(str)) != list(df[key].astype(str)):
+                        print(f"❌ publish: night {night} {name}.csv rows out of order")
+                        return False
+            snapshots = _evolve(snapshots, rng)
+
+    print(f"✅ publish: consumers rebuild every snapshot exactly ({nights} nights)")
+    return True
+
+def read_snapshots(snapshot_dir):
+    import build_snapshots
+    snapshots = {}
+    for name in SNAPSHOT_NAMES:
+        df = build_snapshots.read_snapshot(name, snapshot_dir)
+        if df is None:
+            raise FileNotFoundError(f"{snapshot_dir / name}.csv missing or unreadable")
+        snapshots[name] = df
+    return snapshots
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish snapshot deltas")
+    parser.add_argument(
+        "--snapshots", type=Path, default=SNAPSHOT_DIR,
+        help="directory with the snapshot CSVs to publish"
+    )
+    parser.add_argument("--out", type=Path, help="published chain (default: <snapshots>/publish)")
+    parser.add_argument(
+        "--verify", action="store_true",
+        help="round-trip random snapshots through publish / apply offline and exit"
+    )
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(0 if verify_publish() else 1)
+
+    publish(read_snapshots(args.snapshots), args.out or args.snapshots / PUBLISH_DIR)
+
+if __name__ == "__main__":
+    main()
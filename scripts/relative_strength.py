@@ -0,0 +1,500 @@
+# scripts/relative_strength.py
+#
+# Cross-sectional statistics of every stock against the indices, added
+# to the daily snapshots by build_snapshots.py:
+#
+#   beta_<index>, corr_<index>   rolling BETA_WINDOW-session beta and
+#                                correlation of daily log returns, for
+#                                each index in BENCHMARKS
+#   rs_<index>_pct               RS_WINDOW-session return in excess of
+#                                the first benchmark, in percent
+#   rs_percentile                percentile of rs_<index>_pct within
+#                                the stocks (100 = strongest; not
+#                                ranked for the indices)
+#
+#   python scripts/relative_strength.py                    # refresh + top RS
+#   python scripts/relative_strength.py --matrix corr.npy  # full correlation matrix
+#   python scripts/relative_strength.py --verify           # offline checks
+#
+# Every universe is aligned on the sessions of CALENDAR_INDEX up to its
+# snapshot date (the newest bar of any of its symbols: the indices may
+# well be stored further than the stocks), as a (symbols × sessions)
+# matrix of split-adjusted closes, so the statistics are masked sums
+# over the whole universe at once (missing bars drop out pairwise). Each
+# symbol's windows end at its own last bar and are paired with the
+# benchmark closes of the same sessions, so a symbol a session or a few
+# behind (a failed fetch, a suspension) still gets its statistics; one
+# more than MAX_LAG sessions behind gets NaN. The matrices of the last
+# CALENDAR_BARS sessions are cached in data/state/relative.npz: a nightly
+# run shifts them onto the new sessions and re-reads only the tail of
+# the symbols whose stored bars changed since the last run (per the
+# manifest), so the full histories are never loaded.
+#
+# Full correlation matrices are computed in blocks of symbols and can be
+# written straight to a memory-mapped .npy file, so memory stays bounded
+# by the block size rather than the universe size.
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import adjustments
+import indicator_state
+import storage
+
+BENCHMARKS = ("NIFTY50", "BANKNIFTY")
+CALENDAR_INDEX = "NIFTY50"
+BETA_WINDOW = 120       # sessions of returns per beta / correlation
+MIN_SESSIONS = 80       # fewer paired returns than this → NaN
+RS_WINDOW = 63          # sessions for relative strength (~3 months)
+WINDOW_BARS = max(BETA_WINDOW, RS_WINDOW) + 1
+MAX_LAG = 20            # sessions a symbol may trail its universe's snapshot date
+CALENDAR_BARS = WINDOW_BARS + MAX_LAG
+BLOCK_SIZE = 256        # symbols per block of a full correlation matrix
+
+CACHE_PATH = indicator_state.STATE_DIR / "relative.npz"
+CACHE_VERSION = 2
+CONSUMER = "relative"
+
+def columns():
+    """Snapshot columns this stage adds, in order."""
+    names = []
+    for index in BENCHMARKS:
+        names += [f"beta_{index.lower()}", f"corr_{index.lower()}"]
+    return names + [f"rs_{BENCHMARKS[0].lower()}_pct", "rs_percentile"]
+
+# ------------------------
+# Aligned closes
+# ------------------------
+def window_sessions(dates, end=None, bars=CALENDAR_BARS):
+    """The last ``bars`` of ``dates`` on or before ``end`` (all of them when None)."""
+    if end is not None:
+        dates = dates[:int(np.searchsorted(dates, np.datetime64(end, "D"), side="right"))]
+    return np.array(dates[max(len(dates) - bars, 0):])
+
+def session_calendar(end=None, bars=CALENDAR_BARS):
+    """
+    The last ``bars`` sessions of CALENDAR_INDEX up to ``end`` (empty
+    when it is not stored).
+    """
+    if not storage.exists("indices", CALENDAR_INDEX):
+        return np.empty(0, dtype=storage.DATE_DTYPE)
+    arrays = storage.open_columns("indices", CALENDAR_INDEX, columns=[])
+    if arrays is None:
+        df = storage.load_ohlcv("indices", CALENDAR_INDEX, columns=[])
+        dates = df[storage.DATE_COLUMN].to_numpy().astype(storage.DATE_DTYPE)
+    else:
+        dates = arrays[storage.DATE_COLUMN]
+    return window_sessions(dates, end, bars)
+
+def aligned_closes(universe, symbol, calendar, mode=adjustments.DEFAULT_MODE):
+    """Adjusted closes of ``symbol`` on ``calendar`` (NaN where it has no bar)."""
+    out = np.full(len(calendar), np.nan)
+    if len(calendar) == 0:
+        return out
+    arrays = storage.open_columns(universe, symbol, columns=adjustments.HASH_COLUMNS)
+    if arrays is None:
+        if not storage.exists(universe, symbol):
+            return out
+        df = storage.load_ohlcv(universe, symbol, columns=adjustments.HASH_COLUMNS)
+        arrays = {col: df[col].to_numpy() for col in df.columns}
+        arrays[storage.DATE_COLUMN] = arrays[storage.DATE_COLUMN].astype(storage.DATE_DTYPE)
+
+    events = adjustments.update_factors(universe, symbol, arrays)["events"]
+    dates = arrays[storage.DATE_COLUMN]
+    lo = int(np.searchsorted(dates, calendar[0]))
+    dates = np.asarray(dates[lo:])
+    close = np.asarray(arrays["close"][lo:], dtype="f8")
+    price, _ = adjustments.cumulative_factors(events, dates, mode)
+
+    pos = np.searchsorted(calendar, dates)
+    hit = pos < len(calendar)
+    hit[hit] = calendar[pos[hit]] == dates[hit]
+    out[pos[hit]] = close[hit] * price[hit]
+    return out
+
+def log_returns(closes):
+    """(S, T) closes → (S, T - 1) log returns; a missing close drops both neighbours."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.diff(np.log(closes), axis=-1)
+
+# ------------------------
+# Statistics
+# ------------------------
+def _paired_sums(x, y, window):
+    """
+    Rolling sums over ``window`` columns of the pairwise-complete values
+    of x (S, T) and y (T,): n, Σx, Σy, Σxx, Σyy, Σxy, each (S, T - window + 1).
+    """
+    mask = np.isfinite(x) & np.isfinite(y)[None, :]
+    x = np.where(mask, x, 0.0)
+    y = np.where(mask, y[None, :], 0.0)
+    terms = [mask.astype("f8"), x, y, x * x, y * y, x * y]
+    sums = []
+    for term in terms:
+        c = np.cumsum(term, axis=1)
+        c = np.concatenate([np.zeros((len(c), 1)), c], axis=1)
+        sums.append(c[:, window:] - c[:, :-window])
+    return sums
+
+def rolling_beta_corr(returns, bench, window=BETA_WINDOW, min_periods=MIN_SESSIONS):
+    """
+    Rolling beta and correlation of every row of ``returns`` (S, T)
+    against ``bench`` (T,), for each window ending at columns
+    window - 1 … T - 1: two (S, T - window + 1) arrays.
+    """
+    if returns.shape[1] < window:
+        empty = np.full((len(returns), 0), np.nan)
+        return empty, empty
+    n, sx, sy, sxx, syy, sxy = _paired_sums(returns, bench, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        beta = cov / var_y
+        corr = cov / np.sqrt(var_x * var_y)
+    short = n < max(min_periods, 2)
+    beta[short | (var_y <= 0)] = np.nan
+    corr[short | (var_x <= 0) | (var_y <= 0)] = np.nan
+    return beta, np.clip(corr, -1.0, 1.0)
+
+def last_bars(closes):
+    """Column of each row's last close (-1 for a row without any)."""
+    finite = np.isfinite(closes)
+    last = closes.shape[1] - 1 - np.argmax(finite[:, ::-1], axis=1)
+    return np.where(finite.any(axis=1), last, -1)
+
+def _at(values, cols):
+    """values[i, cols[i]] per row, NaN where cols[i] falls outside the row."""
+    values = np.asarray(values, dtype="f8")
+    out = np.full(len(cols), np.nan)
+    ok = (cols >= 0) & (cols < values.shape[-1])
+    if values.ndim == 1:
+        out[ok] = values[cols[ok]]
+    else:
+        out[ok] = values[np.flatnonzero(ok), cols[ok]]
+    return out
+
+def excess_return(closes, bench_closes, window=RS_WINDOW, ends=None):
+    """
+    Return over the ``window`` sessions up to each row's ``ends`` column
+    (default: the last one) in excess of the benchmark's over the same
+    sessions, in percent.
+    """
+    ends = np.full(len(closes), closes.shape[1] - 1) if ends is None else np.asarray(ends)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        own = _at(closes, ends) / _at(closes, ends - window)
+        bench = _at(bench_closes, ends) / _at(bench_closes, ends - window)
+        return (own / bench - 1) * 100
+
+def percentile_rank(values):
+    """Percentile (0-100] of each finite value among the finite values; ties share the average."""
+    return pd.Series(values).rank(pct=True, method="average").to_numpy() * 100
+
+def correlation_matrix(returns, block_size=BLOCK_SIZE, out=None, min_periods=MIN_SESSIONS):
+    """
+    Full (S, S) pairwise-complete correlation of the rows of ``returns``
+    (S, T), computed block by block (each block is a few matrix products
+    over block_size rows), into ``out`` if given (e.g. a memory-mapped
+    .npy) or a new float32 array.
+    """
+    S = len(returns)
+    out = np.empty((S, S), dtype="f4") if out is None else out
+    mask = np.isfinite(returns).astype("f8")
+    x = np.where(mask > 0, returns, 0.0)
+
+    for i in range(0, S, block_size):
+        xi, mi = x[i:i + block_size], mask[i:i + block_size]
+        for j in range(i, S, block_size):
+            xj, mj = x[j:j + block_size], mask[j:j + block_size]
+            n = mi @ mj.T
+            sx, sy = xi @ mj.T, mi @ xj.T
+            sxx, syy = (xi * xi) @ mj.T, mi @ (xj * xj).T
+            sxy = xi @ xj.T
+            with np.errstate(divide="ignore", invalid="ignore"):
+                cov = sxy - sx * sy / n
+                corr = cov / np.sqrt((sxx - sx * sx / n) * (syy - sy * sy / n))
+            corr[n < max(min_periods, 2)] = np.nan
+            corr = np.clip(corr, -1.0, 1.0)
+            out[i:i + block_size, j:j + block_size] = corr
+            if j != i:
+                out[j:j + block_size, i:i + block_size] = corr.T
+    return out
+
+# ------------------------
+# Cache
+# ------------------------
+def read_cache(path=None):
+    path = path or CACHE_PATH
+    if not path.exists():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            cache = {key: data[key] for key in data.files}
+    except (OSError, ValueError):
+        return None
+    if int(cache.get("version", -1)) != CACHE_VERSION or int(cache["bars"]) != CALENDAR_BARS:
+        return None
+    if str(cache["mode"]) != adjustments.DEFAULT_MODE:
+        return None
+    return cache
+
+def write_cache(cache, path=None):
+    path = path or CACHE_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp.npz")
+    np.savez(tmp, **cache)
+    tmp.replace(path)
+
+def _shift(closes, old_calendar, calendar):
+    """Cached (S, T_old) closes moved onto ``calendar`` (NaN for new sessions)."""
+    out = np.full((len(closes), len(calendar)), np.nan)
+    pos = np.searchsorted(calendar, old_calendar)
+    keep = pos < len(calendar)
+    keep[keep] = calendar[pos[keep]] == old_calendar[keep]
+    out[:, pos[keep]] = closes[:, keep]
+    return out
+
+def _appended_only(old_calendar, calendar):
+    """True when ``calendar`` only adds sessions after the cached ones."""
+    if len(old_calendar) == 0:
+        return False
+    inside = calendar[calendar <= old_calendar[-1]]
+    return bool(np.isin(inside, old_calendar).all())
+
+def _last_date(universe, symbol):
+    entry = storage.manifest_entry(universe, symbol)
+    return "" if entry is None else entry["last_date"] or ""
+
+def snapshot_date(universe, symbols):
+    """The newest last bar among ``symbols`` (None when none is recorded)."""
+    dates = [d for d in (_last_date(universe, s) for s in symbols) if d]
+    return max(dates) if dates else None
+
+def update_closes(universes, rebuild=False, cache_path=None):
+    """
+    Aligned closes of every symbol of ``universes`` ({universe: symbols})
+    on each universe's calendar, brought up to date from the cache.
+    Returns {universe: (calendar, symbols, closes)}.
+    """
+    cache = None if rebuild else read_cache(cache_path)
+    matrices, refreshed = {}, 0
+    for universe, symbols in universes.items():
+        symbols = list(symbols)
+        calendar = session_calendar(snapshot_date(universe, symbols))
+        closes = np.full((len(symbols), len(calendar)), np.nan)
+        stale = symbols
+        if (cache is not None and f"{universe}_symbols" in cache
+                and _appended_only(cache[f"{universe}_calendar"], calendar)):
+            old_calendar = cache[f"{universe}_calendar"]
+            cached = [str(s) for s in cache[f"{universe}_symbols"]]
+            shifted = _shift(cache[f"{universe}_closes"], old_calendar, calendar)
+            row = {s: i for i, s in enumerate(cached)}
+            known = [i for i, s in enumerate(symbols) if s in row]
+            closes[known] = shifted[[row[symbols[i]] for i in known]]
+            changed = set(storage.dirty_symbols(CONSUMER, universe, symbols))
+            # Bars past the cached calendar were dropped when it was cached
+            end = str(old_calendar[-1])
+            stale = [
+                s for s in symbols
+                if s in changed or s not in row or _last_date(universe, s) > end
+            ]
+
+        index = {s: i for i, s in enumerate(symbols)}
+        for symbol in stale:
+            closes[index[symbol]] = aligned_closes(universe, symbol, calendar)
+        refreshed += len(stale)
+        matrices[universe] = (calendar, symbols, closes)
+
+    payload = {"version": CACHE_VERSION, "bars": CALENDAR_BARS, "mode": adjustments.DEFAULT_MODE}
+    for universe, (calendar, symbols, closes) in matrices.items():
+        payload[f"{universe}_calendar"] = calendar
+        payload[f"{universe}_symbols"] = np.array(symbols, dtype=str)
+        payload[f"{universe}_closes"] = closes
+    # Universes this call did not touch stay cached (their symbols stay clean)
+    for key in [] if cache is None else cache:
+        if key.endswith("_symbols") and key not in payload:
+            universe = key[: -len("_symbols")]
+            for suffix in ("_calendar", "_symbols", "_closes"):
+                payload[universe + suffix] = cache[universe + suffix]
+    write_cache(payload, cache_path)
+    for universe, (_, symbols, _) in matrices.items():
+        storage.mark_clean(CONSUMER, universe, symbols)
+
+    total = sum(len(symbols) for _, symbols, _ in matrices.values())
+    sessions = ", ".join(
+        f"{universe} to {calendar[-1] if len(calendar) else '-'}"
+        for universe, (calendar, _, _) in matrices.items()
+    )
+    print(f"📐 Relative strength: {refreshed} of {total} series re-read ({sessions})")
+    return matrices
+
+# ------------------------
+# Snapshot columns
+# ------------------------
+def statistics(closes, bench_closes):
+    """
+    {column: (S,) values} for one universe's aligned closes, each row's
+    windows ending at its own last bar.
+    """
+    ends = last_bars(closes)
+    ends[ends < closes.shape[1] - 1 - MAX_LAG] = -1
+    returns = log_returns(closes)
+    out = {}
+    for index in BENCHMARKS:
+        bench = log_returns(bench_closes[index])
+        beta, corr = rolling_beta_corr(returns, bench)
+        # Column c holds the window of returns c … c + BETA_WINDOW - 1,
+        # which ends at close c + BETA_WINDOW
+        out[f"beta_{index.lower()}"] = _at(beta, ends - BETA_WINDOW)
+        out[f"corr_{index.lower()}"] = _at(corr, ends - BETA_WINDOW)
+
+    rs = excess_return(closes, bench_closes[BENCHMARKS[0]], ends=ends)
+    out[f"rs_{BENCHMARKS[0].lower()}_pct"] = rs
+    out["rs_percentile"] = percentile_rank(rs)
+    return out
+
+def compute(universes, rebuild=False):
+    """{universe: DataFrame(symbol + columns())} for ``universes`` ({universe: symbols})."""
+    frames = {}
+    for universe, (calendar, symbols, closes) in update_closes(universes, rebuild).items():
+        bench_closes = {i: aligned_closes("indices", i, calendar) for i in BENCHMARKS}
+        stats = statistics(closes, bench_closes)
+        if universe == "indices":
+            # An index's excess return is measured against NIFTY50 itself:
+            # ranking the indices among each other means nothing
+            stats["rs_percentile"] = np.full(len(symbols), np.nan)
+        frames[universe] = pd.DataFrame({"symbol": symbols, **stats})
+    return frames
+
+def add_columns(snapshots, frames):
+    """Merge the computed columns into the ``<universe>_daily`` snapshots (replacing old ones)."""
+    for universe, stats in frames.items():
+        name = f"{universe}_daily"
+        if name not in snapshots:
+            continue
+        df = snapshots[name].drop(columns=columns(), errors="ignore")
+        merged = df[["symbol"]].merge(stats, on="symbol", how="left")
+        for col in columns():
+            df[col] = merged[col].to_numpy()
+        snapshots[name] = df
+    return snapshots
+
+# ------------------------
+# Verification
+# ------------------------
+def _random_returns(S, T, rng):
+    market = rng.normal(0, 0.01, T)
+    returns = rng.uniform(0.2, 1.8, (S, 1)) * market + rng.normal(0, 0.01, (S, T))
+    returns[rng.random((S, T)) < 0.03] = np.nan
+    returns[: S // 10, : T // 2] = np.nan  # short histories
+    return returns, market
+
+def verify_relative(seed=0):
+    """Matrix statistics must match pandas' rolling / pairwise results."""
+    rng = np.random.default_rng(seed)
+    returns, market = _random_returns(60, 300, rng)
+    market[rng.random(len(market)) < 0.02] = np.nan
+
+    beta, corr = rolling_beta_corr(returns, market, 40, 30)
+    bench = pd.Series(market)
+    for i, row in enumerate(returns):
+        s = pd.Series(row)
+        paired = s.notna() & bench.notna()
+        x, y = s.where(paired), bench.where(paired)
+        cov = x.rolling(40, min_periods=30).cov(y)
+        expected_beta = (cov / y.rolling(40, min_periods=30).var()).to_numpy()[39:]
+        expected_corr = x.rolling(40, min_periods=30).corr(y).to_numpy()[39:]
+        for name, actual, expected in (("beta", beta[i], expected_beta), ("corr", corr[i], expected_corr)):
+            if not np.allclose(actual, expected, rtol=1e-7, atol=1e-9, equal_nan=True):
+                print(f"❌ relative: rolling {name} of row {i} differs from pandas")
+                return False
+
+    matrix = correlation_matrix(returns, block_size=16, min_periods=30)
+    expected = pd.DataFrame(returns.T).corr(min_periods=30).to_numpy()
+    if not np.allclose(matrix, expected, rtol=1e-4, atol=1e-5, equal_nan=True):
+        print("❌ relative: blocked correlation matrix differs from pandas")
+        return False
+
+    closes = np.exp(np.cumsum(np.nan_to_num(returns), axis=1))
+    bench_closes = np.exp(np.cumsum(np.nan_to_num(market)))
+    rs = excess_return(closes, bench_closes, 63)
+    expected_rs = (closes[:, -1] / closes[:, -64]) / (bench_closes[-1] / bench_closes[-64]) * 100 - 100
+    if not np.allclose(rs, expected_rs):
+        print("❌ relative: excess returns differ")
+        return False
+    ranks = percentile_rank(rs)
+    if np.argmax(ranks) != np.argmax(rs) or ranks.max() != 100:
+        print("❌ relative: RS percentiles are not ordered by excess return")
+        return False
+
+    # Indices stored further than the stocks: the stocks' calendar ends at
+    # their snapshot date, and each row's windows end at its own last bar
+    index_dates = np.arange(np.datetime64("2025-01-01"), np.datetime64("2026-09-01"))
+    calendar = window_sessions(index_dates, "2025-12-26", 200)
+    if len(calendar) != 200 or calendar[-1] != np.datetime64("2025-12-26"):
+        print("❌ relative: calendar does not end at the universe's snapshot date")
+        return False
+    T = len(calendar)
+    closes = np.exp(np.cumsum(rng.normal(0, 0.01, (6, T)), axis=1))
+    bench_closes = {i: np.exp(np.cumsum(rng.normal(0, 0.01, T))) for i in BENCHMARKS}
+    lags = np.array([0, 1, 3, MAX_LAG, MAX_LAG + 1, T])
+    for i, lag in enumerate(lags):
+        closes[i, T - lag:] = np.nan
+    stats = statistics(closes, bench_closes)
+    for i, lag in enumerate(lags):
+        e = T - lag
+        if lag > MAX_LAG:
+            expected = {col: np.nan for col in stats if col != "rs_percentile"}
+        else:
+            expected = statistics(closes[i:i + 1, :e], {k: v[:e] for k, v in bench_closes.items()})
+            expected = {col: v[0] for col, v in expected.items() if col != "rs_percentile"}
+        for col, value in expected.items():
+            if not np.allclose(stats[col][i], value, equal_nan=True) or (lag <= MAX_LAG and np.isnan(value)):
+                print(f"❌ relative: {col} of a row {lag} sessions behind is not its own window's")
+                return False
+
+    print("✅ relative: rolling beta / correlation, blocked matrix and RS match pandas; "
+          "lagging rows use their own windows")
+    return True
+
+# ------------------------
+# CLI
+# ------------------------
+def write_matrix(path, block_size=BLOCK_SIZE):
+    """Correlation matrix of the cached stock returns → ``path`` (.npy) + symbols (.json)."""
+    _, symbols, closes = update_closes({"stocks": storage.list_symbols("stocks")})["stocks"]
+    returns = log_returns(closes)[:, -BETA_WINDOW:]
+    out = np.lib.format.open_memmap(path, mode="w+", dtype="f4", shape=(len(symbols), len(symbols)))
+    correlation_matrix(returns, block_size, out)
+    out.flush()
+    with open(path.with_suffix(".json"), "w") as f:
+        json.dump(symbols, f)
+    print(f"✅ {len(symbols)} × {len(symbols)} correlation matrix → {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Beta, correlation and relative strength vs the indices")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the cached closes")
+    parser.add_argument("--top", type=int, default=20, help="strongest stocks to print")
+    parser.add_argument("--matrix", type=Path, help="write the full stock correlation matrix (.npy)")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    parser.add_argument("--verify", action="store_true", help="offline checks against pandas and exit")
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(0 if verify_relative() else 1)
+
+    if args.matrix:
+        write_matrix(args.matrix, args.block_size)
+    else:
+        frames = compute({"stocks": storage.list_symbols("stocks")}, args.rebuild)
+        df = frames["stocks"].sort_values("rs_percentile", ascending=False, na_position="last")
+        print(df.head(args.top).to_string(index=False))
+    storage.flush_manifest()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+# scripts/run_pipeline.py
+#
+# The whole EOD chain in one process:
+#
+#   update → normalize → candles
+#                      → validate
+#                      → snapshots
+#                      → coverage
+#
+# Stages run in dependency order and hand their results on in memory:
+# update / normalize report which symbols they rewrote, and the daily
+# bars are read once (after the last writing stage) and shared by the
+# candle, validation and snapshot stages. Progress is kept in
+# data/pipeline_state.json so an interrupted run can --resume. A stage
+# whose inputs (the store content hashes from data/manifest.json, its
+# outputs, its options) are unchanged since its last successful run is
+# skipped, and within a stage only symbols the manifest marks dirty are
+# touched. Every run leaves precalc/run_report_pipeline.json with each
+# stage's timings, I/O and slowest symbols (see instrument.py).
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+from collections import namedtuple
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+import adjustments
+import build_snapshots
+import build_weekly_monthly_candles
+import fetcher
+import generate_coverage_report
+import generate_indices_coverage_report
+import index_membership
+import instrument
+import normalize_stock_csvs
+import sector_breadth
+import storage
+import trading_calendar
+import update_daily_indices
+import update_daily_stocks
+import validate_ohlcv
+
+STATE_FILE = storage.DATA_DIR / "pipeline_state.json"
+STATE_VERSION = 1
+
+Stage = namedtuple("Stage", ["name", "deps", "run", "inputs"])
+
+# ------------------------
+# Run context
+# ------------------------
+class DailyBars(Mapping):
+    """
+    {symbol: {column: array}} for one universe, each symbol read on first
+    access and then kept for the rest of the run. Arrays are copied out
+    of their memory maps so a whole universe does not hold a file
+    descriptor per column.
+    """
+
+    def __init__(self, universe):
+        self.universe = universe
+        self.symbols = storage.list_symbols(universe)
+        self._bars = {}
+
+    def __getitem__(self, symbol):
+        if symbol not in self._bars:
+            loaded = build_snapshots.load_daily(self.universe, [symbol])
+            if symbol not in loaded:
+                raise KeyError(symbol)
+            self._bars[symbol] = {col: np.array(v) for col, v in loaded[symbol].items()}
+        return self._bars[symbol]
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def __len__(self):
+        return len(self.symbols)
+
+class Context:
+    """What one run's stages share: options, pipeline state and daily bars."""
+
+    def __init__(self, args, state):
+        self.args = args
+        self.state = state
+        self.updated = {}     # universe → symbols rewritten this run
+        self._daily = None
+
+    def wrote(self, universe, symbols):
+        """Record symbols a stage rewrote; drops any bars already loaded."""
+        if symbols:
+            self.updated.setdefault(universe, set()).update(symbols)
+            self._daily = None
+
+    def daily(self):
+        """{universe: DailyBars}: each symbol's daily bars read at most once per run."""
+        if self._daily is None:
+            self._daily = {universe: DailyBars(universe) for universe in storage.UNIVERSES}
+        return self._daily
+
+# ------------------------
+# Fingerprints
+# ------------------------
+def store_hashes(timeframes=("daily",), universes=storage.UNIVERSES):
+    """Manifest content hashes of every stored symbol (survive a fresh checkout)."""
+    hashes = {}
+    for universe in universes:
+        for timeframe in timeframes:
+            for symbol in storage.list_symbols(universe, timeframe):
+                entry = storage.manifest_entry(universe, symbol, timeframe)
+                if entry is not None:
+                    hashes[f"{universe}/{timeframe}/{symbol}"] = entry["hash"]
+    return hashes
+
+def outputs_params(paths):
+    """Fingerprint params naming missing outputs, so deleting one reruns its stage."""
+    return {"missing": sorted(str(path) for path in paths if not path.exists())}
+
+def fingerprint(stage, ctx):
+    hashes, params = stage.inputs(ctx)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([hashes, params], sort_keys=True).encode())
+    return h.hexdigest()
+
+# ------------------------
+# Stages
+# ------------------------
+def run_update(ctx):
+    opts = dict(workers=ctx.args.workers, rate=ctx.args.rate, retries=ctx.args.retries)
+    ctx.wrote("indices", update_daily_indices.update_indices(**opts))
+    ctx.wrote("stocks", update_daily_stocks.update_stocks(
+        batch_size=ctx.args.batch_size, **opts
+    ))
+
+def update_inputs(ctx):
+    # Nothing local says whether the market has new bars: always run.
+    # The planner itself skips symbols that are already current.
+    return {}, {"run": ctx.state["run"]["id"]}
+
+def run_normalize(ctx):
+    # Only CSVs not written by the store itself (per the manifest)
+    ctx.wrote("stocks", normalize_stock_csvs.normalize_stocks(force=ctx.args.force))
+
+def normalize_inputs(ctx):
+    # Checking the CSVs against the manifest is the stage itself: always run
+    return {}, {"run": ctx.state["run"]["id"]}
+
+def run_candles(ctx):
+    for universe, bars in ctx.daily().items():
+        build_weekly_monthly_candles.build_candles(universe, daily=bars, force=ctx.args.force)
+
+def candles_inputs(ctx):
+    return store_hashes(storage.TIMEFRAMES), {}
+
+def run_validate(ctx):
+    for universe, bars in ctx.daily().items():
+        validate_ohlcv.validate_universe(universe, bars=bars)
+
+def validate_inputs(ctx):
+    outputs = [Path(path) for path in validate_ohlcv.REPORTS.values()]
+    return store_hashes(), outputs_params(outputs)
+
+def run_snapshots(ctx):
+    snapshots, failures, built = build_snapshots.build_all(
+        ctx.args.engine, rebuild_state=ctx.args.rebuild_state, daily=ctx.daily(),
+        force=ctx.args.force, adjust=ctx.args.adjust,
+    )
+    build_snapshots.write_snapshots(snapshots)
+    build_snapshots.mark_built(built)
+    if failures:
+        print(f"⚠️ {len(failures)} symbols failed and were left out")
+    print("✅ Snapshot CSVs updated successfully")
+
+def snapshots_inputs(ctx):
+    outputs = [
+        build_snapshots.BOT_SNAPSHOT_DIR / f"{universe}_{timeframe}.csv"
+        for universe in ("indices", "stocks")
+        for timeframe in build_snapshots.TIMEFRAMES
+    ] + [build_snapshots.BOT_SNAPSHOT_DIR / f"{sector_breadth.SNAPSHOT_NAME}.csv"] + [
+        sector_breadth.composite_path(sector_breadth.UNIVERSE_SECTOR, method)
+        for method in sector_breadth.METHODS
+    ]
+    params = {"engine": ctx.args.engine, "adjust": ctx.args.adjust}
+    # A sector reassignment or an index change alters the rows too
+    for name, path in (("sectors", sector_breadth.CONFIG_PATH),
+                       ("membership", index_membership.HISTORY_PATH)):
+        if path.exists():
+            params[name] = hashlib.blake2b(path.read_bytes(), digest_size=16).hexdigest()
+    return store_hashes(), {**params, **outputs_params(outputs)}
+
+def run_coverage(ctx):
+    # Row counts and date ranges come straight from the manifest; gaps and
+    # staleness are counted against the exchange calendar
+    generate_coverage_report.coverage_report()
+    generate_indices_coverage_report.coverage_report()
+
+def coverage_inputs(ctx):
+    outputs = [
+        Path(generate_coverage_report.OUT_FILE),
+        Path(generate_indices_coverage_report.OUT_FILE),
+    ]
+    # Staleness moves on with every completed session, even without new bars
+    params = {"session": str(trading_calendar.last_session()), **outputs_params(outputs)}
+    return store_hashes(), params
+
+STAGES = [
+    Stage("update", [], run_update, update_inputs),
+    Stage("normalize", ["update"], run_normalize, normalize_inputs),
+    Stage("candles", ["normalize"], run_candles, candles_inputs),
+    Stage("validate", ["normalize"], run_validate, validate_inputs),
+    Stage("snapshots", ["normalize"], run_snapshots, snapshots_inputs),
+    Stage("coverage", ["normalize"], run_coverage, coverage_inputs),
+]
+STAGE_NAMES = [stage.name for stage in STAGES]
+
+def downstream(name):
+    """``name`` and every stage that depends on it, in run order."""
+    selected = {name}
+    for stage in STAGES:
+        if any(dep in selected for dep in stage.deps):
+            selected.add(stage.name)
+    return [stage for stage in STAGES if stage.name in selected]
+
+def select_stages(only=None, start=None):
+    if only:
+        return [stage for stage in STAGES if stage.name in only]
+    if start:
+        return downstream(start)
+    return list(STAGES)
+
+# ------------------------
+# Pipeline state
+# ------------------------
+def read_state():
+    try:
+        with open(STATE_FILE, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("version") != STATE_VERSION:
+        return None
+    return state
+
+def write_state(state):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    storage._write_atomic(STATE_FILE, json.dumps(state, indent=2), mode="w")
+
+def new_run(state, stages):
+    state = state or {"version": STATE_VERSION, "fingerprints": {}}
+    state["run"] = {
+        "id": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "selected": [stage.name for stage in stages],
+        "finished": False,
+        "stages": {},
+    }
+    return state
+
+# ------------------------
+# Runner
+# ------------------------
+def run_pipeline(args):
+    with instrument.run("pipeline", args.profile, build_snapshots.BOT_SNAPSHOT_DIR):
+        return _run_stages(args)
+
+def _run_stages(args):
+    state = read_state()
+    resuming = args.resume and state is not None and not state["run"]["finished"]
+    if resuming:
+        # Unless told otherwise, pick up the interrupted run's selection
+        stages = select_stages(args.only or state["run"]["selected"], args.start)
+        print(f"⏯️ Resuming run {state['run']['id']}")
+    else:
+        stages = select_stages(args.only, args.start)
+        state = new_run(state, stages)
+
+    ctx = Context(args, state)
+    done = state["run"]["stages"]
+
+    for stage in stages:
+        if resuming and done.get(stage.name, {}).get("status") in ("done", "skipped"):
+            print(f"⏭️ {stage.name}: already done in this run")
+            instrument.skip(stage.name, "done earlier in this run")
+            continue
+
+        before = fingerprint(stage, ctx)
+        if not args.force and state["fingerprints"].get(stage.name) == before:
+            print(f"⏭️ {stage.name}: inputs unchanged")
+            instrument.skip(stage.name, "inputs unchanged")
+            done[stage.name] = {"status": "skipped"}
+            write_state(state)
+            continue
+
+        print(f"\n▶️ {stage.name}")
+        storage.set_stage(stage.name)
+        started = time.perf_counter()
+        try:
+            with instrument.stage(stage.name):
+                stage.run(ctx)
+        except Exception as e:
+            done[stage.name] = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+            storage.flush_manifest()
+            write_state(state)
+            print(f"❌ {stage.name} failed: {type(e).__name__}: {e}")
+            print("   rerun with --resume to continue from this stage")
+            return False
+
+        seconds = round(time.perf_counter() - started, 3)
+        done[stage.name] = {"status": "done", "seconds": seconds}
+        # Fingerprint what the stage left behind: the next run skips it
+        # while nothing has touched its inputs or outputs since
+        state["fingerprints"][stage.name] = fingerprint(stage, ctx)
+        storage.flush_manifest()
+        write_state(state)
+        print(f"✅ {stage.name} ({seconds:.1f}s)")
+
+    state["run"]["finished"] = True
+    write_state(state)
+    print("\n🎯 Pipeline complete")
+    return True
+
+def main():
+    parser = instrument.add_arguments(
+        fetcher.add_arguments(argparse.ArgumentParser(description="Run the EOD pipeline"))
+    )
+    parser.add_argument(
+        "--only", type=lambda s: s.split(","),
+        help=f"comma-separated stages to run ({', '.join(STAGE_NAMES)})"
+    )
+    parser.add_argument(
+        "--from", dest="start", choices=STAGE_NAMES,
+        help="run this stage and everything downstream of it"
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="continue the last unfinished run, skipping stages it completed"
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="run selected stages even if their inputs are unchanged"
+    )
+    parser.add_argument("--engine", choices=build_snapshots.ENGINES, default="state")
+    parser.add_argument(
+        "--adjust", choices=adjustments.MODES, default=adjustments.DEFAULT_MODE,
+        help="corporate-action adjustment of the bars snapshot indicators see"
+    )
+    parser.add_argument(
+        "--rebuild-state", action="store_true",
+        help="recompute indicator state from the first bar"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=update_daily_stocks.BATCH_SIZE,
+        help="tickers per yf.download call"
+    )
+    args = parser.parse_args()
+
+    unknown = set(args.only or ()) - set(STAGE_NAMES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    sys.exit(0 if run_pipeline(args) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+# scripts/screener.py
+#
+# Declarative screens over the snapshot columns:
+#
+#   python scripts/screener.py "rsi14 < 30 & trend == Bullish & confidence_score > 70 & sector == Power"
+#   python scripts/screener.py "bb_position < 0.1 & ~volatility_flag" --sort rsi14 --asc --limit 20
+#   python scripts/screener.py "trend == Bullish" --as-of 2024-03-28          # backfilled day
+#   python scripts/screener.py "rsi14 < 25" --start 2024-01-01 --end 2024-03-31
+#
+# A condition is ``column op value`` (op: < <= > >= == !=), ``column in
+# (a, b, ...)`` or a bare boolean column; conditions combine with & | ~
+# and parentheses. Values are numbers, ISO dates, True / False, bare
+# words or quoted strings ("Capital Goods"). Rows with a missing value
+# never match a condition on that column.
+#
+# Each snapshot is loaded once into a column table (float arrays, bool
+# arrays, and integer codes for text columns, so text equality is an
+# integer compare), with sorted indexes prebuilt for RANKED columns.
+# Expressions are parsed once and cached; a screen is then a handful of
+# vectorized comparisons plus one pass over a sorted index.
+#
+# Historical screens (--as-of, --start/--end) run over the daily
+# partitions written by backfill_snapshots.py.
+
+import argparse
+import re
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import backfill_snapshots
+from build_snapshots import BOT_SNAPSHOT_DIR, TIMEFRAMES, read_snapshot
+from snapshot_service import CONFIG_PATH, SNAPSHOT_UNIVERSES, load_sectors
+
+RANKED = ("confidence_score", "rsi14", "vwap_dist_pct", "bb_position", "rs_percentile")
+DEFAULT_COLUMNS = ["symbol", "sector", "close", "trend", "rsi14", "confidence_score"]
+
+# ------------------------
+# Expressions
+# ------------------------
+TOKEN = re.compile(r"""\s*(?:
+    (?P<op><=|>=|==|!=|<|>|=)
+  | (?P<punct>[&|~(),])
+  | (?P<string>"[^"]*"|'[^']*')
+  | (?P<date>\d{4}-\d{2}-\d{2})(?![\w.])
+  | (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(?![\w.])
+  | (?P<name>[A-Za-z_][\w.\-]*)
+)""", re.VERBOSE)
+
+def tokenize(text):
+    tokens, pos = [], 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = TOKEN.match(text, pos)
+        if m is None or m.end() == pos:
+            raise ValueError(f"cannot parse screen at {text[pos:pos + 20]!r}")
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == "string":
+            value = value[1:-1]
+        elif kind == "number":
+            value = float(value)
+        elif kind == "date":
+            value = np.datetime64(value, "D")
+        elif kind == "op" and value == "=":
+            value = "=="
+        tokens.append((kind, value))
+        pos = m.end()
+    return tokens
+
+class _Parser:
+    """
+    expr   := term ('|' term)*
+    term   := factor ('&' factor)*
+    factor := '~' factor | '(' expr ')' | name [op value | 'in' '(' values ')']
+    """
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.i = 0
+
+    def peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if token[0] is None:
+            raise ValueError("screen ends too early")
+        if (kind and token[0] != kind) or (value and token[1] != value):
+            raise ValueError(f"expected {value or kind}, got {token[1]!r}")
+        self.i += 1
+        return token
+
+    def parse(self):
+        node = self.expr()
+        if self.i != len(self.tokens):
+            raise ValueError(f"unexpected {self.peek()[1]!r}")
+        return node
+
+    def expr(self):
+        node = self.term()
+        while self.peek() == ("punct", "|"):
+            self.take()
+            node = ("or", node, self.term())
+        return node
+
+    def term(self):
+        node = self.factor()
+        while self.peek() == ("punct", "&"):
+            self.take()
+            node = ("and", node, self.factor())
+        return node
+
+    def factor(self):
+        kind, value = self.peek()
+        if (kind, value) == ("punct", "~"):
+            self.take()
+            return ("not", self.factor())
+        if (kind, value) == ("punct", "("):
+            self.take()
+            node = self.expr()
+            self.take("punct", ")")
+            return node
+
+        column = self.take("name")[1]
+        kind, value = self.peek()
+        if kind == "op":
+            self.take()
+            return ("cmp", column, value, self.value())
+        if (kind, value) == ("name", "in"):
+            self.take()
+            self.take("punct", "(")
+            values = [self.value()]
+            while self.peek() == ("punct", ","):
+                self.take()
+                values.append(self.value())
+            self.take("punct", ")")
+            return ("in", column, tuple(values))
+        return ("flag", column)
+
+    def value(self):
+        kind, value = self.take()
+        if kind not in ("string", "number", "date", "name"):
+            raise ValueError(f"expected a value, got {value!r}")
+        if kind == "name" and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        return value
+
+@lru_cache(maxsize=256)
+def parse(text):
+    """Screen expression → tuple tree (cached: screens repeat)."""
+    return _Parser(text).parse()
+
+def columns_of(node):
+    if node[0] in ("and", "or"):
+        return columns_of(node[1]) | columns_of(node[2])
+    if node[0] == "not":
+        return columns_of(node[1])
+    return {node[1]}
+
+# ------------------------
+# Column table
+# ------------------------
+_COMPARE = {
+    "<": np.less, "<=": np.less_equal, ">": np.greater,
+    ">=": np.greater_equal, "==": np.equal, "!=": np.not_equal,
+}
+
+class ScreenTable:
+    """
+    One snapshot as screenable columns: ``numbers`` (float64, NaN =
+    missing), ``flags`` (bool), ``dates`` (datetime64[D], NaT = missing)
+    and ``codes`` / ``labels`` for text (int32 codes, -1 = missing).
+    """
+
+    def __init__(self, df, sectors=None):
+        df = df.reset_index(drop=True)
+        if sectors is not None and "sector" not in df and "symbol" in df:
+            df = df.assign(sector=df["symbol"].map(sectors))
+        self.frame = df
+        self.size = len(df)
+        # Plain arrays: slicing these is much cheaper than frame.iloc
+        self.arrays = {col: df[col].to_numpy() for col in df.columns}
+        self.symbols = df["symbol"].astype(object).to_numpy() if "symbol" in df else None
+
+        self.numbers, self.flags, self.dates, self.codes, self.labels = {}, {}, {}, {}, {}
+        for col in df.columns:
+            s = df[col]
+            if pd.api.types.is_bool_dtype(s):
+                self.flags[col] = s.to_numpy(bool)
+            elif pd.api.types.is_numeric_dtype(s):
+                self.numbers[col] = s.to_numpy("f8", na_value=np.nan)
+            elif pd.api.types.is_datetime64_any_dtype(s):
+                self.dates[col] = s.to_numpy("datetime64[D]")
+            else:
+                codes, labels = pd.factorize(s, use_na_sentinel=True)
+                self.codes[col] = codes.astype(np.int32)
+                self.labels[col] = {label: i for i, label in enumerate(labels)}
+
+        self._orders = {}
+        for col in RANKED:
+            if col in self.numbers:
+                self.order(col, descending=True)
+                self.order(col, descending=False)
+
+    @property
+    def columns(self):
+        return list(self.frame.columns)
+
+    # --- indexes ---
+    def order(self, column, descending=True):
+        """Row positions sorted by ``column``; missing values last, ties in file order."""
+        key = (column, descending)
+        order = self._orders.get(key)
+        if order is None:
+            if column not in self.numbers:
+                raise ValueError(f"cannot rank by {column!r}: not a numeric column")
+            values = self.numbers[column]
+            ranked = -values if descending else values
+            order = np.lexsort((np.arange(self.size), np.nan_to_num(ranked, nan=np.inf)))
+            order = order[np.argsort(np.isnan(values[order]), kind="stable")]
+            self._orders[key] = order
+        return order
+
+    # --- masks ---
+    def _condition(self, node):
+        kind, column = node[0], node[1]
+        if kind == "flag":
+            if column not in self.flags:
+                raise ValueError(f"{column!r} is not a True/False column")
+            return self.flags[column]
+        if kind == "in":
+            masks = [self._condition(("cmp", column, "==", v)) for v in node[2]]
+            return np.logical_or.reduce(masks)
+
+        op, value = node[2], node[3]
+        if column in self.numbers:
+            if isinstance(value, (str, np.datetime64)):
+                raise ValueError(f"{column!r} is numeric, cannot compare with {value!r}")
+            values = self.numbers[column]
+            with np.errstate(invalid="ignore"):
+                mask = _COMPARE[op](values, float(value))
+            return mask & ~np.isnan(values) if op == "!=" else mask
+        if column in self.flags:
+            if not isinstance(value, bool) or op not in ("==", "!="):
+                raise ValueError(f"{column!r} is True/False: use == / != True or False")
+            return self.flags[column] == value if op == "==" else self.flags[column] != value
+        if column in self.dates:
+            values = self.dates[column]
+            mask = _COMPARE[op](values, np.datetime64(str(value), "D"))
+            return mask & ~np.isnat(values) if op == "!=" else mask
+        if column in self.codes:
+            if op not in ("==", "!="):
+                raise ValueError(f"{column!r} is text: only == / != / in apply")
+            codes = self.codes[column]
+            code = self.labels[column].get(
+                value if isinstance(value, str) else str(value).removesuffix(".0"), -2
+            )
+            return codes == code if op == "==" else (codes != code) & (codes >= 0)
+        raise ValueError(f"unknown column {column!r}")
+
+    def mask(self, node):
+        """Boolean row mask of a parsed expression (or expression text)."""
+        if isinstance(node, str):
+            node = parse(node)
+        kind = node[0]
+        if kind == "and":
+            return self.mask(node[1]) & self.mask(node[2])
+        if kind == "or":
+            return self.mask(node[1]) | self.mask(node[2])
+        if kind == "not":
+            return ~self.mask(node[1])
+        return self._condition(node)
+
+    def select(self, expr=None, sort=None, descending=True, limit=None):
+        """Positions of matching rows, ranked by ``sort`` (file order without)."""
+        mask = None if not expr else self.mask(expr)
+        if sort is not None:
+            order = self.order(sort, descending)
+            positions = order if mask is None else order[mask[order]]
+        else:
+            positions = np.arange(self.size) if mask is None else np.flatnonzero(mask)
+        return positions if limit is None else positions[:limit]
+
+    def rows(self, positions, columns=None):
+        columns = [c for c in columns if c in self.arrays] if columns else self.columns
+        return pd.DataFrame({col: self.arrays[col][positions] for col in columns}, copy=False)
+
+# ------------------------
+# Sources
+# ------------------------
+def _stamp(path):
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+def read_partition(path):
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_csv(path, float_precision="round_trip", parse_dates=["date"])
+
+def partitions(out_dir, universe, start=None, end=None):
+    """[(date, path)] of backfilled days between ``start`` and ``end``, by date."""
+    root = Path(out_dir) / universe
+    if not root.exists():
+        return []
+    start = None if start is None else np.datetime64(start, "D")
+    end = None if end is None else np.datetime64(end, "D")
+    found = {}
+    for year in sorted(p for p in root.iterdir() if p.is_dir() and p.name.isdigit()):
+        if (start is not None and int(year.name) < start.astype(object).year) or (
+            end is not None and int(year.name) > end.astype(object).year
+        ):
+            continue
+        for fmt in backfill_snapshots.FORMATS:
+            for path in year.glob(f"*.{fmt}"):
+                day = np.datetime64(path.stem, "D")
+                if (start is None or day >= start) and (end is None or day <= end):
+                    found.setdefault(day, path)
+    return sorted(found.items())
+
+class Screener:
+    """
+    Screens over the current snapshots (precalc/) and the backfilled
+    daily history. Tables are reloaded when their file changes.
+    """
+
+    def __init__(self, snapshot_dir=None, backfill_dir=None):
+        self.snapshot_dir = snapshot_dir or BOT_SNAPSHOT_DIR
+        self.backfill_dir = backfill_dir or backfill_snapshots.OUT_DIR
+        self._tables = {}
+        self._sectors = None
+
+    def sectors(self):
+        if self._sectors is None:
+            self._sectors = load_sectors() if CONFIG_PATH.exists() else {}
+        return self._sectors
+
+    def _load(self, path, read):
+        stamp = _stamp(path)
+        cached = self._tables.get(path)
+        if cached is None or cached[0] != stamp:
+            df = read(path)
+            if df is None:
+                raise LookupError(f"{path} unreadable")
+            cached = self._tables[path] = (stamp, ScreenTable(df, self.sectors()))
+        return cached[1]
+
+    def table(self, universe="stocks", timeframe="daily", as_of=None):
+        """The current snapshot, or the latest backfilled day on or before ``as_of``."""
+        if universe not in SNAPSHOT_UNIVERSES or timeframe not in TIMEFRAMES:
+            raise ValueError(f"no snapshot for {universe}/{timeframe}")
+        if as_of is None:
+            path = self.snapshot_dir / f"{universe}_{timeframe}.csv"
+            if not path.exists():
+                raise LookupError(f"snapshot {path.name} not built yet")
+            return self._load(path, lambda p: read_snapshot(p.stem, p.parent))
+
+        if timeframe != "daily":
+            raise ValueError("historical screens cover the daily snapshots only")
+        days = partitions(self.backfill_dir, universe, end=as_of)
+        if not days:
+            raise LookupError(f"no backfilled {universe} snapshot on or before {as_of}")
+        return self._load(days[-1][1], read_partition)
+
+    def screen(self, expr, universe="stocks", timeframe="daily", as_of=None,
+               sort=None, descending=True, limit=None, columns=None):
+        """Matching snapshot rows as a frame, ranked by ``sort``."""
+        table = self.table(universe, timeframe, as_of)
+        return table.rows(table.select(expr, sort, descending, limit), columns)
+
+    def history(self, expr, start=None, end=None, universe="stocks"):
+        """{date: [matching symbols]} for every backfilled day in the range."""
+        node = parse(expr)
+        out = {}
+        for day, path in partitions(self.backfill_dir, universe, start, end):
+            table = ScreenTable(read_partition(path), self.sectors())
+            out[str(day)] = table.symbols[table.mask(node)].tolist()
+        return out
+
+# ------------------------
+# Verification
+# ------------------------
+def _row_matches(node, row):
+    """Reference evaluation of one row, for --verify."""
+    kind = node[0]
+    if kind == "and":
+        return _row_matches(node[1], row) and _row_matches(node[2], row)
+    if kind == "or":
+        return _row_matches(node[1], row) or _row_matches(node[2], row)
+    if kind == "not":
+        return not _row_matches(node[1], row)
+    value = row[node[1]]
+    if kind == "flag":
+        return bool(value)
+    if kind == "in":
+        return any(_row_matches(("cmp", node[1], "==", v), row) for v in node[2])
+    if value is None or pd.isna(value):
+        return False
+    target = node[3]
+    if isinstance(value, str) and not isinstance(target, str):
+        target = str(target).removesuffix(".0")
+    return {
+        "<": value < target, "<=": value <= target, ">": value > target,
+        ">=": value >= target, "==": value == target, "!=": value != target,
+    }[node[2]]
+
+def random_expression(rng, depth=0):
+    if depth < 2 and rng.random() < 0.5:
+        op = rng.choice(["&", "|"])
+        left, right = random_expression(rng, depth + 1), random_expression(rng, depth + 1)
+        text = f"({left} {op} {right})"
+        return f"~{text}" if rng.random() < 0.2 else text
+    pick = rng.integers(5)
+    if pick == 0:
+        return f"rsi14 {rng.choice(list(_COMPARE))} {rng.uniform(0, 100):.2f}"
+    if pick == 1:
+        return f"confidence_score {rng.choice(['>', '>=', '<', '=='])} {rng.integers(0, 101)}"
+    if pick == 2:
+        return f"trend {rng.choice(['==', '!='])} {rng.choice(['Bullish', 'Bearish', 'Sideways'])}"
+    if pick == 3:
+        return f'sector in ("Capital Goods", Power, {rng.choice(["Banks", "IT"])})'
+    return "volatility_flag" if rng.random() < 0.5 else "volatility_flag == False"
+
+def verify_screener(rounds=300, size=500, seed=0):
+    """Vectorized masks and rankings must match a row-by-row evaluation."""
+    from publish_snapshots import random_snapshot
+
+    rng = np.random.default_rng(seed)
+    df = random_snapshot(size, "daily", rng)
+    df.loc[rng.random(size) < 0.05, "rsi14"] = np.nan
+    df["trend"] = df["trend"].where(rng.random(size) > 0.05)
+    sectors = np.array(["Capital Goods", "Power", "Banks", "IT", "FMCG"])
+    df["sector"] = rng.choice(sectors, size)
+    table = ScreenTable(df)
+    records = df.astype(object).where(df.notna(), None).to_dict("records")
+
+    for i in range(rounds):
+        text = random_expression(rng)
+        expected = [j for j, row in enumerate(records) if _row_matches(parse(text), row)]
+        if table.select(text).tolist() != expected:
+            print(f"❌ screener: {text!r} selected different rows")
+            return False
+
+        column = str(rng.choice(RANKED[:2]))
+        descending = bool(rng.random() < 0.5)
+        ranked = df.iloc[expected].sort_values(
+            column, ascending=not descending, kind="stable", na_position="last"
+        ).index.tolist()
+        if table.select(text, column, descending).tolist() != ranked:
+            print(f"❌ screener: {text!r} ranked by {column} in a different order")
+            return False
+
+    print(f"✅ screener: masks and rankings match row-by-row evaluation ({rounds} screens)")
+    return True
+
+def time_screen(table, expr, sort, descending, limit, repeat=2000):
+    """Median seconds per screen over ``repeat`` runs."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        table.select(expr, sort, descending, limit)
+        runs.append(time.perf_counter() - start)
+    return float(np.median(runs))
+
+# ------------------------
+# CLI
+# ------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Screen the snapshot universe")
+    parser.add_argument("expr", nargs="?", help='e.g. "rsi14 < 30 & trend == Bullish"')
+    parser.add_argument("--universe", choices=SNAPSHOT_UNIVERSES, default="stocks")
+    parser.add_argument("--timeframe", choices=TIMEFRAMES, default="daily")
+    parser.add_argument("--sort", help=f"rank by this column (indexed: {', '.join(RANKED)})")
+    parser.add_argument("--asc", action="store_true", help="rank ascending (default: highest first)")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--columns", type=lambda s: s.split(","),
+                        help="comma-separated output columns (default: a short summary)")
+    parser.add_argument("--as-of", help="screen the backfilled daily snapshot of this date")
+    parser.add_argument("--start", help="screen every backfilled day from this date")
+    parser.add_argument("--end", help="... to this date")
+    parser.add_argument("--bench", action="store_true", help="print the median screen time")
+    parser.add_argument("--verify", action="store_true",
+                        help="check masks and rankings against a row-by-row evaluation and exit")
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(0 if verify_screener() else 1)
+    if not args.expr:
+        parser.error("a screen expression is required")
+
+    screener = Screener()
+    try:
+        node = parse(args.expr)
+        if args.start or args.end:
+            for day, symbols in screener.history(args.expr, args.start, args.end, args.universe).items():
+                print(f"{day}: {len(symbols)} {' '.join(symbols)}")
+            return
+
+        table = screener.table(args.universe, args.timeframe, args.as_of)
+        positions = table.select(args.expr, args.sort, not args.asc, args.limit)
+        columns = args.columns or DEFAULT_COLUMNS + [
+            c for c in sorted(columns_of(node)) if c not in DEFAULT_COLUMNS
+        ]
+        if args.sort and args.sort not in columns:
+            columns.append(args.sort)
+        rows = table.rows(positions, columns)
+    except (ValueError, LookupError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(rows.to_string(index=False) if len(rows) else "No matches")
+    print(f"🔎 {len(positions)} of {table.size} {args.universe} match")
+    if args.bench:
+        seconds = time_screen(table, args.expr, args.sort, not args.asc, args.limit)
+        print(f"⏱️ {seconds * 1e6:.0f} µs per screen (median)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,648 @@
+# scripts/sector_breadth.py
+#
+# Sector aggregates of the stock universe, from the sector each symbol
+# has in config/stocks_nifty500.json:
+#
+#   precalc/sectors_daily.csv            one row per sector, plus ALL for
+#                                        the whole universe: breadth of
+#                                        the latest session
+#   data/sectors/<method>/<SECTOR>.csv   composite OHLC series per sector
+#                                        (and ALL), for each of METHODS
+#
+# Breadth is one group-by over the daily snapshot rows of the latest
+# session: each statistic is a bincount (the medians one sort) over the
+# sector codes, so a consumer reads ~20 rows instead of 500.
+#
+# A composite bar is the members' average move from their last traded
+# close (open / high / low / close ÷ that close, split-adjusted) chained
+# onto the composite's previous close: "equal" weights every member
+# alike, "volume" weights them by the traded value of the bar each move
+# starts from (close × volume, so share counts of cheap and expensive
+# stocks are comparable, and known before the move), capped at
+# WEIGHT_CAP × the session's median member value. A member bar without
+# volume, or one that still moves by a split-sized ratio after
+# adjustment (validate_ohlcv.JUMP_RATIO either way: a bad print or an
+# unrecorded split or bonus), is left out of its session. Membership is
+# the config at the time of the run, so a sector change applies from the
+# next bar on, like a reconstitution.
+# A run recomputes only the last REVISE_SESSIONS composite bars (those
+# rows are replaced) and appends the sessions after them, reading just
+# the members' bars since, so a member whose bar for a session lands a
+# run or a few late (a failed fetch, a stock updated a day behind) is
+# still counted in it. Bars later than that, or a revised history, need
+# --rebuild, which recomputes every series from the first bar, as does
+# a change of COMPOSITE_VERSION.
+#
+#   python scripts/sector_breadth.py              # from precalc/stocks_daily.csv + the store
+#   python scripts/sector_breadth.py --rebuild
+#   python scripts/sector_breadth.py --verify     # offline checks
+
+import argparse
+import json
+import re
+import sys
+import tempfile
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import adjustments
+import storage
+import validate_ohlcv
+
+CONFIG_PATH = storage.BASE_DIR / "config" / "stocks_nifty500.json"
+SECTORS_DIR = storage.DATA_DIR / "sectors"
+SNAPSHOT_NAME = "sectors_daily"
+
+UNIVERSE_SECTOR = "ALL"
+METHODS = ("equal", "volume")
+BASE_LEVEL = 1000.0
+REVISE_SESSIONS = 5     # trailing composite bars recomputed on every run
+WEIGHT_CAP = 10.0       # max member weight, in medians of the session's traded values
+MAX_SESSION_MOVE = 0.2  # --verify: composite close-to-close moves stay within ±20 %
+COMPOSITE_VERSION = 2   # bump to rebuild the composites with the next run
+VERSION_FILE = "version.json"
+COMPOSITE_COLUMNS = ["date", "open", "high", "low", "close", "volume", "members"]
+BAR_COLUMNS = ["open", "high", "low", "close", "volume"]
+TRENDS = ("Bullish", "Bearish", "Sideways")
+
+def load_sectors(path=CONFIG_PATH):
+    """{file symbol: sector} from the NIFTY 500 config."""
+    with open(path, "r") as f:
+        config = json.load(f)
+    return {
+        sym.replace(".", "_"): entry.get("sector")
+        for sym, entry in config.items() if entry.get("sector")
+    }
+
+def slug(sector):
+    return re.sub(r"[^A-Za-z0-9]+", "_", sector).strip("_")
+
+def composite_path(sector, method, root=None):
+    return (root or SECTORS_DIR) / method / f"{slug(sector)}.csv"
+
+def sector_names(sectors):
+    """Sorted sector names, then UNIVERSE_SECTOR."""
+    return sorted(set(sectors.values())) + [UNIVERSE_SECTOR]
+
+def _groups(symbols, sectors, names):
+    """
+    (rows, codes): every row index once with its sector's code and once
+    with UNIVERSE_SECTOR's, so one bincount fills both.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    codes = np.array([index.get(sectors.get(s), -1) for s in symbols], dtype=np.int64)
+    rows = np.arange(len(symbols))
+    known = codes >= 0
+    return (
+        np.concatenate([rows[known], rows]),
+        np.concatenate([codes[known], np.full(len(symbols), len(names) - 1)]),
+    )
+
+# ------------------------
+# Group reductions
+# ------------------------
+def group_count(codes, mask, n):
+    return np.bincount(codes[mask], minlength=n)
+
+def group_mean(codes, values, n):
+    ok = np.isfinite(values)
+    counts = np.bincount(codes[ok], minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.bincount(codes[ok], weights=values[ok], minlength=n) / counts
+
+def group_median(codes, values, n):
+    ok = np.isfinite(values)
+    codes, values = codes[ok], values[ok]
+    order = np.lexsort((values, codes))
+    values = values[order]
+    counts = np.bincount(codes, minlength=n)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    out = np.full(n, np.nan)
+    has = counts > 0
+    lo = starts + (counts - 1) // 2
+    hi = starts + counts // 2
+    out[has] = (values[lo[has]] + values[hi[has]]) / 2
+    return out
+
+# ------------------------
+# Breadth
+# ------------------------
+def _numbers(df, col):
+    if col not in df:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[col], errors="coerce").to_numpy("f8")
+
+def breadth_frame(daily, changes, sectors, composites=None):
+    """
+    One row per sector (and UNIVERSE_SECTOR) from the stocks' daily
+    snapshot ``daily``, counting only rows of its latest date.
+    ``changes`` is {symbol: fractional close-to-close change of that
+    bar}; ``composites`` {(sector, method): (close, change_pct)}.
+    """
+    names = sector_names(sectors)
+    n = len(names)
+    symbols = daily["symbol"].astype(str).to_numpy()
+    rows, codes = _groups(symbols, sectors, names)
+
+    dates = pd.to_datetime(daily["date"])
+    latest = dates.max()
+    current = (dates == latest).to_numpy()[rows]
+
+    close = _numbers(daily, "close")[rows]
+    change = np.array([changes.get(s, np.nan) for s in symbols], dtype="f8")[rows]
+    change[~current] = np.nan
+
+    members = np.bincount(
+        [names.index(s) for s in sectors.values()] + [n - 1] * len(sectors), minlength=n
+    )
+    out = {
+        "date": [latest] * n,
+        "sector": names,
+        "members": members,
+        "reporting": group_count(codes, current, n),
+    }
+    for window in (50, 200):
+        sma = _numbers(daily, f"sma{window}")[rows]
+        valid = current & np.isfinite(sma) & np.isfinite(close)
+        above = group_count(codes, valid & (close > sma), n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[f"above_sma{window}_pct"] = above / group_count(codes, valid, n) * 100
+
+    advances = group_count(codes, change > 0, n)
+    declines = group_count(codes, change < 0, n)
+    out["advances"] = advances
+    out["declines"] = declines
+    out["unchanged"] = group_count(codes, change == 0, n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out["ad_ratio"] = np.where(declines > 0, advances / np.maximum(declines, 1), np.nan)
+
+    rsi = _numbers(daily, "rsi14")[rows]
+    out["avg_rsi14"] = group_mean(codes, np.where(current, rsi, np.nan), n)
+
+    trend = daily["trend"].astype(object).to_numpy()[rows] if "trend" in daily else np.full(len(rows), None)
+    for label in TRENDS:
+        out[label.lower()] = group_count(codes, current & (trend == label), n)
+
+    confidence = _numbers(daily, "confidence_score")[rows]
+    out["median_confidence"] = group_median(codes, np.where(current, confidence, np.nan), n)
+
+    composites = composites or {}
+    for method in METHODS:
+        values = [composites.get((name, method), (np.nan, np.nan)) for name in names]
+        out[f"{method}_close"] = [v[0] for v in values]
+        out[f"{method}_change_pct"] = [v[1] for v in values]
+    return pd.DataFrame(out)
+
+# ------------------------
+# Composites
+# ------------------------
+def member_bars(symbol, after=None, mode=adjustments.DEFAULT_MODE):
+    """
+    Bars of ``symbol`` after ``after`` (all when None) as ratios to the
+    previous close, plus the last bar's close-to-close change (see
+    bar_ratios).
+    """
+    arrays = storage.open_columns("stocks", symbol, columns=BAR_COLUMNS + adjustments.HASH_COLUMNS)
+    if arrays is None:
+        df = storage.load_ohlcv("stocks", symbol, columns=BAR_COLUMNS + adjustments.HASH_COLUMNS)
+        arrays = {col: df[col].to_numpy() for col in df.columns}
+        arrays[storage.DATE_COLUMN] = arrays[storage.DATE_COLUMN].astype(storage.DATE_DTYPE)
+    events = adjustments.update_factors("stocks", symbol, arrays)["events"]
+    return bar_ratios(arrays, events, after, mode)
+
+def bar_ratios(arrays, events, after=None, mode=adjustments.DEFAULT_MODE):
+    """
+    ({date, open, high, low, close (ratios), value, volume}, change):
+    the bars after ``after`` as ratios of their adjusted prices to the
+    adjusted close of the last traded bar before them (whatever the gap
+    to it), and the last bar's close-to-close change. A bar without
+    volume (stale or mis-scaled prints the feed fills in, unless the
+    history has no volume at all) or one that moves by a split-sized
+    ratio gets NaN ratios.
+    """
+    dates = arrays[storage.DATE_COLUMN]
+    n = len(dates)
+    first = 0 if after is None else int(np.searchsorted(dates, np.datetime64(after, "D"), side="right"))
+
+    traded = np.nan_to_num(np.asarray(arrays["volume"], dtype="f8")) > 0
+    if not traded.any():
+        traded[:] = True
+    # last[t]: the last traded bar up to t (-1 before the first)
+    last = np.maximum.accumulate(np.where(traded, np.arange(n), -1))
+    # From the traded bar the first new one is measured against, and
+    # always the last two bars, for the day's change
+    lo = min(first, n - 1) - 1
+    if lo >= 0 and last[lo] >= 0:
+        lo = last[lo]
+    lo = max(min(lo, n - 2), 0)
+
+    price, _ = adjustments.cumulative_factors(events, dates[lo:], mode)
+    prices = {col: np.asarray(arrays[col][lo:], dtype="f8") * price for col in storage.PRICE_COLUMNS}
+    raw_close = np.asarray(arrays["close"][lo:], dtype="f8")
+    volume = np.asarray(arrays["volume"][lo:], dtype="f8")
+
+    bar = np.arange(lo + 1, n)
+    ref = last[bar - 1] - lo
+    new = bar >= first
+    with np.errstate(invalid="ignore", divide="ignore"):
+        prev = np.where(ref >= 0, prices["close"][np.maximum(ref, 0)], np.nan)
+        bars = {col: (prices[col][1:] / prev)[new] for col in storage.PRICE_COLUMNS}
+        change = prices["close"][-1] / prices["close"][-2] - 1 if n > 1 else np.nan
+        bad = ~traded[bar][new] | np.logical_or.reduce([
+            np.fmax(r, 1 / r) >= validate_ohlcv.JUMP_RATIO for r in bars.values()
+        ])
+    for col in storage.PRICE_COLUMNS:
+        bars[col][bad] = np.nan
+    bars["date"] = np.asarray(dates[lo + 1:])[new]
+    # Weighted by the traded value of the bar the move starts from, not
+    # of the move's own (big moves trade big: a weight that looks ahead)
+    value = raw_close * volume
+    bars["value"] = np.where(ref >= 0, value[np.maximum(ref, 0)], 0.0)[new]
+    bars["volume"] = volume[1:][new]
+    return bars, change
+
+def member_matrix(bars, calendar):
+    """
+    (ratios {col: (M, T)}, value (M, T), volume (M, T)) of the member
+    ``bars`` (bar_ratios output) on ``calendar``; NaN ratios where a
+    member has no bar.
+    """
+    M, T = len(bars), len(calendar)
+    ratio = {col: np.full((M, T), np.nan) for col in storage.PRICE_COLUMNS}
+    value, volume = np.zeros((M, T)), np.zeros((M, T))
+    for i, b in enumerate(bars):
+        pos = np.searchsorted(calendar, b["date"])
+        for col in storage.PRICE_COLUMNS:
+            ratio[col][i, pos] = b[col]
+        value[i, pos] = np.nan_to_num(b["value"])
+        volume[i, pos] = np.nan_to_num(b["volume"])
+    return ratio, value, volume
+
+def chain(ratios, weights, start):
+    """
+    Composite OHLC on the dates with members: ``ratios`` {col: (M, T)
+    member ratios, NaN = no bar}, ``weights`` (M, T) or None (equal).
+    Returns ({col: (T,) levels}, members (T,)).
+    """
+    ok = np.isfinite(ratios["close"])
+    for col in storage.PRICE_COLUMNS:
+        ok &= np.isfinite(ratios[col])
+    w = ok.astype("f8")
+    if weights is not None:
+        w = np.where(ok & (weights > 0), weights, 0.0)
+        # No member outweighs WEIGHT_CAP typical members of the session
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median = np.nanmedian(np.where(w > 0, w, np.nan), axis=0)
+        w = np.minimum(w, np.nan_to_num(median) * WEIGHT_CAP)
+    # A day without traded value (all weights 0) falls back to equal weights
+    w = np.where(w.sum(axis=0) > 0, w, ok.astype("f8"))
+    total = w.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = {col: np.where(ok, ratios[col], 0.0).__mul__(w).sum(axis=0) / total
+                for col in storage.PRICE_COLUMNS}
+
+    has = total > 0
+    growth = np.where(has, mean["close"], 1.0)
+    close = start * np.cumprod(growth)
+    previous = np.concatenate([[start], close[:-1]])
+    levels = {col: previous * mean[col] for col in storage.PRICE_COLUMNS}
+    levels["close"] = close
+    for col in levels:
+        levels[col] = np.where(has, levels[col], np.nan)
+    return levels, ok.sum(axis=0)
+
+def read_composite_tail(path, lines=2):
+    """[(date, close)] of the last ``lines`` composite bars (empty when missing)."""
+    if not path.exists():
+        return []
+    columns, tail = storage.read_csv_tail(path, lines)
+    if columns != COMPOSITE_COLUMNS:
+        return []
+    out = []
+    for line in tail:
+        fields = line.split(",")
+        out.append((np.datetime64(fields[0], "D"), float(fields[4])))
+    return out
+
+def _resume_point(names, root, revise=REVISE_SESSIONS):
+    """
+    (after, {(sector, method): last close on or before it}) to recompute
+    the series from, ``after`` being the session before the last
+    ``revise`` ones of the universe series; None when the series have to
+    be built from the first bar (also when they were built by another
+    COMPOSITE_VERSION). A series may end earlier (no member
+    traded since); a sector without one starts at BASE_LEVEL.
+    """
+    try:
+        with open(root / VERSION_FILE, "r") as f:
+            version = json.load(f).get("version")
+    except (OSError, ValueError):
+        version = None
+    universe = read_composite_tail(composite_path(UNIVERSE_SECTOR, METHODS[0], root), revise + 1)
+    if version != COMPOSITE_VERSION or len(universe) <= revise:
+        return None
+    after, levels = universe[0][0], {}
+    for name in names:
+        for method in METHODS:
+            tail = read_composite_tail(composite_path(name, method, root), revise + 1)
+            before = [close for date, close in tail if date <= after]
+            if before:
+                levels[(name, method)] = before[-1]
+            elif len(tail) > revise:
+                # Its bar before ``after`` is further back than the tail read
+                return None
+    return after, levels
+
+def _truncate_after(path, after, revise=REVISE_SESSIONS):
+    """Cut the rows dated after ``after`` (at most ``revise``) off a composite file."""
+    if not path.exists():
+        return
+    _, tail = storage.read_csv_tail(path, revise + 1)
+    cut = 0
+    for line in reversed(tail):
+        if np.datetime64(line.split(",")[0], "D") <= after:
+            break
+        cut += len(line.encode()) + 1
+    if cut:
+        with open(path, "rb+") as f:
+            f.truncate(f.seek(0, 2) - cut)
+
+def update_composites(sectors, symbols=None, rebuild=False, root=None):
+    """
+    Recompute the last REVISE_SESSIONS composite bars and append the
+    ones after them (all of them on ``rebuild`` or when there are none
+    yet). Returns ({symbol: change of
+    its last bar}, {(sector, method): (close, change_pct)}).
+    """
+    root = root or SECTORS_DIR
+    symbols = [s for s in (symbols or storage.list_symbols("stocks")) if s in sectors]
+    names = sector_names(sectors)
+    resume = None if rebuild else _resume_point(names, root)
+    after, start = (None, {}) if resume is None else resume
+    for path in root.glob("*/*.csv"):
+        if resume is None:
+            # Series of sectors that lost every member would otherwise linger
+            path.unlink()
+        else:
+            _truncate_after(path, after)
+
+    bars, changes = {}, {}
+    for symbol in symbols:
+        try:
+            bars[symbol], changes[symbol] = member_bars(symbol, after)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ {symbol}: skipped in sector composites ({e})")
+
+    dates = [b["date"] for b in bars.values() if len(b["date"])]
+    calendar = np.unique(np.concatenate(dates)) if dates else np.empty(0, dtype=storage.DATE_DTYPE)
+
+    if len(calendar):
+        # (members × sessions) per sector; a member sits in its sector and in ALL
+        rows, codes = _groups(list(bars), sectors, names)
+        ratio, value, volume = member_matrix(list(bars.values()), calendar)
+
+        for g, name in enumerate(names):
+            member_rows = rows[codes == g]
+            if not len(member_rows):
+                continue
+            sub = {col: ratio[col][member_rows] for col in storage.PRICE_COLUMNS}
+            for method in METHODS:
+                weights = value[member_rows] if method == "volume" else None
+                levels, counts = chain(sub, weights, start.get((name, method), BASE_LEVEL))
+                keep = counts > 0
+                frame = pd.DataFrame({
+                    "date": calendar[keep],
+                    **{col: levels[col][keep] for col in storage.PRICE_COLUMNS},
+                    "volume": volume[member_rows].sum(axis=0)[keep].astype(np.int64),
+                    "members": counts[keep],
+                })
+                _write_composite(frame, composite_path(name, method, root), append=resume is not None)
+        root.mkdir(parents=True, exist_ok=True)
+        storage._write_atomic(root / VERSION_FILE, json.dumps({"version": COMPOSITE_VERSION}), mode="w")
+
+    latest = {}
+    for name in names:
+        for method in METHODS:
+            tail = read_composite_tail(composite_path(name, method, root), 2)
+            if len(tail) == 2:
+                latest[(name, method)] = (tail[-1][1], (tail[-1][1] / tail[-2][1] - 1) * 100)
+            elif tail:
+                latest[(name, method)] = (tail[-1][1], np.nan)
+
+    print(f"🏭 Sector composites: {len(calendar)} sessions (re)computed over {len(names)} groups")
+    return changes, latest
+
+def _write_composite(frame, path, append):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if append and path.exists():
+        with open(path, "a", newline="") as f:
+            frame.to_csv(f, header=False, index=False, date_format="%Y-%m-%d", lineterminator="\n")
+    else:
+        tmp = path.with_name(path.name + ".tmp")
+        frame.to_csv(tmp, index=False, date_format="%Y-%m-%d", lineterminator="\n")
+        tmp.replace(path)
+
+# ------------------------
+# Stage
+# ------------------------
+def build(daily, rebuild=False, root=None):
+    """The sectors_daily frame for the stocks' daily snapshot, composites brought up to date."""
+    sectors = load_sectors() if CONFIG_PATH.exists() else {}
+    changes, latest = update_composites(sectors, list(daily["symbol"].astype(str)), rebuild, root)
+    return breadth_frame(daily, changes, sectors, latest)
+
+# ------------------------
+# Verification
+# ------------------------
+def verify_breadth(size=500, seed=0):
+    """Vectorized breadth must match a per-sector pandas group-by."""
+    rng = np.random.default_rng(seed)
+    sectors_list = np.array(["Power", "Banks", "IT", "Realty", "Capital Goods"])
+    symbols = [f"S{i}" for i in range(size)]
+    sectors = {s: str(rng.choice(sectors_list)) for s in symbols if rng.random() > 0.02}
+    close = rng.uniform(10, 1000, size)
+    daily = pd.DataFrame({
+        "date": np.where(rng.random(size) < 0.05, pd.Timestamp("2025-01-02"), pd.Timestamp("2025-01-03")),
+        "symbol": symbols,
+        "close": close,
+        "sma50": close * rng.normal(1, 0.05, size),
+        "sma200": np.where(rng.random(size) < 0.1, np.nan, close * rng.normal(1, 0.1, size)),
+        "rsi14": rng.uniform(0, 100, size),
+        "trend": rng.choice(list(TRENDS), size),
+        "confidence_score": rng.integers(0, 101, size),
+    })
+    changes = {s: float(rng.choice([-0.01, 0.0, 0.02])) for s in symbols}
+    actual = breadth_frame(daily, changes, sectors).set_index("sector")
+
+    df = daily[daily["date"] == daily["date"].max()].copy()
+    df["change"] = df["symbol"].map(changes)
+    df["sector"] = df["symbol"].map(sectors)
+    groups = [(name, g) for name, g in df.groupby("sector")] + [(UNIVERSE_SECTOR, df)]
+    for name, g in groups:
+        row = actual.loc[name]
+        expected = {
+            "reporting": len(g),
+            "above_sma50_pct": (g["close"] > g["sma50"]).mean() * 100,
+            "above_sma200_pct": (g["close"] > g["sma200"])[g["sma200"].notna()].mean() * 100,
+            "advances": (g["change"] > 0).sum(),
+            "declines": (g["change"] < 0).sum(),
+            "avg_rsi14": g["rsi14"].mean(),
+            "bullish": (g["trend"] == "Bullish").sum(),
+            "median_confidence": g["confidence_score"].median(),
+        }
+        for col, value in expected.items():
+            if not np.isclose(row[col], value):
+                print(f"❌ sectors: {name} {col} = {row[col]}, expected {value}")
+                return False
+
+    # Composites: one member → the member's own (rescaled) bars
+    bars = {col: rng.uniform(0.98, 1.02, (1, 30)) for col in storage.PRICE_COLUMNS}
+    bars["high"] = np.maximum.reduce([bars[c] for c in storage.PRICE_COLUMNS]) + 0.001
+    bars["low"] = np.minimum.reduce([bars[c] for c in storage.PRICE_COLUMNS]) - 0.001
+    levels, _ = chain(bars, None, 100.0)
+    closes = 100.0 * np.cumprod(bars["close"][0])
+    if not np.allclose(levels["close"], closes) or not np.allclose(
+        levels["high"][1:], closes[:-1] * bars["high"][0][1:]
+    ):
+        print("❌ sectors: single-member composite does not follow its member")
+        return False
+
+    # Appending night by night must equal one rebuild
+    ratios = {col: rng.uniform(0.97, 1.03, (8, 40)) for col in storage.PRICE_COLUMNS}
+    ratios["close"][rng.random((8, 40)) < 0.1] = np.nan
+    weights = rng.uniform(0, 1e6, (8, 40))
+    full, _ = chain(ratios, weights, BASE_LEVEL)
+    level = BASE_LEVEL
+    for t in range(40):
+        step, _ = chain({c: r[:, t:t + 1] for c, r in ratios.items()}, weights[:, t:t + 1], level)
+        if np.isfinite(step["close"][0]):
+            if not np.isclose(step["close"][0], full["close"][t]):
+                print("❌ sectors: incremental composite drifts from the rebuild")
+                return False
+            level = step["close"][0]
+
+    # Bad prints, unrecorded splits and outsized traded values must not
+    # move the composites; a recorded split after a gap is adjusted away
+    if not _verify_bounds(rng):
+        return False
+
+    # Every run resumes before the last REVISE_SESSIONS universe bars and cuts them off
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / VERSION_FILE).write_text(json.dumps({"version": COMPOSITE_VERSION}))
+        days = np.arange(np.datetime64("2025-01-01"), np.datetime64("2025-01-21"))
+        frame = pd.DataFrame({
+            "date": days, "open": 1.0, "high": 1.0, "low": 1.0,
+            "close": np.arange(1.0, len(days) + 1), "volume": 1, "members": 1,
+        })
+        for method in METHODS:
+            _write_composite(frame, composite_path(UNIVERSE_SECTOR, method, root), append=False)
+        _write_composite(frame.iloc[:12], composite_path("Power", "equal", root), append=False)
+        after, levels = _resume_point(["Power", UNIVERSE_SECTOR], root)
+        cutoff = len(days) - REVISE_SESSIONS - 1
+        path = composite_path(UNIVERSE_SECTOR, "equal", root)
+        _truncate_after(path, after)
+        if (after != days[cutoff] or levels[(UNIVERSE_SECTOR, "equal")] != cutoff + 1
+                or levels[("Power", "equal")] != 12.0
+                or read_composite_tail(path, 1) != [(days[cutoff], cutoff + 1.0)]):
+            print("❌ sectors: trailing composite bars are not recomputed")
+            return False
+
+    print(f"✅ sectors: breadth matches a pandas group-by ({len(groups)} groups), composites chain, "
+          f"stay within ±{MAX_SESSION_MOVE:.0%} a session and revise the last {REVISE_SESSIONS} sessions")
+    return True
+
+def _verify_bounds(rng, members=30, sessions=600):
+    days = pd.bdate_range("2004-01-01", periods=sessions).to_numpy().astype(storage.DATE_DTYPE)
+    universe = []
+    for i in range(members):
+        close = 100 * np.cumprod(1 + rng.normal(0, 0.02, sessions))
+        arrays = {
+            storage.DATE_COLUMN: days,
+            "open": close * rng.uniform(0.99, 1.01, sessions),
+            "high": close * 1.02, "low": close * 0.98, "close": close,
+            "volume": rng.uniform(1e5, 1e6, sessions), "stock_splits": np.zeros(sessions),
+        }
+        universe.append(arrays)
+
+    def scale(arrays, t, factor, stop=None):
+        for col in storage.PRICE_COLUMNS:
+            arrays[col][t:stop] *= factor
+
+    # One-bar prints 109× / 33× / 1.5× the price without volume, as on
+    # 2005-07-28, and a traded one 11×
+    for i, factor in zip(range(3), (109.5, 33.0, 1.5)):
+        scale(universe[i], 400, factor, 401)
+        universe[i]["volume"][400] = 0
+    scale(universe[6], 420, 11.1, 421)
+    # A 1:5 bonus nobody recorded, and a member trading 10⁶× the others'
+    # value that jumps 50 % (a real move, but not the whole sector's)
+    scale(universe[3], 300, 0.2)
+    universe[4]["volume"] *= 1e6
+    scale(universe[4], 500, 1.5)
+    # A recorded 1:2 split on the first bar after a two-week gap
+    gapped = universe[5]
+    scale(gapped, 200, 0.5)
+    gapped["stock_splits"][200] = 2.0
+    keep = np.ones(sessions, dtype=bool)
+    keep[190:200] = False
+    keep[rng.random(sessions) < 0.05] = False
+    keep[200] = True
+    universe[5] = {col: values[keep] for col, values in gapped.items()}
+
+    bars = [bar_ratios(a, adjustments.scan_events(a))[0] for a in universe]
+    # The print is left out and the next bar measured against the last traded close
+    stale = universe[2]
+    expected = stale["close"][401] / stale["close"][399]
+    if not (np.isnan(bars[2]["close"][399]) and np.isclose(bars[2]["close"][400], expected)):
+        print("❌ sectors: a bar without volume still moves its member")
+        return False
+    # Resuming after any session (the print included) gives the same ratios
+    events = adjustments.scan_events(stale)
+    for t in (398, 399, 400, 401):
+        resumed, _ = bar_ratios(stale, events, days[t])
+        if not np.allclose(resumed["close"], bars[2]["close"][t:], equal_nan=True):
+            print(f"❌ sectors: ratios resumed after {days[t]} differ from a rebuild")
+            return False
+    split_bar = bars[5]["close"][np.searchsorted(bars[5]["date"], days[200])]
+    if not abs(split_bar - 1) < 0.1:
+        print(f"❌ sectors: recorded split after a gap left a ratio of {split_bar}")
+        return False
+
+    ratio, value, _ = member_matrix(bars, days[1:])
+    for method in METHODS:
+        levels, _ = chain(ratio, value if method == "volume" else None, BASE_LEVEL)
+        close = levels["close"][np.isfinite(levels["close"])]
+        moves = np.abs(np.diff(np.concatenate([[BASE_LEVEL], close])) / np.concatenate([[BASE_LEVEL], close[:-1]]))
+        if not len(close) or moves.max() > MAX_SESSION_MOVE:
+            print(f"❌ sectors: {method} composite moves {moves.max():.1%} in a session")
+            return False
+    return True
+
+# ------------------------
+# CLI
+# ------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Sector breadth and composite series")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the composites from the first bar")
+    parser.add_argument("--verify", action="store_true", help="offline checks and exit")
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(0 if verify_breadth() else 1)
+
+    import build_snapshots
+    daily = build_snapshots.read_snapshot("stocks_daily")
+    if daily is None:
+        print("❌ precalc/stocks_daily.csv missing: build the snapshots first")
+        sys.exit(1)
+    df = build(daily, args.rebuild)
+    df.to_csv(build_snapshots.BOT_SNAPSHOT_DIR / f"{SNAPSHOT_NAME}.csv", index=False)
+    print(df.to_string(index=False, max_cols=12))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# scripts/snapshot_apply.py
+#
+# Consumer side of the delta snapshot publishing (publish_snapshots.py):
+# rebuilds the snapshot CSVs from a published directory
+#
+#   manifest.json           sequence, schema, chain, per-snapshot hashes
+#   base-<seq>.json.gz      full state at the start of the chain
+#   delta-<seq>.json.gz     changed fields since the previous sequence
+#
+#   python scripts/snapshot_apply.py <published dir> <output dir>
+#
+# The output directory keeps the applied state (snapshot_state.json.gz)
+# next to the CSVs, so each run only applies the deltas it has not seen;
+# a consumer that fell behind the current base (the chain was compacted)
+# starts again from the base. The result is checked against the
+# manifest's hashes before anything is written.
+#
+# Standard library only, so the file can be copied into the bot repo.
+
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+MANIFEST_FILE = "manifest.json"
+STATE_FILE = "snapshot_state.json.gz"
+FORMAT_VERSION = 1
+
+# In memory a state is {"sequence": n, "snapshots": {name: {"columns":
+# [...], "order": [symbol, ...], "rows": {symbol: [value per column]}}}}.
+# Files store each snapshot column-major ("data": {column: [values in
+# order]}), which compresses far better. A delta holds, per snapshot and
+# column, the positions (in the new order) of the rows whose value
+# changed and their new values; rows of new symbols appear in every
+# column:
+#
+#   {"sequence": n, "snapshots": {name: {"changes": {column: [[i, ...],
+#    [value, ...]]}, "delete": [symbol, ...], "order": [...] if changed}}}
+
+# ------------------------
+# Files
+# ------------------------
+def read_json(path):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_json(path, payload):
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    data = json.dumps(payload, separators=(",", ":"))
+    if path.name.endswith(".gz"):
+        # mtime=0 keeps the bytes (and so the repo diff) stable for equal content
+        with open(tmp, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+            f.write(data.encode("utf-8"))
+    else:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+    os.replace(tmp, path)
+
+def state_from_file(payload):
+    snapshots = {}
+    for name, snap in payload["snapshots"].items():
+        columns = [snap["data"][col] for col in snap["columns"]]
+        snapshots[name] = {
+            "columns": snap["columns"],
+            "order": snap["order"],
+            "rows": {symbol: list(values) for symbol, values in zip(snap["order"], zip(*columns))},
+        }
+    return {"sequence": payload["sequence"], "snapshots": snapshots}
+
+def state_to_file(state):
+    snapshots = {}
+    for name, snap in state["snapshots"].items():
+        rows = [snap["rows"][symbol] for symbol in snap["order"]]
+        snapshots[name] = {
+            "columns": snap["columns"],
+            "order": snap["order"],
+            "data": {
+                col: [row[i] for row in rows] for i, col in enumerate(snap["columns"])
+            },
+        }
+    return {"sequence": state["sequence"], "snapshots": snapshots}
+
+def read_manifest(published):
+    manifest = read_json(Path(published) / MANIFEST_FILE)
+    if manifest.get("version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported snapshot format {manifest.get('version')}")
+    return manifest
+
+# ------------------------
+# State
+# ------------------------
+def snapshot_hash(snapshot):
+    """Content hash of one snapshot state (rows in order, values as published)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps(snapshot["columns"]).encode())
+    for symbol in snapshot["order"]:
+        h.update(json.dumps([symbol, snapshot["rows"][symbol]], separators=(",", ":")).encode())
+    return h.hexdigest()
+
+def apply_delta(state, delta):
+    """Apply one delta to ``state`` in place."""
+    if delta["sequence"] != state["sequence"] + 1:
+        raise ValueError(
+            f"delta {delta['sequence']} does not follow state {state['sequence']}"
+        )
+    for name, change in delta["snapshots"].items():
+        snapshot = state["snapshots"][name]
+        width = len(snapshot["columns"])
+        index = {col: i for i, col in enumerate(snapshot["columns"])}
+        order = change.get("order", snapshot["order"])
+        rows = snapshot["rows"]
+
+        for symbol in change.get("delete", []):
+            rows.pop(symbol, None)
+        for col, (positions, values) in change.get("changes", {}).items():
+            c = index[col]
+            for i, value in zip(positions, values):
+                symbol = order[i]
+                if symbol not in rows:
+                    rows[symbol] = [None] * width
+                rows[symbol][c] = value
+        snapshot["order"] = order
+    state["sequence"] = delta["sequence"]
+    return state
+
+def load_state(published, manifest=None, state=None):
+    """
+    The published state at the manifest's sequence: ``state`` (an
+    earlier applied state) brought forward, or the base plus every delta.
+    """
+    published = Path(published)
+    manifest = manifest or read_manifest(published)
+    if state is None or state["sequence"] < manifest["base_sequence"]:
+        state = state_from_file(read_json(published / manifest["base"]))
+    for name in manifest["deltas"]:
+        sequence = int(name.split("-")[1].split(".")[0])
+        if sequence > state["sequence"]:
+            apply_delta(state, read_json(published / name))
+    return state
+
+def check_state(state, manifest):
+    """Names of snapshots whose hash differs from the manifest's."""
+    bad = []
+    for name, entry in manifest["snapshots"].items():
+        snapshot = state["snapshots"].get(name)
+        if snapshot is None or snapshot_hash(snapshot) != entry["hash"]:
+            bad.append(name)
+    return bad
+
+# ------------------------
+# CSV output
+# ------------------------
+def _csv_value(value):
+    if value is None:
+        return ""
+    if value is True or value is False:
+        return str(value)
+    return value
+
+def write_csvs(state, out_dir):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, snapshot in state["snapshots"].items():
+        path = out_dir / f"{name}.csv"
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(snapshot["columns"])
+            for symbol in snapshot["order"]:
+                writer.writerow([_csv_value(v) for v in snapshot["rows"][symbol]])
+        os.replace(tmp, path)
+
+def apply(published, out_dir):
+    """
+    Bring ``out_dir`` up to the published sequence; returns the number
+    of sequences applied (0 when already current).
+    """
+    out_dir = Path(out_dir)
+    manifest = read_manifest(published)
+    local = None
+    if (out_dir / STATE_FILE).exists():
+        local = state_from_file(read_json(out_dir / STATE_FILE))
+    before = -1 if local is None else local["sequence"]
+    if before == manifest["sequence"]:
+        return 0
+    if before > manifest["sequence"]:
+        # The publisher started over (e.g. its directory was recreated)
+        local = None
+
+    state = load_state(published, manifest, local)
+    bad = check_state(state, manifest)
+    if bad:
+        raise ValueError(f"hash mismatch after applying: {', '.join(bad)}")
+
+    write_csvs(state, out_dir)
+    write_json(out_dir / STATE_FILE, state_to_file(state))
+    return manifest["sequence"] - max(before, manifest["base_sequence"] - 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply published snapshot deltas")
+    parser.add_argument("published", type=Path, help="directory with manifest.json")
+    parser.add_argument("out_dir", type=Path, help="where the snapshot CSVs are kept")
+    args = parser.parse_args()
+
+    try:
+        applied = apply(args.published, args.out_dir)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ Could not apply snapshots: {e}")
+        sys.exit(1)
+
+    if applied:
+        print(f"✅ Applied {applied} snapshot updates → {args.out_dir}")
+    else:
+        print("⏭️ Snapshots already current")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,555 @@
+# scripts/snapshot_service.py
+#
+# Read API over the EOD outputs for the downstream bot: the snapshot
+# rows in precalc/ and the per-symbol histories in the store.
+#
+#   python scripts/snapshot_service.py serve --port 8765
+#   python scripts/snapshot_service.py top --n 20 --sector "Capital Goods"
+#   python scripts/snapshot_service.py history ABB --start 2025-01-01
+#
+# As a library:
+#
+#   service = SnapshotService()
+#   service.symbol("ABB")                  # latest daily snapshot row
+#   service.sector("Power", "weekly")      # rows of one sector's stocks
+#   service.top(10)                        # best daily confidence scores
+#   service.history("TCS", "2025-01-01")   # bars in a date range
+#   service.screen("rsi14 < 30 & trend == Bullish", sort="confidence_score")
+#   service.breadth("Power")               # sector breadth row (sector_breadth.py)
+#
+# Each snapshot file is parsed once per build into JSON-ready rows with a
+# symbol index and a confidence-sorted order; histories are sliced out of
+# the store's memory maps with a binary search on the dates (only for
+# symbols the store lists, so a request never names a path). Answers sit
+# in a thread-safe LRU cache bounded by their approximate size. The
+# cache (and the parsed snapshots) are dropped as soon as a new EOD build
+# lands, which is noticed from the modification stamps of the snapshot
+# files and data/manifest.json, checked at most every CHECK_INTERVAL
+# seconds.
+#
+# HTTP (GET, JSON):
+#   /health
+#   /symbols/<symbol>?timeframe=&universe=
+#   /sectors
+#   /sectors/<sector>?timeframe=
+#   /top?n=&timeframe=&universe=&sector=
+#   /history/<symbol>?start=&end=&timeframe=&universe=&columns=
+#   /screen?q=&sort=&asc=&limit=&timeframe=&universe=     (screener.py syntax)
+#   /breadth
+#   /breadth/<sector>                                      (ALL = whole universe)
+
+import argparse
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+import pandas as pd
+
+import storage
+from build_snapshots import BOT_SNAPSHOT_DIR, TIMEFRAMES, read_snapshot
+from sector_breadth import CONFIG_PATH, SNAPSHOT_NAME as BREADTH_SNAPSHOT, load_sectors
+
+SNAPSHOT_UNIVERSES = ("indices", "stocks")
+
+CACHE_SIZE = 1024       # cached answers
+CACHE_BYTES = 64 << 20  # approximate memory of the cached answers
+ANSWER_BYTES = 1024     # size charged for a row-list answer (rows are shared)
+VALUE_BYTES = 48        # per value of a history answer (list slot + object)
+CHECK_INTERVAL = 1.0    # seconds between checks for a new build
+DEFAULT_PORT = 8765
+DEFAULT_TOP = 10
+MAX_TOP = 500
+
+# ------------------------
+# Cache
+# ------------------------
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache with hit / miss counts, bounded
+    by entries and by the total of the sizes given to put().
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, maxbytes=CACHE_BYTES):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._items = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, size=ANSWER_BYTES):
+        with self._lock:
+            if size > self.maxbytes:
+                return
+            if key in self._items:
+                self.bytes -= self._sizes.pop(key)
+            self._items[key] = value
+            self._items.move_to_end(key)
+            self._sizes[key] = size
+            self.bytes += size
+            while len(self._items) > self.maxsize or self.bytes > self.maxbytes:
+                old, _ = self._items.popitem(last=False)
+                self.bytes -= self._sizes.pop(old)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+_MISSING = object()
+
+# ------------------------
+# JSON-ready values
+# ------------------------
+def _plain(value):
+    """numpy / pandas scalars → JSON types (NaN / NaT → None, dates → ISO)."""
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, (np.datetime64, pd.Timestamp)):
+        return str(np.datetime64(value, "D"))
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+def frame_records(df):
+    return [{col: _plain(v) for col, v in row.items()} for row in df.to_dict("records")]
+
+def array_records(arrays, columns):
+    out = {}
+    for col in columns:
+        values = arrays[col]
+        if col == storage.DATE_COLUMN:
+            out[col] = [str(d) for d in np.asarray(values).astype(storage.DATE_DTYPE)]
+        else:
+            out[col] = [_plain(v) for v in np.asarray(values).tolist()]
+    return out
+
+def _arrays_bytes(arrays):
+    """Heap held by parsed columns; memory maps are charged as answers."""
+    return sum(
+        ANSWER_BYTES if isinstance(values, np.memmap) else values.nbytes
+        for values in arrays.values()
+    )
+
+def _history_bytes(answer):
+    return ANSWER_BYTES + VALUE_BYTES * sum(len(values) for values in answer["bars"].values())
+
+# ------------------------
+# Snapshots
+# ------------------------
+class SnapshotTable:
+    """One snapshot file as JSON-ready rows, indexed by symbol and by score."""
+
+    def __init__(self, df, sectors):
+        df = df.reset_index(drop=True)
+        self.rows = frame_records(df)
+        for row in self.rows:
+            row["sector"] = sectors.get(row["symbol"])
+        self.index = {row["symbol"]: i for i, row in enumerate(self.rows)}
+        self._df = df
+        self._sectors = sectors
+        self._screen = None
+
+        self.by_sector = {}
+        for i, row in enumerate(self.rows):
+            self.by_sector.setdefault(row["sector"], []).append(i)
+
+        if "confidence_score" in df:
+            score = pd.to_numeric(df["confidence_score"], errors="coerce").to_numpy("f8")
+            # Highest first; unscored rows last; ties keep file order
+            self.ranked = np.lexsort((np.arange(len(score)), -np.nan_to_num(score, nan=-np.inf)))
+        else:
+            self.ranked = None
+
+    @property
+    def screen(self):
+        """screener.ScreenTable over the same rows, built on first use."""
+        if self._screen is None:
+            import screener
+            self._screen = screener.ScreenTable(self._df, self._sectors)
+        return self._screen
+
+# ------------------------
+# Service
+# ------------------------
+class SnapshotService:
+    """
+    Cached lookups over the snapshot outputs and stored histories. Answers
+    are shared between callers: treat them as read-only.
+    """
+
+    def __init__(self, snapshot_dir=None, cache_size=CACHE_SIZE, check_interval=CHECK_INTERVAL):
+        self.snapshot_dir = snapshot_dir or BOT_SNAPSHOT_DIR
+        self.check_interval = check_interval
+        self.cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._symbols = {}
+        self._sectors = None
+        self._version = None
+        self._generation = 0
+        self._checked = 0.0
+
+    # --- build detection ---
+    def snapshot_files(self):
+        return [
+            self.snapshot_dir / f"{universe}_{timeframe}.csv"
+            for universe in SNAPSHOT_UNIVERSES for timeframe in TIMEFRAMES
+        ] + [self.snapshot_dir / f"{BREADTH_SNAPSHOT}.csv"]
+
+    def _watched(self):
+        return self.snapshot_files() + [storage.manifest_path(), CONFIG_PATH]
+
+    def build_version(self):
+        """Modification stamps of every output a build rewrites."""
+        stamps = []
+        for path in self._watched():
+            try:
+                stat = path.stat()
+                stamps.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def refresh(self, force=False):
+        """Drop every cached answer if a new build landed since the last check."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.check_interval:
+            return False
+        with self._lock:
+            self._checked = now
+            version = self.build_version()
+            if version == self._version:
+                return False
+            self._version = version
+            self._generation += 1
+            self._tables = {}
+            self._symbols = {}
+            self._sectors = None
+            self.cache.clear()
+            return True
+
+    def _cached(self, key, compute, size=None):
+        """``compute()``, cached; ``size(value)`` estimates its memory in bytes."""
+        self.refresh()
+        value = self.cache.get(key, _MISSING)
+        if value is _MISSING:
+            generation = self._generation
+            value = compute()
+            # Computed from a build that was replaced meanwhile: answer, but do not keep
+            if generation == self._generation:
+                self.cache.put(key, value, ANSWER_BYTES if size is None else size(value))
+        return value
+
+    # --- sources ---
+    def sectors_map(self):
+        if self._sectors is None:
+            self._sectors = load_sectors() if CONFIG_PATH.exists() else {}
+        return self._sectors
+
+    def table(self, universe="stocks", timeframe="daily"):
+        if universe not in SNAPSHOT_UNIVERSES or timeframe not in TIMEFRAMES:
+            raise ValueError(f"no snapshot for {universe}/{timeframe}")
+        key = (universe, timeframe)
+        table = self._tables.get(key)
+        if table is None:
+            with self._lock:
+                table = self._tables.get(key)
+                if table is None:
+                    df = read_snapshot(f"{universe}_{timeframe}", self.snapshot_dir)
+                    if df is None:
+                        raise LookupError(f"snapshot {universe}_{timeframe}.csv not built yet")
+                    table = self._tables[key] = SnapshotTable(df, self.sectors_map())
+        return table
+
+    def stored_symbols(self, universe, timeframe="daily"):
+        """Symbols the store lists for ``universe`` (read once per build)."""
+        if universe not in storage.UNIVERSES or timeframe not in TIMEFRAMES:
+            raise ValueError(f"no stored bars for {universe}/{timeframe}")
+        key = (universe, timeframe)
+        symbols = self._symbols.get(key)
+        if symbols is None:
+            symbols = self._symbols[key] = frozenset(storage.list_symbols(universe, timeframe))
+        return symbols
+
+    def _universe_of(self, symbol, timeframe="daily"):
+        for universe in ("stocks", "indices"):
+            if symbol in self.stored_symbols(universe, timeframe):
+                return universe
+        raise LookupError(f"unknown symbol {symbol}")
+
+    # --- queries ---
+    def symbol(self, symbol, timeframe="daily", universe=None):
+        """The symbol's snapshot row, or None."""
+        def compute():
+            for name in [universe] if universe else SNAPSHOT_UNIVERSES:
+                table = self.table(name, timeframe)
+                if symbol in table.index:
+                    return table.rows[table.index[symbol]]
+            return None
+        return self._cached(("symbol", symbol, timeframe, universe), compute)
+
+    def sectors(self):
+        """{sector: number of stocks} from the config."""
+        def compute():
+            counts = {}
+            for sector in self.sectors_map().values():
+                counts[sector] = counts.get(sector, 0) + 1
+            return dict(sorted(counts.items()))
+        return self._cached(("sectors",), compute)
+
+    def sector(self, sector, timeframe="daily"):
+        """Snapshot rows of every stock in ``sector``."""
+        def compute():
+            table = self.table("stocks", timeframe)
+            return [table.rows[i] for i in table.by_sector.get(sector, [])]
+        return self._cached(("sector", sector, timeframe), compute)
+
+    def top(self, n=DEFAULT_TOP, timeframe="daily", universe="stocks", sector=None):
+        """The ``n`` rows with the highest confidence score (daily snapshots)."""
+        def compute():
+            table = self.table(universe, timeframe)
+            if table.ranked is None:
+                raise ValueError(f"{universe}_{timeframe} has no confidence scores")
+            order = table.ranked
+            if sector is not None:
+                members = np.zeros(len(table.rows), dtype=bool)
+                members[table.by_sector.get(sector, [])] = True
+                order = order[members[order]]
+            return [table.rows[i] for i in order[:max(0, min(n, MAX_TOP))]]
+        return self._cached(("top", n, timeframe, universe, sector), compute)
+
+    def screen(self, expr, timeframe="daily", universe="stocks", sort=None,
+               descending=True, limit=DEFAULT_TOP):
+        """Rows matching a screener expression, ranked by ``sort``."""
+        def compute():
+            table = self.table(universe, timeframe)
+            positions = table.screen.select(expr, sort, descending, max(0, min(limit, MAX_TOP)))
+            return [table.rows[i] for i in positions]
+        return self._cached(("screen", expr, timeframe, universe, sort, descending, limit), compute)
+
+    def breadth(self, sector=None):
+        """Sector breadth rows ({sector: row}), or one sector's row."""
+        def compute():
+            df = read_snapshot(BREADTH_SNAPSHOT, self.snapshot_dir)
+            if df is None:
+                raise LookupError(f"snapshot {BREADTH_SNAPSHOT}.csv not built yet")
+            return {row["sector"]: row for row in frame_records(df)}
+        rows = self._cached(("breadth",), compute)
+        if sector is None:
+            return rows
+        if sector not in rows:
+            raise LookupError(f"unknown sector {sector}")
+        return rows[sector]
+
+    def _columns(self, universe, symbol, timeframe):
+        """The symbol's stored columns: memory maps, or parsed CSV arrays."""
+        def compute():
+            arrays = storage.open_columns(universe, symbol, timeframe)
+            if arrays is None:
+                df = storage.load_ohlcv(universe, symbol, timeframe)
+                arrays = {col: df[col].to_numpy() for col in df.columns}
+                arrays[storage.DATE_COLUMN] = arrays[storage.DATE_COLUMN].astype(storage.DATE_DTYPE)
+            return arrays
+        return self._cached(("columns", universe, symbol, timeframe), compute, _arrays_bytes)
+
+    def history(self, symbol, start=None, end=None, timeframe="daily", universe=None,
+                columns=None):
+        """
+        Bars of ``symbol`` from ``start`` to ``end`` (inclusive ISO dates,
+        open-ended when None) as {column: [values]}.
+        """
+        # Only names the store lists reach the filesystem
+        name = universe or self._universe_of(symbol, timeframe)
+        if symbol not in self.stored_symbols(name, timeframe):
+            raise LookupError(f"no {timeframe} bars for {name}/{symbol}")
+
+        def compute():
+            arrays = self._columns(name, symbol, timeframe)
+            dates = arrays[storage.DATE_COLUMN]
+            lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, "D")))
+            hi = len(dates) if end is None else int(
+                np.searchsorted(dates, np.datetime64(end, "D"), side="right")
+            )
+            wanted = [storage.DATE_COLUMN] + [
+                col for col in (columns or arrays) if col in arrays and col != storage.DATE_COLUMN
+            ]
+            return {
+                "symbol": symbol,
+                "universe": name,
+                "timeframe": timeframe,
+                "bars": array_records({col: arrays[col][lo:hi] for col in wanted}, wanted),
+            }
+        key = ("history", symbol, start, end, timeframe, name, tuple(columns or ()))
+        return self._cached(key, compute, _history_bytes)
+
+    def health(self):
+        self.refresh()
+        return {
+            "snapshot_dir": str(self.snapshot_dir),
+            "cached": len(self.cache),
+            "cached_bytes": self.cache.bytes,
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "snapshots": {path.name: path.exists() for path in self.snapshot_files()},
+        }
+
+# ------------------------
+# HTTP
+# ------------------------
+def _query(params, name, default=None, cast=str):
+    values = params.get(name)
+    if not values or values[0] == "":
+        return default
+    return cast(values[0])
+
+def route(service, path, params):
+    """(status, payload) for one GET request."""
+    parts = [unquote(p) for p in path.strip("/").split("/") if p]
+    timeframe = _query(params, "timeframe", "daily")
+    universe = _query(params, "universe")
+
+    try:
+        if parts == ["health"]:
+            return 200, service.health()
+        if len(parts) == 2 and parts[0] == "symbols":
+            row = service.symbol(parts[1], timeframe, universe)
+            return (200, row) if row is not None else (404, {"error": f"unknown symbol {parts[1]}"})
+        if parts == ["sectors"]:
+            return 200, service.sectors()
+        if len(parts) == 2 and parts[0] == "sectors":
+            return 200, service.sector(parts[1], timeframe)
+        if parts == ["top"]:
+            return 200, service.top(
+                _query(params, "n", DEFAULT_TOP, int), timeframe, universe or "stocks",
+                _query(params, "sector"),
+            )
+        if parts == ["screen"]:
+            return 200, service.screen(
+                _query(params, "q", ""), timeframe, universe or "stocks", _query(params, "sort"),
+                _query(params, "asc", "0") in ("0", "false"), _query(params, "limit", DEFAULT_TOP, int),
+            )
+        if parts == ["breadth"]:
+            return 200, service.breadth()
+        if len(parts) == 2 and parts[0] == "breadth":
+            return 200, service.breadth(parts[1])
+        if len(parts) == 2 and parts[0] == "history":
+            columns = _query(params, "columns")
+            return 200, service.history(
+                parts[1], _query(params, "start"), _query(params, "end"), timeframe, universe,
+                columns.split(",") if columns else None,
+            )
+    except LookupError as e:
+        return 404, {"error": str(e)}
+    except ValueError as e:
+        return 400, {"error": str(e)}
+    return 404, {"error": f"no route {path}"}
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            status, payload = route(service, url.path, parse_qs(url.query))
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve(service, host="127.0.0.1", port=DEFAULT_PORT):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"🛰️ Serving snapshots from {service.snapshot_dir} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+# ------------------------
+# CLI
+# ------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Query the EOD snapshots and histories")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("serve", help="run the local HTTP server")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    p = sub.add_parser("symbol", help="one symbol's snapshot row")
+    p.add_argument("symbol")
+    p.add_argument("--timeframe", choices=TIMEFRAMES, default="daily")
+
+    p = sub.add_parser("sector", help="snapshot rows of a sector (no name: list sectors)")
+    p.add_argument("sector", nargs="?")
+    p.add_argument("--timeframe", choices=TIMEFRAMES, default="daily")
+
+    p = sub.add_parser("top", help="highest confidence scores")
+    p.add_argument("--n", type=int, default=DEFAULT_TOP)
+    p.add_argument("--universe", choices=SNAPSHOT_UNIVERSES, default="stocks")
+    p.add_argument("--sector")
+
+    p = sub.add_parser("breadth", help="sector breadth (no name: every sector)")
+    p.add_argument("sector", nargs="?")
+
+    p = sub.add_parser("history", help="a symbol's bars in a date range")
+    p.add_argument("symbol")
+    p.add_argument("--start")
+    p.add_argument("--end")
+    p.add_argument("--timeframe", choices=TIMEFRAMES, default="daily")
+    p.add_argument("--columns", type=lambda s: s.split(","))
+
+    args = parser.parse_args()
+    service = SnapshotService()
+
+    if args.command == "serve":
+        serve(service, args.host, args.port)
+        return
+    if args.command == "symbol":
+        result = service.symbol(args.symbol, args.timeframe)
+    elif args.command == "sector":
+        result = service.sector(args.sector, args.timeframe) if args.sector else service.sectors()
+    elif args.command == "top":
+        result = service.top(args.n, universe=args.universe, sector=args.sector)
+    elif args.command == "breadth":
+        result = service.breadth(args.sector)
+    else:
+        result = service.history(
+            args.symbol, args.start, args.end, args.timeframe, columns=args.columns
+        )
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,871 @@
+# scripts/storage.py
+
+import atexit
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+# ------------------------
+# Base paths
+# ------------------------
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# EOD_DATA_DIR points every script at another data tree (e.g. the
+# synthetic universes the benchmarks generate)
+DATA_DIR = Path(os.environ.get("EOD_DATA_DIR") or BASE_DIR / "data")
+STORE_DIR = DATA_DIR / "store"
+
+# Universe name -> CSV directory relative to DATA_DIR.
+# Weekly / monthly candles live in sub-folders of the daily directory.
+UNIVERSES = {
+    "stocks": Path("stocks") / "NIFTY500",
+    "indices": Path("indices"),
+}
+TIMEFRAMES = ("daily", "weekly", "monthly")
+
+DATE_COLUMN = "date"
+OHLCV_COLUMNS = [
+    "open", "high", "low", "close", "adj_close",
+    "volume", "dividends", "stock_splits",
+]
+# Weekly / monthly candles also carry a per-period completeness marker
+CANDLE_COLUMNS = ["complete"]
+INT_COLUMNS = {"volume"}
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+
+# Corporate-action columns default to "no action" when a fetch omits them
+ACTION_DEFAULTS = {"dividends": 0.0, "stock_splits": 0.0}
+
+META_FILE = "meta.json"
+DATE_DTYPE = np.dtype("<M8[D]")
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 2
+STAMPS_FILE = "manifest.stamps.json"   # local file stats, not committed
+
+# ------------------------
+# Paths
+# ------------------------
+def _relative_dir(universe, timeframe="daily"):
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"Unknown timeframe: {timeframe}")
+    rel = UNIVERSES[universe]
+    if timeframe != "daily":
+        rel = rel / timeframe
+    return rel
+
+def csv_dir(universe, timeframe="daily"):
+    return DATA_DIR / _relative_dir(universe, timeframe)
+
+def csv_path(universe, symbol, timeframe="daily"):
+    return csv_dir(universe, timeframe) / f"{symbol}.csv"
+
+def store_dir(universe, timeframe="daily"):
+    return STORE_DIR / _relative_dir(universe, timeframe)
+
+def store_path(universe, symbol, timeframe="daily"):
+    return store_dir(universe, timeframe) / symbol
+
+def exists(universe, symbol, timeframe="daily"):
+    return (
+        (store_path(universe, symbol, timeframe) / META_FILE).exists()
+        or csv_path(universe, symbol, timeframe).exists()
+    )
+
+def list_symbols(universe, timeframe="daily"):
+    """Symbols available in the store or as CSV, sorted."""
+    symbols = set()
+
+    root = store_dir(universe, timeframe)
+    if root.exists():
+        symbols.update(
+            p.name for p in root.iterdir() if (p / META_FILE).exists()
+        )
+
+    root = csv_dir(universe, timeframe)
+    if root.exists():
+        symbols.update(p.stem for p in root.glob("*.csv"))
+
+    return sorted(symbols)
+
+# ------------------------
+# Normalization helpers
+# ------------------------
+def normalize_columns(df):
+    df.columns = (
+        df.columns
+        .astype(str)
+        .str.strip()
+        .str.lower()
+        .str.replace(" ", "_")
+    )
+    return df
+
+def parse_dates(values):
+    """
+    Parse yfinance / CSV dates to tz-naive midnight timestamps.
+    Only the leading YYYY-MM-DD is used, so "+05:30" offsets and
+    time-of-day suffixes collapse onto the exchange session date.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if values.dt.tz is not None:
+            values = values.dt.tz_localize(None)
+        return values.dt.normalize().astype("datetime64[ns]")
+    return pd.to_datetime(
+        values.astype(str).str.slice(0, 10),
+        format="%Y-%m-%d",
+        errors="coerce",
+    )
+
+def clean_ohlcv(df):
+    """Keep known columns, parse dates, drop bad rows, sort and dedup."""
+    if DATE_COLUMN not in df.columns and df.index.name == DATE_COLUMN:
+        df = df.reset_index()
+
+    keep = [DATE_COLUMN] + [c for c in OHLCV_COLUMNS + CANDLE_COLUMNS if c in df.columns]
+    df = df.loc[:, keep].copy()
+
+    df[DATE_COLUMN] = parse_dates(df[DATE_COLUMN]).values
+    df.dropna(subset=[DATE_COLUMN], inplace=True)
+    df.sort_values(DATE_COLUMN, inplace=True, kind="stable")
+    df.drop_duplicates(subset=[DATE_COLUMN], keep="last", inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+def _column_dtype(name, series):
+    if pd.api.types.is_bool_dtype(series):
+        return np.dtype("|b1")
+    if pd.api.types.is_integer_dtype(series):
+        return np.dtype("<i8")
+    if name in INT_COLUMNS and series.notna().all():
+        return np.dtype("<i8")
+    return np.dtype("<f8")
+
+# ------------------------
+# Reading
+# ------------------------
+def read_meta(universe, symbol, timeframe="daily"):
+    path = store_path(universe, symbol, timeframe) / META_FILE
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def open_columns(universe, symbol, timeframe="daily", columns=None):
+    """
+    Memory-map the stored columns of one symbol.
+    Returns {column: ndarray} (date always included) or None if the
+    symbol has not been migrated to the store yet.
+    """
+    meta = read_meta(universe, symbol, timeframe)
+    if meta is None:
+        return None
+
+    root = store_path(universe, symbol, timeframe)
+    rows = meta["rows"]
+    stored = meta["columns"]
+
+    wanted = [DATE_COLUMN] + [
+        c for c in (stored if columns is None else columns)
+        if c in stored and c != DATE_COLUMN
+    ]
+
+    arrays = {}
+    for col in wanted:
+        dtype = np.dtype(stored[col])
+        if rows == 0:
+            arrays[col] = np.empty(0, dtype=dtype)
+        else:
+            # A str path skips the Path.resolve() np.memmap does for Path objects
+            arrays[col] = np.memmap(
+                str(root / f"{col}.bin"), dtype=dtype, mode="r", shape=(rows,)
+            )
+            instrument.mapped(rows * dtype.itemsize)
+    return arrays
+
+def _frame_from_arrays(arrays, tail=None):
+    data = {}
+    for col, values in arrays.items():
+        if tail is not None:
+            values = values[len(values) - min(tail, len(values)):]
+        values = np.array(values)
+        if col == DATE_COLUMN:
+            values = values.astype("datetime64[ns]")
+        data[col] = values
+    return pd.DataFrame(data)
+
+def read_csv_frame(path, columns=None):
+    """Read a raw CSV into the store schema (normalized names, parsed dates)."""
+    df = normalize_columns(pd.read_csv(path))
+    if DATE_COLUMN not in df.columns:
+        raise ValueError(f"{path}: no date column")
+    df = clean_ohlcv(df)
+    if columns is not None:
+        df = df[[DATE_COLUMN] + [c for c in columns if c in df.columns]]
+    return df
+
+def load_ohlcv(universe, symbol, timeframe="daily", columns=None,
+               tail=None, source="auto", start=None):
+    """
+    Load one symbol's history as a DataFrame with a datetime64 ``date``
+    column followed by the requested OHLCV columns.
+
+    source="auto" reads the columnar store and falls back to the CSV
+    mirror for symbols that have not been migrated; "store" / "csv"
+    force one side. ``tail`` limits the load to the last N bars and
+    ``start`` to bars on or after that date.
+    """
+    if source != "csv":
+        arrays = open_columns(universe, symbol, timeframe, columns)
+        if arrays is not None:
+            if start is not None:
+                dates = arrays[DATE_COLUMN]
+                since = len(dates) - int(np.searchsorted(dates, np.datetime64(start, "D")))
+                tail = since if tail is None else min(tail, since)
+            return _frame_from_arrays(arrays, tail)
+        if source == "store":
+            raise FileNotFoundError(
+                store_path(universe, symbol, timeframe) / META_FILE
+            )
+
+    path = csv_path(universe, symbol, timeframe)
+    if not path.exists():
+        raise FileNotFoundError(path)
+
+    df = read_csv_frame(path, columns)
+    if start is not None:
+        df = df[df[DATE_COLUMN] >= pd.Timestamp(start)].reset_index(drop=True)
+    if tail is not None:
+        df = df.iloc[len(df) - min(tail, len(df)):].reset_index(drop=True)
+    return df
+
+def _read_tail_bytes(f, start, lines, block=4096):
+    """(offset, bytes) from ``offset`` to EOF holding more than ``lines`` newlines."""
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    data = b""
+
+    while pos > start and data.count(b"\n") <= lines:
+        step = min(block, pos - start)
+        pos -= step
+        f.seek(pos)
+        data = f.read(step) + data
+    return pos, data
+
+def read_csv_tail(path, lines=1, block=4096):
+    """
+    Return (header columns, last ``lines`` data lines) of a CSV by seeking
+    from the end of the file instead of parsing the whole history.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        _, data = _read_tail_bytes(f, len(header), lines, block)
+
+    columns = header.decode().strip().split(",") if header else []
+    tail = [line.decode() for line in data.splitlines() if line.strip()]
+    return columns, tail[-lines:]
+
+def count_lines(path, block=1 << 20):
+    """Number of lines in a file, counted over raw blocks without decoding."""
+    lines, last = 0, b"\n"
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(block)
+            if not chunk:
+                break
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    # A final line without a trailing newline still counts
+    return lines + (last != b"\n")
+
+def csv_summary(path):
+    """
+    (first date, last date, rows) of a CSV from its header, first data
+    line and last data line (found by seeking from the end) plus a raw
+    newline count; dates are None for a file without rows.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        first = f.readline()
+
+    columns = [c.strip().lower().replace(" ", "_") for c in header.decode().strip().split(",")]
+    if DATE_COLUMN not in columns:
+        raise ValueError(f"{path}: no date column")
+
+    rows = max(count_lines(path) - 1, 0)
+    _, tail = read_csv_tail(path)
+    if not rows or not first.strip() or not tail:
+        return None, None, 0
+
+    col = columns.index(DATE_COLUMN)
+    dates = parse_dates([first.decode().split(",")[col], tail[0].split(",")[col]])
+    return dates.iloc[0], dates.iloc[1], rows
+
+def last_date(universe, symbol, timeframe="daily"):
+    """
+    Last stored session as a Timestamp (None when there is no data).
+    Uses the store metadata, or the CSV tail for unmigrated symbols.
+    """
+    meta = read_meta(universe, symbol, timeframe)
+    if meta is not None:
+        return pd.Timestamp(meta["last_date"]) if meta["rows"] else None
+
+    path = csv_path(universe, symbol, timeframe)
+    if not path.exists():
+        return None
+
+    columns, tail = read_csv_tail(path)
+    columns = [c.strip().lower().replace(" ", "_") for c in columns]
+    if DATE_COLUMN not in columns:
+        raise ValueError(f"{path}: no date column")
+    if not tail:
+        return None
+
+    value = tail[0].split(",")[columns.index(DATE_COLUMN)]
+    return parse_dates([value]).iloc[0]
+
+def load_universe(universe, timeframe="daily", columns=None, tail=None,
+                  symbols=None):
+    """Load many symbols at once → {symbol: DataFrame}."""
+    if symbols is None:
+        symbols = list_symbols(universe, timeframe)
+
+    frames = {}
+    for symbol in symbols:
+        if not exists(universe, symbol, timeframe):
+            continue
+        frames[symbol] = load_ohlcv(
+            universe, symbol, timeframe, columns=columns, tail=tail
+        )
+    return frames
+
+# ------------------------
+# Manifest
+# ------------------------
+# data/manifest.json holds one entry per stored symbol and timeframe:
+# a hash of its column bytes, row count, first / last date, the stage
+# that last wrote it, and a signature of its CSV mirror. It only changes
+# when that content does. The stat stamps (size, mtime) of each meta.json
+# and CSV live next to it in data/manifest.stamps.json, which is local to
+# the checkout: a symbol whose meta.json stamp no longer matches (files
+# replaced behind the manifest's back, or a fresh checkout) is re-hashed
+# on read, and its entry rewritten only if the content moved. Consumers
+# (normalize, candles, snapshots, coverage) remember the hash they last
+# processed per symbol and only touch symbols whose hash moved.
+_manifest = None
+_manifest_dirty = False
+_stamps = None
+_stamps_dirty = False
+
+# Stage recorded on the entries this process writes
+_stage = Path(sys.argv[0]).stem if sys.argv and sys.argv[0] not in ("", "-c") else "python"
+
+def set_stage(name):
+    global _stage
+    _stage = name
+
+def manifest_path():
+    return DATA_DIR / MANIFEST_FILE
+
+def stamps_path():
+    return DATA_DIR / STAMPS_FILE
+
+def _empty_manifest():
+    return {"version": MANIFEST_VERSION, "entries": {}, "consumers": {}}
+
+def _read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_manifest():
+    global _manifest, _manifest_dirty, _stamps
+    if _manifest is None:
+        _manifest = _read_json(manifest_path())
+        if _manifest is not None and _manifest.get("version") == 1:
+            # Version 1 kept the stat stamps in the entries
+            for entry in _manifest["entries"].values():
+                entry.pop("meta_stamp", None)
+                entry.pop("csv_stamp", None)
+            _manifest["version"] = MANIFEST_VERSION
+            _manifest_dirty = True
+        if _manifest is None or _manifest.get("version") != MANIFEST_VERSION:
+            _manifest = _empty_manifest()
+        _stamps = _read_json(stamps_path()) or {}
+        atexit.register(flush_manifest)
+    return _manifest
+
+def flush_manifest():
+    """Write the manifest (and the local stamps) if this process changed them."""
+    global _manifest_dirty, _stamps_dirty
+    if _manifest is None:
+        return
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    if _manifest_dirty:
+        _write_atomic(manifest_path(), json.dumps(_manifest, indent=1, sort_keys=True), mode="w")
+        _manifest_dirty = False
+    if _stamps_dirty:
+        _write_atomic(stamps_path(), json.dumps(_stamps, sort_keys=True), mode="w")
+        _stamps_dirty = False
+
+def _manifest_key(universe, symbol, timeframe):
+    return f"{universe}/{timeframe}/{symbol}"
+
+def content_hash(arrays):
+    """Hash of every column's name, dtype and bytes."""
+    h = hashlib.blake2b(digest_size=16)
+    for col in sorted(arrays):
+        values = np.ascontiguousarray(arrays[col])
+        h.update(f"{col}:{values.dtype.str}:{len(values)};".encode())
+        h.update(values.view(np.uint8) if values.size else b"")
+    return h.hexdigest()
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+def _csv_signature(path, block=4096):
+    """Size plus a hash of the last block: enough to tell a rewritten CSV."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(size - block, 0))
+            tail = f.read()
+    except OSError:
+        return None
+    return f"{size}:{hashlib.blake2b(tail, digest_size=8).hexdigest()}"
+
+def _record(universe, symbol, timeframe="daily", stage=None, external=False):
+    """
+    (Re)build one manifest entry from the files on disk. An ``external``
+    re-record (store not written here) keeps the signature of the CSV the
+    store last wrote, so a CSV edited since still shows as changed.
+    """
+    global _manifest_dirty, _stamps_dirty
+    meta = read_meta(universe, symbol, timeframe)
+    if meta is None:
+        return None
+
+    entries = load_manifest()["entries"]
+    key = _manifest_key(universe, symbol, timeframe)
+    previous = entries.get(key)
+
+    root = store_path(universe, symbol, timeframe)
+    csv = csv_path(universe, symbol, timeframe)
+    signature = _csv_signature(csv)
+    entry = {
+        "hash": content_hash(open_columns(universe, symbol, timeframe)),
+        "rows": meta["rows"],
+        "first_date": meta["first_date"],
+        "last_date": meta["last_date"],
+        "csv_signature": previous["csv_signature"] if external and previous else signature,
+    }
+    csv_stamp = _stamp(csv) if signature == entry["csv_signature"] else None
+    _stamps[key] = {"meta": _stamp(root / META_FILE), "csv": csv_stamp}
+    _stamps_dirty = True
+    if previous is not None and all(previous.get(k) == v for k, v in entry.items()):
+        # Same content rewritten, touched or freshly checked out: not a modification
+        return previous
+
+    entry["stage"] = stage or _stage
+    entry["modified"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    if previous is not None and previous["hash"] == entry["hash"]:
+        # Only the CSV mirror moved
+        entry["stage"], entry["modified"] = previous["stage"], previous["modified"]
+    entries[key] = entry
+    _manifest_dirty = True
+    return entry
+
+def manifest_entry(universe, symbol, timeframe="daily"):
+    """
+    Current manifest entry of a stored symbol (None when it is not in
+    the store), re-hashed first if its files changed since it was written.
+    """
+    key = _manifest_key(universe, symbol, timeframe)
+    entry = load_manifest()["entries"].get(key)
+    stamp = _stamp(store_path(universe, symbol, timeframe) / META_FILE)
+    if stamp is None:
+        return None
+    if entry is None or _stamps.get(key, {}).get("meta") != stamp:
+        # Written by something that bypassed the manifest, or not yet seen
+        # by this checkout: compare the content, keeping the CSV signature
+        # the store last wrote so an edited CSV still shows as changed
+        entry = _record(universe, symbol, timeframe, stage="external", external=True)
+    return entry
+
+def csv_changed(universe, symbol, timeframe="daily"):
+    """
+    True when the CSV mirror is not what the store last wrote: the symbol
+    is not in the store, or its CSV was replaced or edited since.
+    """
+    global _stamps_dirty
+    entry = manifest_entry(universe, symbol, timeframe)
+    if entry is None:
+        return True
+
+    path = csv_path(universe, symbol, timeframe)
+    stamps = _stamps[_manifest_key(universe, symbol, timeframe)]
+    stamp = _stamp(path)
+    if stamp == stamps["csv"]:
+        return False
+    if _csv_signature(path) != entry["csv_signature"]:
+        return True
+    stamps["csv"] = stamp
+    _stamps_dirty = True
+    return False
+
+def dirty_symbols(consumer, universe, symbols, timeframe="daily", force=False):
+    """
+    Symbols whose stored content changed since ``consumer`` last marked
+    them clean. Symbols missing from the store are always dirty.
+    """
+    done = load_manifest()["consumers"].get(consumer, {})
+    dirty = []
+    for symbol in symbols:
+        entry = manifest_entry(universe, symbol, timeframe)
+        key = _manifest_key(universe, symbol, timeframe)
+        if force or entry is None or done.get(key) != entry["hash"]:
+            dirty.append(symbol)
+    return dirty
+
+def mark_clean(consumer, universe, symbols, timeframe="daily"):
+    """Record that ``consumer`` has processed the current content of ``symbols``."""
+    global _manifest_dirty
+    done = load_manifest()["consumers"].setdefault(consumer, {})
+    for symbol in symbols:
+        entry = manifest_entry(universe, symbol, timeframe)
+        key = _manifest_key(universe, symbol, timeframe)
+        if entry is not None and done.get(key) != entry["hash"]:
+            done[key] = entry["hash"]
+            _manifest_dirty = True
+
+# ------------------------
+# Writing
+# ------------------------
+def _write_atomic(path, payload, mode="wb"):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, mode) as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+def _write_meta(root, meta):
+    _write_atomic(root / META_FILE, json.dumps(meta, indent=2), mode="w")
+
+def _date_str(value):
+    return str(np.datetime64(value, "D"))
+
+def save_ohlcv(df, universe, symbol, timeframe="daily", csv=True):
+    """
+    Write a full history to the columnar store and, unless csv=False,
+    re-export the CSV mirror the downstream repo reads.
+    """
+    df = clean_ohlcv(df)
+
+    root = store_path(universe, symbol, timeframe)
+    root.mkdir(parents=True, exist_ok=True)
+
+    columns = {DATE_COLUMN: DATE_DTYPE}
+    for col in df.columns:
+        if col != DATE_COLUMN:
+            columns[col] = _column_dtype(col, df[col])
+
+    for col, dtype in columns.items():
+        values = df[col].to_numpy()
+        if col == DATE_COLUMN:
+            values = values.astype(DATE_DTYPE)
+        _write_atomic(root / f"{col}.bin", np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+    for stale in root.glob("*.bin"):
+        if stale.stem not in columns:
+            stale.unlink()
+
+    meta = {
+        "rows": len(df),
+        "columns": {col: dtype.str for col, dtype in columns.items()},
+        "first_date": _date_str(df[DATE_COLUMN].iloc[0]) if len(df) else None,
+        "last_date": _date_str(df[DATE_COLUMN].iloc[-1]) if len(df) else None,
+    }
+    _write_meta(root, meta)
+
+    if csv:
+        write_csv(df, universe, symbol, timeframe)
+
+    _record(universe, symbol, timeframe)
+    return meta
+
+def validate_rows(df):
+    """
+    Clean freshly fetched bars before they touch stored history:
+    store schema, parsed/sorted/unique dates, and no rows with a
+    missing OHLC price (yfinance emits those for in-progress sessions).
+    """
+    df = clean_ohlcv(df)
+
+    missing = [c for c in PRICE_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+
+    df.dropna(subset=PRICE_COLUMNS, inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+def _matches_history(overlap, arrays):
+    """True when every overlapping bar already exists with the same values."""
+    dates = np.asarray(arrays[DATE_COLUMN])
+    wanted = overlap[DATE_COLUMN].to_numpy().astype(DATE_DTYPE)
+
+    idx = np.searchsorted(dates, wanted)
+    if (idx >= len(dates)).any() or (dates[np.minimum(idx, len(dates) - 1)] != wanted).any():
+        return False
+
+    for col, values in arrays.items():
+        if col == DATE_COLUMN or col not in overlap.columns:
+            continue
+        old = np.asarray(values[idx], dtype="f8")
+        new = overlap[col].to_numpy(dtype="f8")
+        if not np.allclose(old, new, rtol=1e-9, atol=0.0, equal_nan=True):
+            return False
+    return True
+
+def _append_csv(df, universe, symbol, timeframe, previous_last):
+    """Append rows to the CSV mirror, re-exporting it if it has drifted."""
+    path = csv_path(universe, symbol, timeframe)
+    if not path.exists():
+        return export_csv(universe, symbol, timeframe)
+
+    header, tail = read_csv_tail(path)
+    columns = [DATE_COLUMN] + [c for c in df.columns if c != DATE_COLUMN]
+    tail_date = parse_dates([tail[0].split(",")[0]]).iloc[0] if tail else None
+
+    if header != columns or tail_date != previous_last:
+        return export_csv(universe, symbol, timeframe)
+
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        needs_newline = f.read(1) != b"\n"
+
+    with open(path, "a", newline="") as f:
+        if needs_newline:
+            f.write("\n")
+        df[columns].to_csv(f, header=False, index=False, date_format="%Y-%m-%d")
+    return path
+
+def append_ohlcv(df, universe, symbol, timeframe="daily", csv=True):
+    """
+    Append new bars in place: each column file grows by the new rows,
+    meta.json is updated and the CSV mirror gets the same lines appended.
+
+    Rows that repeat already-stored dates with identical values are
+    dropped. A genuine revision (changed values, or a bar inserted
+    before the last stored date) falls back to a full rewrite.
+
+    Returns (mode, rows) with mode in {"append", "rewrite", "noop"}.
+    """
+    new = validate_rows(df)
+    meta = read_meta(universe, symbol, timeframe)
+
+    if meta is None or meta["rows"] == 0:
+        return _rewrite(new, universe, symbol, timeframe, csv)
+
+    stored = {col: np.dtype(dtype) for col, dtype in meta["columns"].items()}
+    previous_last = np.datetime64(meta["last_date"], "D")
+
+    dates = new[DATE_COLUMN].to_numpy().astype(DATE_DTYPE)
+    overlap = new[dates <= previous_last]
+
+    if len(overlap):
+        arrays = open_columns(universe, symbol, timeframe)
+        if not _matches_history(overlap, arrays):
+            return _rewrite(new, universe, symbol, timeframe, csv)
+        new = new[dates > previous_last].reset_index(drop=True)
+
+    if new.empty:
+        return "noop", 0
+
+    for col, default in ACTION_DEFAULTS.items():
+        if col in stored:
+            new[col] = new[col].fillna(default) if col in new.columns else default
+
+    if set(new.columns) != set(stored):
+        return _rewrite(new, universe, symbol, timeframe, csv)
+
+    columns = {}
+    for col, dtype in stored.items():
+        values = new[col].to_numpy()
+        if col == DATE_COLUMN:
+            values = values.astype(DATE_DTYPE)
+        elif dtype.kind in "ib" and pd.isna(values).any():
+            return _rewrite(new, universe, symbol, timeframe, csv)
+        columns[col] = np.ascontiguousarray(values, dtype=dtype)
+
+    root = store_path(universe, symbol, timeframe)
+    rows = meta["rows"]
+
+    for col, values in columns.items():
+        path = root / f"{col}.bin"
+        # Drop any bytes left behind by an interrupted append
+        os.truncate(path, rows * values.itemsize)
+        with open(path, "ab") as f:
+            f.write(values.tobytes())
+
+    meta["rows"] = rows + len(new)
+    meta["last_date"] = _date_str(columns[DATE_COLUMN][-1])
+    _write_meta(root, meta)
+
+    if csv:
+        _append_csv(new[list(stored)], universe, symbol, timeframe,
+                    pd.Timestamp(previous_last))
+
+    _record(universe, symbol, timeframe)
+    return "append", len(new)
+
+def _patch_csv(df, universe, symbol, timeframe, dropped_dates):
+    """
+    Replace the CSV mirror's last lines (the rows dated ``dropped_dates``)
+    with ``df``, re-exporting it if its tail does not line up with the store.
+    """
+    dropped = len(dropped_dates)
+    path = csv_path(universe, symbol, timeframe)
+    if not path.exists():
+        return export_csv(universe, symbol, timeframe)
+
+    columns = [DATE_COLUMN] + [c for c in df.columns if c != DATE_COLUMN]
+    with open(path, "rb") as f:
+        header = f.readline()
+        pos, data = _read_tail_bytes(f, len(header), dropped)
+
+    lines = data.splitlines(keepends=True)
+    tail = lines[len(lines) - dropped:] if dropped else []
+    if (
+        header.decode().strip().split(",") != columns
+        or (data and not data.endswith(b"\n"))
+        or len(lines) < dropped
+        or [line.split(b",")[0][:10].decode() for line in tail]
+        != [_date_str(d) for d in dropped_dates]
+    ):
+        return export_csv(universe, symbol, timeframe)
+
+    cut = pos + len(data) - sum(len(line) for line in tail)
+    os.truncate(path, cut)
+    with open(path, "a", newline="") as f:
+        df[columns].to_csv(f, header=False, index=False, date_format="%Y-%m-%d")
+    return path
+
+def replace_tail(df, universe, symbol, timeframe="daily", csv=True):
+    """
+    Replace every stored bar dated on or after the first row of ``df``
+    with ``df``: the column files are truncated at that bar and the new
+    rows appended, and the CSV mirror has the same lines swapped out.
+    Used for candles whose open period changes on every run.
+
+    Returns (mode, rows) with mode in {"patch", "rewrite"}; rows is the
+    number of bars written.
+    """
+    new = clean_ohlcv(df)
+    meta = read_meta(universe, symbol, timeframe)
+    if meta is None or meta["rows"] == 0 or new.empty:
+        return _rewrite(new, universe, symbol, timeframe, csv)
+
+    stored = {col: np.dtype(dtype) for col, dtype in meta["columns"].items()}
+    dates = open_columns(universe, symbol, timeframe, columns=[])[DATE_COLUMN]
+    first = new[DATE_COLUMN].to_numpy().astype(DATE_DTYPE)[0]
+    keep = int(np.searchsorted(dates, first))
+
+    if set(new.columns) != set(stored):
+        return _rewrite_tail(new, universe, symbol, timeframe, keep, csv)
+
+    columns = {}
+    for col, dtype in stored.items():
+        values = new[col].to_numpy()
+        if col == DATE_COLUMN:
+            values = values.astype(DATE_DTYPE)
+        elif dtype.kind in "ib" and pd.isna(values).any():
+            return _rewrite_tail(new, universe, symbol, timeframe, keep, csv)
+        columns[col] = np.ascontiguousarray(values, dtype=dtype)
+
+    root = store_path(universe, symbol, timeframe)
+    dropped = np.array(dates[keep:])
+
+    for col, values in columns.items():
+        path = root / f"{col}.bin"
+        os.truncate(path, keep * values.itemsize)
+        with open(path, "ab") as f:
+            f.write(values.tobytes())
+
+    meta["rows"] = keep + len(new)
+    meta["first_date"] = meta["first_date"] if keep else _date_str(columns[DATE_COLUMN][0])
+    meta["last_date"] = _date_str(columns[DATE_COLUMN][-1])
+    _write_meta(root, meta)
+
+    if csv:
+        _patch_csv(new[list(stored)], universe, symbol, timeframe, dropped)
+
+    _record(universe, symbol, timeframe)
+    return "patch", len(new)
+
+def _rewrite_tail(new, universe, symbol, timeframe, keep, csv):
+    """replace_tail() when the schema changed: rewrite kept history + new rows."""
+    old = load_ohlcv(universe, symbol, timeframe).iloc[:keep]
+    meta = save_ohlcv(pd.concat([old, new], ignore_index=True), universe, symbol, timeframe, csv=csv)
+    return "rewrite", meta["rows"]
+
+def _rewrite(new, universe, symbol, timeframe, csv):
+    if exists(universe, symbol, timeframe):
+        old = load_ohlcv(universe, symbol, timeframe)
+        # New rows come last so that revisions win the dedup in clean_ohlcv
+        new = pd.concat([old, new], ignore_index=True)
+    meta = save_ohlcv(new, universe, symbol, timeframe, csv=csv)
+    return "rewrite", meta["rows"]
+
+def write_csv(df, universe, symbol, timeframe="daily"):
+    path = csv_path(universe, symbol, timeframe)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(path, index=False, date_format="%Y-%m-%d")
+    return path
+
+# ------------------------
+# Exports
+# ------------------------
+def export_csv(universe, symbol, timeframe="daily"):
+    """Regenerate one CSV mirror from the store."""
+    df = load_ohlcv(universe, symbol, timeframe, source="store")
+    path = write_csv(df, universe, symbol, timeframe)
+    _record(universe, symbol, timeframe)
+    return path
+
+def export_table(universe, path, timeframe="daily", fmt="parquet"):
+    """
+    Export a whole universe as one long table (symbol + OHLCV).
+    Parquet / Feather need pyarrow, which is optional.
+    """
+    frames = load_universe(universe, timeframe)
+    table = pd.concat(
+        [df.assign(symbol=symbol) for symbol, df in frames.items()],
+        ignore_index=True,
+    )
+    table.insert(0, "symbol", table.pop("symbol"))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == "parquet":
+        table.to_parquet(path, index=False)
+    elif fmt == "feather":
+        table.to_feather(path)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return path
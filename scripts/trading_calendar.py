@@ -0,0 +1,148 @@
+# scripts/trading_calendar.py
+#
+# NSE / BSE trading sessions, offline. From the start of the holiday
+# table (config/market_holidays.json) a session is a weekday that is not
+# an exchange holiday, plus the special sessions the feed carries (e.g.
+# a Saturday budget session; Muhurat days simply are not listed as
+# holidays). Before the table starts, the sessions are the union of the
+# dates in the stored index histories: every day any index traded was a
+# market day. Used for fetch planning (which sessions a symbol is
+# missing) and for gap / staleness counts in the coverage reports.
+
+import json
+from collections import namedtuple
+from datetime import datetime, time, timedelta, timezone
+
+import numpy as np
+
+import storage
+
+HOLIDAYS_FILE = storage.BASE_DIR / "config" / "market_holidays.json"
+DEFAULT_EXCHANGE = "NSE"
+CALENDAR_UNIVERSE = "indices"
+
+IST = timezone(timedelta(hours=5, minutes=30))
+# Daily bars are final some time after the 15:30 close
+BARS_FINAL = time(16, 0)
+
+HolidayTable = namedtuple("HolidayTable", ["first", "last", "holidays", "specials"])
+
+_tables = {}
+_warned = set()
+
+# ------------------------
+# Sources
+# ------------------------
+def holiday_table(exchange=DEFAULT_EXCHANGE):
+    """The exchange's holidays and special sessions as datetime64[D] arrays."""
+    if exchange not in _tables:
+        with open(HOLIDAYS_FILE, "r") as f:
+            config = json.load(f)
+        if exchange not in config["exchanges"]:
+            raise ValueError(f"no holiday table for exchange {exchange}")
+        days = config["exchanges"][exchange]
+        _tables[exchange] = HolidayTable(
+            np.datetime64(config["first_date"], "D"),
+            np.datetime64(config["last_date"], "D"),
+            np.array(days["holidays"], dtype=storage.DATE_DTYPE),
+            np.array(days.get("special_sessions", []), dtype=storage.DATE_DTYPE),
+        )
+    return _tables[exchange]
+
+def observed_sessions(universe=CALENDAR_UNIVERSE):
+    """Sorted unique datetime64[D] dates of every stored history in ``universe``."""
+    dates = []
+    for symbol in storage.list_symbols(universe):
+        try:
+            arrays = storage.open_columns(universe, symbol, columns=[])
+            if arrays is None:
+                values = storage.load_ohlcv(universe, symbol, columns=[])["date"].to_numpy()
+            else:
+                values = arrays[storage.DATE_COLUMN]
+        except ValueError:
+            continue
+        dates.append(np.asarray(values).astype(storage.DATE_DTYPE))
+
+    if not dates:
+        return np.empty(0, dtype=storage.DATE_DTYPE)
+    return np.unique(np.concatenate(dates))
+
+# ------------------------
+# Sessions
+# ------------------------
+def _table_sessions(start, end, table):
+    if end < start:
+        return np.empty(0, dtype=storage.DATE_DTYPE)
+    days = np.arange(start, end + 1, dtype=storage.DATE_DTYPE)
+    is_session = np.is_busday(days, holidays=table.holidays) | np.isin(days, table.specials)
+    return days[is_session]
+
+def is_session(day, exchange=DEFAULT_EXCHANGE):
+    day = np.datetime64(day, "D")
+    return len(_table_sessions(day, day, holiday_table(exchange))) == 1
+
+def last_session(now=None, exchange=DEFAULT_EXCHANGE):
+    """
+    The latest session whose daily bar should be final at ``now``
+    (default: the current time in IST).
+    """
+    now = now or datetime.now(IST)
+    day = np.datetime64(now.date(), "D")
+    if now.time() < BARS_FINAL:
+        day -= 1
+    while not is_session(day, exchange):
+        day -= 1
+    return day
+
+def sessions(start=None, end=None, exchange=DEFAULT_EXCHANGE):
+    """
+    Sorted datetime64[D] sessions from ``start`` (default: the first
+    stored index bar) to ``end`` (default: last_session()), inclusive.
+    """
+    table = holiday_table(exchange)
+    end = last_session(exchange=exchange) if end is None else np.datetime64(end, "D")
+    start = None if start is None else np.datetime64(start, "D")
+
+    if end > table.last and exchange not in _warned:
+        _warned.add(exchange)
+        print(f"⚠️ {exchange} holiday table ends {table.last}: later weekdays count as sessions")
+
+    parts = []
+    if start is None or start < table.first:
+        history = observed_sessions()
+        parts.append(history[history < table.first])
+    parts.append(_table_sessions(table.first if start is None else max(start, table.first), end, table))
+
+    out = np.concatenate(parts)
+    if start is not None:
+        out = out[out >= start]
+    return out[out <= end]
+
+def sessions_after(day, end=None, exchange=DEFAULT_EXCHANGE):
+    """Sessions after ``day`` up to ``end`` (default: last_session())."""
+    return sessions(np.datetime64(day, "D") + 1, end, exchange)
+
+# ------------------------
+# Per-symbol checks
+# ------------------------
+def missing_sessions(dates, calendar):
+    """Sessions between a symbol's first and last date that it has no bar for."""
+    dates = np.asarray(dates).astype(storage.DATE_DTYPE)
+    if len(dates) == 0:
+        return 0
+    lo = np.searchsorted(calendar, dates[0], side="left")
+    hi = np.searchsorted(calendar, dates[-1], side="right")
+    window = calendar[lo:hi]
+
+    idx = np.minimum(np.searchsorted(dates, window), len(dates) - 1)
+    return int(np.count_nonzero(dates[idx] != window))
+
+def latest_session(calendar):
+    return calendar[-1] if len(calendar) else None
+
+def stale_sessions(last_date, calendar):
+    """Sessions the market traded after ``last_date``."""
+    if last_date is None or len(calendar) == 0:
+        return None
+    last = np.datetime64(last_date, "D")
+    return int(len(calendar) - np.searchsorted(calendar, last, side="right"))
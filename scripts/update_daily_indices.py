@@ -1,14 +1,20 @@
+import argparse
 import json
 import pandas as pd
-import yfinance as yf
 from pathlib import Path
 
+import fetcher
+import instrument
+import storage
+import trading_calendar
+
 # -----------------------------
 # PATHS
 # -----------------------------
 BASE_DIR = Path(__file__).resolve().parent.parent
 CONFIG_FILE = BASE_DIR / "config" / "indices.json"
-DATA_DIR = BASE_DIR / "data" / "indices"
+
+INDEX_COLUMNS = ["date", "open", "high", "low", "close", "volume"]
 
 # -----------------------------
 # LOAD INDICES
@@ -17,53 +23,117 @@ with open(CONFIG_FILE, "r") as f:
     indices = json.load(f)
 
 # -----------------------------
-# UPDATE FUNCTION
+# UPDATE FUNCTIONS
 # -----------------------------
-def update_index(name, yahoo_symbol):
-    csv_file = DATA_DIR / f"{name}.csv"
-
-    if not csv_file.exists():
+def plan_index(name, until=None):
+    """
+    Fetch job for one index, or None when it already has every session
+    of its exchange up to ``until`` (default: the last final session).
+    """
+    if not storage.exists("indices", name):
         print(f"⚠️ {name} CSV missing, skip")
-        return
+        return None
 
-    df_old = pd.read_csv(csv_file)
+    try:
+        last_date = storage.last_date("indices", name)
+    except ValueError:
+        last_date = None
 
-    if df_old.empty or "date" not in df_old.columns:
+    exchange = indices[name].get("exchange", trading_calendar.DEFAULT_EXCHANGE)
+    until = until or trading_calendar.last_session(exchange=exchange)
+
+    if last_date is None:
         start_date = "2000-01-01"
     else:
-        df_old["date"] = pd.to_datetime(df_old["date"]).dt.normalize()
-        start_date = df_old["date"].max().strftime("%Y-%m-%d")
-
-    df_new = yf.download(
-        yahoo_symbol,
-        start=start_date,
-        interval="1d",
-        auto_adjust=False,
-        progress=False,
-        threads=False,
-    )
+        if len(trading_calendar.sessions_after(last_date, until, exchange)) == 0:
+            print(f"⏭️ {name} already up-to-date")
+            return None
+        # Re-fetch the last stored bar too; an unchanged bar is dropped
+        # on append, a revised one triggers a full rewrite
+        start_date = last_date.strftime("%Y-%m-%d")
 
-    if df_new.empty:
+    return {
+        "name": name,
+        "yahoo": indices[name]["yahoo"],
+        "start": start_date,
+        "end": str(until + 1),
+    }
+
+def download_index(job):
+    return fetcher.download(job["yahoo"], start=job["start"], end=job["end"])
+
+def update_index(job, df_new, full_rewrite=False):
+    """Write one index's new bars. Returns the storage mode, or None."""
+    name = job["name"]
+
+    if df_new is None or df_new.empty:
         print(f"ℹ️ No new data for {name}")
-        return
+        return None
 
-    df_new.reset_index(inplace=True)
-    df_new = df_new[["Date", "Open", "High", "Low", "Close", "Volume"]]
-    df_new.columns = ["date", "open", "high", "low", "close", "volume"]
-    df_new["date"] = pd.to_datetime(df_new["date"]).dt.normalize()
+    df_new = df_new[INDEX_COLUMNS].copy()
+    df_new["date"] = storage.parse_dates(df_new["date"]).values
 
-    df = pd.concat([df_old, df_new], ignore_index=True)
-    df.drop_duplicates(subset="date", inplace=True)
-    df.sort_values("date", inplace=True)
+    if full_rewrite:
+        df_old = storage.load_ohlcv("indices", name)
+        df = pd.concat([df_old, df_new], ignore_index=True)
+        meta = storage.save_ohlcv(df, "indices", name)
+        print(f"✅ Updated {name} → {meta['rows']} rows")
+        return "rewrite"
 
-    df.to_csv(csv_file, index=False)
-    print(f"✅ Updated {name} → {len(df)} rows")
+    mode, rows = storage.append_ohlcv(df_new, "indices", name)
+
+    if mode == "append":
+        print(f"✅ Updated {name} (+{rows})")
+    elif mode == "rewrite":
+        print(f"♻️ Updated {name} (full rewrite, {rows} rows)")
+    else:
+        print(f"ℹ️ No new data for {name}")
+    return mode
+
+def update_indices(names=indices, full_rewrite=False, workers=fetcher.DEFAULT_WORKERS,
+                   rate=fetcher.DEFAULT_RATE, retries=fetcher.DEFAULT_RETRIES):
+    """Fetch and store new bars for every index; returns the ones that changed."""
+    jobs = [job for job in map(plan_index, names) if job is not None]
+    by_name = {job["name"]: job for job in jobs}
+    updated = []
+
+    def on_result(result):
+        if result.status == "error":
+            print(f"❌ Error {result.key}: {result.error}")
+            return
+        with instrument.symbol(result.key):
+            instrument.add_rows(0 if result.value is None else len(result.value))
+            mode = update_index(by_name[result.key], result.value, full_rewrite)
+        if mode in ("append", "rewrite"):
+            updated.append(result.key)
+
+    results = fetcher.fetch_all(
+        jobs,
+        download_index,
+        key=lambda job: job["name"],
+        workers=workers,
+        rate=rate,
+        retries=retries,
+        on_result=on_result,
+    )
+    fetcher.summarize(results)
+
+    print("🎯 Daily indices update complete.")
+    return updated
 
 # -----------------------------
 # RUN
 # -----------------------------
 if __name__ == "__main__":
-    for name, meta in indices.items():
-        update_index(name, meta["yahoo"])
+    parser = instrument.add_arguments(fetcher.add_arguments(argparse.ArgumentParser()))
+    parser.add_argument(
+        "--full-rewrite", action="store_true",
+        help="re-read and rewrite every file instead of appending new bars"
+    )
+    args = parser.parse_args()
 
-    print("🎯 Daily indices update complete.")
+    with instrument.run("update_daily_indices", args.profile), instrument.stage("update"):
+        update_indices(
+            indices, args.full_rewrite,
+            workers=args.workers, rate=args.rate, retries=args.retries,
+        )
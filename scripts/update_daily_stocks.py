@@ -1,80 +1,232 @@
+import argparse
 import json
-import os
 import pandas as pd
-import yfinance as yf
-from datetime import datetime, timedelta
+
+import adjustments
+import fetcher
+import instrument
+import storage
+import trading_calendar
 
 CONFIG_PATH = "config/stocks_nifty500.json"
-DATA_DIR = "data/stocks/NIFTY500"
+BATCH_SIZE = 50   # tickers per multi-ticker yf.download call
 
 with open(CONFIG_PATH, "r") as f:
     symbols = json.load(f)
 
 def normalize_date(df):
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["date"] = storage.parse_dates(df["date"]).values
     df.dropna(subset=["date"], inplace=True)
-    df["date"] = df["date"].dt.date.astype(str)
     return df
 
-def update_symbol(sym):
+def plan_symbol(sym, until=None):
+    """
+    Work out what to fetch for one symbol, or None if nothing is due:
+    the NSE sessions after its last bar up to ``until`` (default: the
+    last session with final bars). Weekends and holidays never count.
+    """
     yahoo_symbol = sym if sym.endswith(".NS") else f"{sym}.NS"
-    file_path = os.path.join(DATA_DIR, f"{sym.replace('.', '_')}.csv")
+    file_sym = sym.replace('.', '_')
 
-    if not os.path.exists(file_path):
+    if not storage.exists("stocks", file_sym):
         print(f"❌ Missing file for {sym}")
-        return
-
-    df_old = pd.read_csv(file_path)
+        return None
 
-    if "date" not in df_old.columns:
+    try:
+        # Only the store metadata / CSV tail is read to find the last bar
+        last_date = storage.last_date("stocks", file_sym)
+    except ValueError:
         print(f"❌ {sym}: no date column")
-        return
-
-    # 🔥 AUTO-NORMALIZE EXISTING CSV
-    df_old = normalize_date(df_old)
+        return None
 
-    last_date = pd.to_datetime(df_old["date"]).max()
-    fetch_from = (last_date + timedelta(days=1)).strftime("%Y-%m-%d")
-    today = datetime.utcnow().strftime("%Y-%m-%d")
+    if last_date is None:
+        print(f"❌ {sym}: no rows")
+        return None
 
-    if fetch_from >= today:
+    missing = trading_calendar.sessions_after(last_date, until)
+    if len(missing) == 0:
         print(f"⏭️ {sym} already up-to-date")
-        return
+        return None
+
+    return {
+        "sym": sym,
+        "file_sym": file_sym,
+        "yahoo": yahoo_symbol,
+        "fetch_from": str(missing[0]),
+        # yf.download's end is exclusive
+        "fetch_to": str(missing[-1] + 1),
+        "sessions": len(missing),
+    }
+
+def plan_symbols(symbols, until=None):
+    """Jobs for every symbol behind the calendar, with a one-line summary."""
+    until = until or trading_calendar.last_session()
+    jobs = [job for job in (plan_symbol(sym, until) for sym in symbols) if job is not None]
+
+    gaps = {(job["fetch_from"], job["fetch_to"]) for job in jobs}
+    print(
+        f"🗓️ Last session {until}: {len(symbols) - len(jobs)} symbols current or skipped, "
+        f"{len(jobs)} missing {sum(job['sessions'] for job in jobs)} sessions "
+        f"({len(gaps)} distinct gaps)"
+    )
+    return jobs
+
+def download_symbol(job):
+    return fetcher.download(job["yahoo"], start=job["fetch_from"], end=job["fetch_to"])
+
+def make_batches(jobs, batch_size=BATCH_SIZE):
+    """
+    Group jobs that miss the same sessions, then chunk each group so one
+    yf.download call serves up to ``batch_size`` tickers.
+    """
+    groups = {}
+    for job in jobs:
+        groups.setdefault((job["fetch_from"], job["fetch_to"]), []).append(job)
+
+    batches = []
+    for (fetch_from, fetch_to), group in sorted(groups.items()):
+        for i in range(0, len(group), batch_size):
+            chunk = group[i:i + batch_size]
+            batches.append({
+                "key": f"{fetch_from}..{fetch_to}#{i // batch_size}",
+                "jobs": chunk,
+                "fetch_from": fetch_from,
+                "fetch_to": fetch_to,
+            })
+    return batches
+
+def download_batch(batch):
+    return fetcher.download_many(
+        [job["yahoo"] for job in batch["jobs"]],
+        start=batch["fetch_from"],
+        end=batch["fetch_to"],
+    )
+
+def update_symbol(job, df_new, full_rewrite=False):
+    """Write one symbol's new bars. Returns the storage mode, or None."""
+    sym = job["sym"]
+    file_sym = job["file_sym"]
 
     try:
-        df_new = yf.download(
-            yahoo_symbol,
-            start=fetch_from,
-            end=today,
-            interval="1d",
-            auto_adjust=False,
-            progress=False,
-            threads=False,
-        )
-
-        if df_new.empty:
+        if df_new is None or df_new.empty:
             print(f"⚠️ No new data for {sym}")
-            return
-
-        df_new.reset_index(inplace=True)
-        df_new.rename(columns=str.lower, inplace=True)
+            return None
 
         # 🔥 NORMALIZE YAHOO DATA
         df_new = normalize_date(df_new)
 
-        df_final = pd.concat([df_old, df_new], ignore_index=True)
-        df_final.drop_duplicates(subset=["date"], inplace=True)
-        df_final.sort_values("date", inplace=True)
-
-        df_final.to_csv(file_path, index=False)
-        print(f"✅ Updated {sym} (+{len(df_new)})")
+        if full_rewrite:
+            df_old = storage.load_ohlcv("stocks", file_sym)
+            df_final = pd.concat([df_old, df_new], ignore_index=True)
+            storage.save_ohlcv(df_final, "stocks", file_sym)
+            print(f"✅ Updated {sym} (+{len(df_new)}, full rewrite)")
+            mode = "rewrite"
+        else:
+            mode, rows = storage.append_ohlcv(df_new, "stocks", file_sym)
+
+            if mode == "append":
+                print(f"✅ Updated {sym} (+{rows})")
+            elif mode == "rewrite":
+                print(f"♻️ Updated {sym} (full rewrite, {rows} rows)")
+            else:
+                print(f"⏭️ {sym} no new bars")
+
+        if mode in ("append", "rewrite"):
+            # Only the new bars are scanned unless older ones were revised
+            events = len(adjustments.update_factors("stocks", file_sym)["events"])
+            actions = sum(
+                (df_new[col].fillna(0) > 0).sum()
+                for col in ("dividends", "stock_splits") if col in df_new
+            )
+            if actions:
+                print(f"🪙 {sym}: corporate action in the new bars ({events} adjustment events)")
+        return mode
 
     except Exception as e:
         print(f"❌ Error {sym}: {e}")
-
-print(f"📦 Updating {len(symbols)} stocks")
-
-for sym in symbols:
-    update_symbol(sym)
-
-print("🎯 Daily NIFTY 500 update completed")
+        return None
+
+def update_stocks(symbols=symbols, full_rewrite=False, batch_size=BATCH_SIZE,
+                  workers=fetcher.DEFAULT_WORKERS, rate=fetcher.DEFAULT_RATE,
+                  retries=fetcher.DEFAULT_RETRIES):
+    """
+    Fetch and store the missing bars of every symbol.
+    Returns the file symbols whose stored history changed.
+    """
+    print(f"📦 Updating {len(symbols)} stocks")
+
+    jobs = plan_symbols(symbols)
+    by_sym = {job["sym"]: job for job in jobs}
+    fetch_opts = dict(workers=workers, rate=rate, retries=retries)
+    updated = []
+
+    def store(job, df_new):
+        with instrument.symbol(job["sym"]):
+            instrument.add_rows(0 if df_new is None else len(df_new))
+            mode = update_symbol(job, df_new, full_rewrite)
+        if mode in ("append", "rewrite"):
+            updated.append(job["file_sym"])
+
+    def on_result(result):
+        if result.status == "error":
+            print(f"❌ Error {result.key}: {result.error}")
+            return
+        store(by_sym[result.key], result.value)
+
+    # Symbols a batch did not return (or whose batch failed) get one
+    # individual request each afterwards
+    leftovers = []
+
+    def on_batch(result):
+        frames = result.value if result.status == "ok" else {}
+        if result.status == "error":
+            print(f"⚠️ Batch {result.key} failed: {result.error}")
+
+        for job in batch_jobs[result.key]:
+            df_new = frames.get(job["yahoo"])
+            if df_new is None or df_new.empty:
+                leftovers.append(job)
+            else:
+                store(job, df_new)
+
+    if batch_size > 1:
+        batches = make_batches(jobs, batch_size)
+        batch_jobs = {batch["key"]: batch["jobs"] for batch in batches}
+        print(f"🧺 {len(jobs)} symbols → {len(batches)} batched requests")
+
+        results = fetcher.fetch_all(
+            batches, download_batch, key=lambda b: b["key"],
+            on_result=on_batch, **fetch_opts
+        )
+        fetcher.summarize(results)
+    else:
+        leftovers = jobs
+
+    if leftovers:
+        print(f"🔁 Fetching {len(leftovers)} symbols individually")
+        results = fetcher.fetch_all(
+            leftovers, download_symbol, key=lambda job: job["sym"],
+            on_result=on_result, **fetch_opts
+        )
+        fetcher.summarize(results)
+
+    print("🎯 Daily NIFTY 500 update completed")
+    return updated
+
+if __name__ == "__main__":
+    parser = instrument.add_arguments(fetcher.add_arguments(argparse.ArgumentParser()))
+    parser.add_argument(
+        "--full-rewrite", action="store_true",
+        help="re-read and rewrite every file instead of appending new bars"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=BATCH_SIZE,
+        help="tickers per yf.download call (1 = one request per symbol)"
+    )
+    args = parser.parse_args()
+
+    with instrument.run("update_daily_stocks", args.profile), instrument.stage("update"):
+        update_stocks(
+            symbols, args.full_rewrite, args.batch_size,
+            workers=args.workers, rate=args.rate, retries=args.retries,
+        )
@@ -0,0 +1,252 @@
+# scripts/validate_ohlcv.py
+#
+# Data-quality checks over whole universes at once. Every symbol's daily
+# bars are concatenated into flat arrays with a segment id per row, so
+# each check is one vectorized mask and the per-symbol counts are a
+# bincount, not a Python loop per symbol. Writes a compact report of the
+# symbols with issues; build_snapshots uses the same results to
+# downgrade data_quality_flag.
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import instrument
+import panel
+import storage
+
+REPORTS = {
+    "stocks": "reports/nifty500_data_quality.csv",
+    "indices": "reports/indices_data_quality.csv",
+}
+
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+
+# Relative slack for float noise in the high / low envelope
+PRICE_TOL = 1e-6
+# Zero-volume bars in a row before they count as a halt / stale feed
+ZERO_VOLUME_RUN = 5
+# Close-to-close ratio that looks like a split or bonus (≥ 1:1.8)
+JUMP_RATIO = 1.8
+# A recorded split "shows" in the prices when the jump is within this of it
+SPLIT_TOL = 0.15
+# Issues in the bars the snapshot indicators read affect the quality flag
+RECENT_BARS = panel.TAIL_BARS
+
+# Errors make the bars untrustworthy; warnings are suspicious but can be real
+ERRORS = [
+    "high_lt_low", "close_outside", "non_positive",
+    "duplicate_dates", "unsorted_dates", "unadjusted_split",
+]
+WARNINGS = ["zero_volume_run", "unexplained_jump"]
+CHECKS = ERRORS + WARNINGS
+
+# Index levels come with partial, mostly zero volume
+NO_VOLUME = {"indices"}
+
+# ------------------------
+# Loading
+# ------------------------
+def raw_arrays(universe, symbol):
+    """
+    {column: array} of one symbol as stored: the memory-mapped store, or
+    for unmigrated symbols the CSV as written (names normalized and dates
+    parsed, but not sorted or deduplicated, so those checks still bite).
+    """
+    arrays = storage.open_columns(universe, symbol, columns=storage.OHLCV_COLUMNS)
+    if arrays is not None:
+        return arrays
+
+    df = storage.normalize_columns(pd.read_csv(storage.csv_path(universe, symbol)))
+    if storage.DATE_COLUMN not in df.columns:
+        raise ValueError(f"{universe}/{symbol}: no date column")
+    df[storage.DATE_COLUMN] = storage.parse_dates(df[storage.DATE_COLUMN]).values
+    return {
+        col: df[col].to_numpy()
+        for col in [storage.DATE_COLUMN] + storage.OHLCV_COLUMNS if col in df.columns
+    }
+
+def load_universe(universe, symbols=None):
+    """{symbol: {column: array}} for validation; unreadable files are left out."""
+    if symbols is None:
+        symbols = storage.list_symbols(universe)
+    bars = {}
+    for symbol in symbols:
+        try:
+            bars[symbol] = raw_arrays(universe, symbol)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Skipped {universe}/{symbol}: {e}")
+    return bars
+
+# ------------------------
+# Flat layout
+# ------------------------
+def _flatten(bars):
+    """
+    (symbols, lengths, seg, columns): every symbol's rows back to back,
+    ``seg`` the symbol index of each row, absent columns NaN.
+    """
+    symbols = list(bars)
+    lengths = np.array([len(bars[s][storage.DATE_COLUMN]) for s in symbols], dtype=np.int64)
+    seg = np.repeat(np.arange(len(symbols)), lengths)
+
+    columns = {
+        storage.DATE_COLUMN: np.concatenate(
+            [np.asarray(bars[s][storage.DATE_COLUMN]).astype(storage.DATE_DTYPE) for s in symbols]
+            or [np.empty(0, dtype=storage.DATE_DTYPE)]
+        )
+    }
+    for col in PRICE_COLUMNS + ["volume", "stock_splits"]:
+        parts = [
+            np.asarray(bars[s][col], dtype="f8") if col in bars[s]
+            else np.full(n, np.nan)
+            for s, n in zip(symbols, lengths)
+        ]
+        columns[col] = np.concatenate(parts) if parts else np.empty(0)
+    return symbols, lengths, seg, columns
+
+def _zero_volume_runs(volume, seg, lengths):
+    """Rows inside runs of ≥ ZERO_VOLUME_RUN zero-volume bars of symbols that trade volume."""
+    zero = volume == 0
+    if not zero.any():
+        return zero
+
+    # Histories without any volume (e.g. a feed that never reports it) are skipped
+    traded = np.bincount(seg, weights=volume > 0, minlength=len(lengths)) > 0
+    zero &= traded[seg]
+
+    starts = zero.copy()
+    starts[1:] &= ~zero[:-1] | (seg[1:] != seg[:-1])
+    run_id = np.cumsum(starts) - 1
+    run_len = np.bincount(run_id[zero], minlength=int(starts.sum()))
+    out = np.zeros_like(zero)
+    out[zero] = run_len[run_id[zero]] >= ZERO_VOLUME_RUN
+    return out
+
+def split_moves(prev_close, close, splits):
+    """
+    (move, confirmed): the close-to-close move either way (≥ 1) and
+    whether it is split-sized and matches the recorded split ratio either
+    way, i.e. the prices on that bar still jump by the split.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = prev_close / close
+        move = np.fmax(ratio, 1 / ratio)
+        size = np.fmax(splits, 1 / splits)
+        matches = np.abs(move / size - 1) <= SPLIT_TOL
+    return move, (splits > 0) & (move >= JUMP_RATIO) & matches
+
+def check_masks(seg, lengths, columns, volume=True):
+    """{check: row mask} over the flat arrays; ``volume`` False skips the volume check."""
+    o, h, l, c = (columns[col] for col in PRICE_COLUMNS)
+    dates = columns[storage.DATE_COLUMN]
+    splits = columns["stock_splits"]
+
+    # Comparisons with the previous row of the same symbol
+    same = np.zeros(len(seg), dtype=bool)
+    same[1:] = seg[1:] == seg[:-1]
+    prev_date = np.roll(dates, 1)
+    prev_close = np.roll(c, 1)
+
+    # A misadjusted history can jump up or down by the split ratio
+    move, unadjusted = split_moves(np.where(same, prev_close, np.nan), c, splits)
+    jump = move >= JUMP_RATIO
+
+    return {
+        "high_lt_low": h < l,
+        "close_outside": (c < l * (1 - PRICE_TOL)) | (c > h * (1 + PRICE_TOL)),
+        "non_positive": (o <= 0) | (h <= 0) | (l <= 0) | (c <= 0),
+        "duplicate_dates": same & (dates == prev_date),
+        "unsorted_dates": same & (dates < prev_date),
+        # The price still moves by the recorded split ratio on the split bar
+        "unadjusted_split": unadjusted,
+        "zero_volume_run": (
+            _zero_volume_runs(columns["volume"], seg, lengths) if volume
+            else np.zeros(len(seg), dtype=bool)
+        ),
+        # Split-sized move on a bar without a matching recorded split
+        "unexplained_jump": jump & ~unadjusted,
+    }
+
+# ------------------------
+# Validation
+# ------------------------
+def validate(bars, recent=RECENT_BARS, volume=True):
+    """
+    Run every check over ``bars`` ({symbol: {column: array}} or
+    {symbol: DataFrame}); ``volume`` False for universes whose volume
+    is not meaningful. Returns a frame indexed by symbol with the
+    number of rows, the bars failing each check, errors / warnings in
+    the last ``recent`` bars and the date of the last flagged bar.
+    """
+    bars = {
+        symbol: {col: df[col].to_numpy() for col in df.columns}
+        if isinstance(df, pd.DataFrame) else df
+        for symbol, df in bars.items()
+    }
+    symbols, lengths, seg, columns = _flatten(bars)
+    masks = check_masks(seg, lengths, columns, volume)
+    S = len(symbols)
+
+    ends = np.cumsum(lengths)
+    in_recent = np.arange(len(seg)) >= (ends - np.minimum(lengths, recent))[seg]
+
+    out = {"rows": lengths}
+    for name in CHECKS:
+        out[name] = np.bincount(seg[masks[name]], minlength=S)
+
+    errors = np.logical_or.reduce([masks[name] for name in ERRORS])
+    warnings = np.logical_or.reduce([masks[name] for name in WARNINGS])
+    out["recent_errors"] = np.bincount(seg[errors & in_recent], minlength=S)
+    out["recent_warnings"] = np.bincount(seg[warnings & in_recent], minlength=S)
+
+    # Rows are grouped by symbol, so the last flagged row per segment wins
+    flagged = np.flatnonzero(errors | warnings)
+    last_issue = np.full(S, np.datetime64("NaT"), dtype=storage.DATE_DTYPE)
+    if len(flagged):
+        tail = np.r_[seg[flagged][1:] != seg[flagged][:-1], True]
+        last_issue[seg[flagged][tail]] = columns[storage.DATE_COLUMN][flagged][tail]
+    out["last_issue_date"] = last_issue
+
+    return pd.DataFrame(out, index=pd.Index(symbols, name="symbol"))
+
+def issues_report(results):
+    """Only the symbols with at least one flagged bar."""
+    flagged = results[CHECKS].sum(axis=1) > 0
+    return results[flagged].reset_index()
+
+def validate_universe(universe, out=None, bars=None):
+    """
+    Validate one universe and write its issues report. ``bars``
+    ({symbol: {column: array}}) supplies bars already in memory.
+    """
+    if bars is None:
+        bars = load_universe(universe)
+    results = validate(bars, volume=universe not in NO_VOLUME)
+    instrument.add_rows(results["rows"].sum())
+    report = issues_report(results)
+
+    out = out or REPORTS[universe]
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    report.to_csv(out, index=False)
+
+    totals = ", ".join(f"{name} {int(results[name].astype(bool).sum())}" for name in CHECKS)
+    print(f"🔎 {universe}: {len(report)} of {len(results)} symbols with issues ({totals})")
+    print(f"✅ Data quality report saved to {out}")
+    return results
+
+if __name__ == "__main__":
+    parser = instrument.add_arguments(
+        argparse.ArgumentParser(description="Validate stored OHLCV histories")
+    )
+    parser.add_argument(
+        "--universe", action="append", choices=list(REPORTS),
+        help="universe to check (repeatable; default: all)"
+    )
+    args = parser.parse_args()
+
+    with instrument.run("validate_ohlcv", args.profile), instrument.stage("validate"):
+        for universe in args.universe or list(REPORTS):
+            validate_universe(universe)
@@ -0,0 +1,104 @@
+# scripts/yf_stub.py
+#
+# Offline stand-in for the parts of yfinance this repo uses
+# (yf.download and yf.Ticker(...).history). Enabled with YF_STUB=1.
+#
+#   YF_STUB_LATENCY    seconds slept per request (default 0.05)
+#   YF_STUB_FAIL_RATE  probability a request raises (default 0.0)
+#   YF_STUB_EMPTY      comma-separated tickers that always return no rows
+#   YF_STUB_SEED       seed for the failure draws (default 0)
+
+import os
+import random
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+ORIGIN = pd.Timestamp("2000-01-03")
+
+_lock = threading.Lock()
+_rng = random.Random(int(os.environ.get("YF_STUB_SEED", "0")))
+calls = []
+
+
+class StubError(RuntimeError):
+    pass
+
+
+def _request(tickers):
+    with _lock:
+        calls.append(tuple(tickers))
+        fail = _rng.random() < float(os.environ.get("YF_STUB_FAIL_RATE", "0"))
+
+    time.sleep(float(os.environ.get("YF_STUB_LATENCY", "0.05")))
+    if fail:
+        raise StubError(f"injected failure for {','.join(tickers)}")
+
+
+def _bars(ticker, start=None, end=None):
+    """Deterministic business-day random walk, stable across calls."""
+    if ticker in os.environ.get("YF_STUB_EMPTY", "").split(","):
+        return pd.DataFrame()
+
+    end = pd.Timestamp(end) if end is not None else pd.Timestamp.utcnow().tz_localize(None).normalize()
+    days = pd.bdate_range(ORIGIN, end - pd.Timedelta(days=1))
+    if len(days) == 0:
+        return pd.DataFrame()
+
+    rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+    steps = rng.normal(0.0003, 0.015, len(days))
+    close = 100 * np.exp(np.cumsum(steps))
+    open_ = close * (1 + rng.normal(0, 0.004, len(days)))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.006, len(days))))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.006, len(days))))
+    volume = rng.integers(10_000, 5_000_000, len(days))
+
+    df = pd.DataFrame(
+        {
+            "Open": open_,
+            "High": high,
+            "Low": low,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": volume,
+        },
+        index=pd.DatetimeIndex(days, name="Date"),
+    )
+    if start is not None:
+        df = df[df.index >= pd.Timestamp(start)]
+    return df
+
+
+def download(tickers, start=None, end=None, period=None, group_by="column", **kwargs):
+    tickers = tickers.split() if isinstance(tickers, str) else list(tickers)
+    _request(tickers)
+
+    frames = {t: _bars(t, start, end) for t in tickers}
+    frames = {t: f for t, f in frames.items() if not f.empty}
+    if not frames:
+        return pd.DataFrame()
+
+    # Like yfinance >= 0.2.48: (Price, Ticker) columns, even for one ticker,
+    # or (Ticker, Price) with group_by="ticker"
+    df = pd.concat(frames, axis=1)
+    if group_by != "ticker":
+        df.columns = df.columns.swaplevel(0, 1)
+    return df
+
+
+class Ticker:
+    def __init__(self, ticker):
+        self.ticker = ticker
+
+    def history(self, period="max", start=None, end=None, **kwargs):
+        _request([self.ticker])
+        df = _bars(self.ticker, start, end)
+        if df.empty:
+            return df
+        df = df.copy()
+        df["Dividends"] = 0.0
+        df["Stock Splits"] = 0.0
+        return df